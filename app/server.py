@@ -0,0 +1,372 @@
+"""Async HTTP server answering queries with a warm ``RagPipeline``.
+
+Models, documents and the vector index are built once at startup and shared
+by every request. At most ``--max-concurrency`` queries run at a time and up
+to ``--max-queue`` more wait for a slot; beyond that requests get ``429``.
+Queries taking longer than ``--timeout`` seconds get ``504``. On SIGINT or
+SIGTERM the server stops accepting connections and lets in-flight requests
+finish, up to ``--shutdown-timeout`` seconds.
+
+Endpoints:
+    POST /query    ``{"query": "..."}`` -> ``{"answer": "...", "latency_ms": ...}``
+    GET  /health   ``200`` when serving, ``503`` while draining
+    GET  /metrics  request counts, latency percentiles, queue depth and model call counts
+
+Run it locally without API keys using fake models:
+
+    python -m app.server --fake --llm-latency 0.2 --port 8000
+    curl -X POST localhost:8000/query -d '{"query": "What is ML?"}'
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from rag_toolkit.tracing import TraceExporter, Tracer
+
+logger = logging.getLogger("app.server")
+
+STRATEGIES = {
+    "simple": ("SimpleRetriever", "SimpleGenerator"),
+    "multi_query": ("MultiQueryRetriever", "MultiQueryGenerator"),
+    "fusion": ("FusionRetriever", "FusionGenerator"),
+    "recursive": ("DecomposeRetriever", "RecursiveGenerator"),
+    "individual": ("DecomposeRetriever", "IndividualGenerator"),
+    "step_back": ("StepBackRetriever", "StepBackGenerator"),
+    "hyde": ("HyDERetriever", "HyDEGenerator"),
+}
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable",
+           504: "Gateway Timeout"}
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class QueueFull(Exception):
+    pass
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue; requests beyond both are rejected."""
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def __len__(self) -> int:
+        return self.in_flight + self.queued
+
+    async def __aenter__(self):
+        if len(self) >= self.max_concurrency + self.max_queue:
+            raise QueueFull()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class Metrics(TraceExporter):
+    """Server counters; also a trace exporter summing the pipeline's per-request counters."""
+
+    def __init__(self, window: int = 10_000):
+        self.started = time.time()
+        self.responses: Dict[int, int] = {}
+        self.latencies = deque(maxlen=window)
+        self.pipeline_counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        with self._lock:
+            for name, value in trace.counters.items():
+                self.pipeline_counters[name] = self.pipeline_counters.get(name, 0) + value
+
+    def observe(self, status: int, seconds: Optional[float] = None):
+        self.responses[status] = self.responses.get(status, 0) + 1
+        if seconds is not None:
+            self.latencies.append(seconds)
+
+    def snapshot(self, admission: AdmissionController) -> dict:
+        latencies = sorted(self.latencies)
+        percentiles = {}
+        if latencies:
+            percentiles = {
+                "p50_ms": 1000 * statistics.median(latencies),
+                "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+                "p99_ms": 1000 * latencies[int(0.99 * (len(latencies) - 1))],
+            }
+        with self._lock:
+            pipeline_counters = dict(self.pipeline_counters)
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "requests": sum(self.responses.values()),
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+            "in_flight": admission.in_flight,
+            "queued": admission.queued,
+            "max_concurrency": admission.max_concurrency,
+            "max_queue": admission.max_queue,
+            "latency": percentiles,
+            "pipeline": pipeline_counters,
+        }
+
+
+def build_pipeline(args, metrics: Metrics):
+    """Models, documents, index and pipeline; called once at startup."""
+    from rag_toolkit import generator, retriever
+    from rag_toolkit.pipeline import RagPipeline
+    from rag_toolkit.vector_store import create_vector_store_retriever
+
+    if args.fake:
+        from rag_toolkit.fakes import FakeChatModel, FakeEmbeddings
+
+        llm = FakeChatModel(latency=args.llm_latency, per_token_latency=args.token_latency)
+        query_llm = llm
+        embeddings = FakeEmbeddings(size=256, latency=args.embed_latency)
+    else:
+        from config.config import (EMBEDDING_MODEL, GENRATIVE_MODEL, get_embedding_api_key,
+                                   get_generator_api_key, get_query_gen_api_key)
+        from rag_toolkit.google_models import initialize_embedding, initialize_llm
+
+        query_llm = initialize_llm(model_name=GENRATIVE_MODEL, api_key=get_query_gen_api_key())
+        llm = initialize_llm(model_name=GENRATIVE_MODEL, api_key=get_generator_api_key())
+        embeddings = initialize_embedding(model_name=EMBEDDING_MODEL, api_key=get_embedding_api_key())
+
+    documents = load_corpus(args)
+    base_retriever = create_vector_store_retriever(documents, embeddings, k=args.k, cache_dir=args.cache_dir,
+                                                   backend=args.backend)
+    retrieval_name, generator_name = STRATEGIES[args.strategy]
+    retrieval = getattr(retriever, retrieval_name)(model=query_llm, base_retriever=base_retriever)
+    generation = getattr(generator, generator_name)(model=llm)
+    logger.info("Indexed %d chunks with the %s backend, strategy %s", len(documents), args.backend, args.strategy)
+    return RagPipeline(retrieval, generation, tracer=Tracer([metrics]))
+
+
+def load_corpus(args):
+    from langchain_core.documents import Document
+
+    from rag_toolkit.chunking import chunk_documents
+    from rag_toolkit.data_loader import FILE_TYPES, load_directory, load_documents
+
+    if args.data is None:
+        if not args.fake:
+            raise ValueError("--data is required unless --fake is given")
+        return [Document(page_content=f"Synthetic passage {i} about topic {i % 50}.", metadata={"source": "fake"})
+                for i in range(args.fake_docs)]
+    if os.path.isdir(args.data):
+        documents = load_directory(args.data)
+    else:
+        extension = os.path.splitext(args.data)[1].lower()
+        if extension not in FILE_TYPES:
+            raise ValueError(f"Unsupported file type. Supported types: {', '.join(sorted(set(FILE_TYPES.values())))}")
+        documents = load_documents(args.data, FILE_TYPES[extension])
+    return chunk_documents(documents, chunk_size=args.chunk_size, chunk_overlap=args.chunk_size // 5)
+
+
+class RagServer:
+    def __init__(self, pipeline, metrics: Metrics, max_concurrency: int = 8, max_queue: int = 64,
+                 timeout: float = 30.0):
+        """
+        Args:
+            pipeline (RagPipeline): Warm pipeline shared by all requests.
+            metrics (Metrics): Counters reported by ``/metrics``.
+            max_concurrency (int): Queries answered at the same time.
+            max_queue (int): Queries waiting for a slot before new ones get ``429``.
+            timeout (float): Seconds a query may take, waiting time included, before it gets ``504``.
+        """
+        self.pipeline = pipeline
+        self.metrics = metrics
+        self.admission = AdmissionController(max_concurrency, max_queue)
+        self.timeout = timeout
+        self.draining = False
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while not self.draining:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and not self.draining
+                await write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            await write_response(writer, 413 if "too large" in str(e) else 400, {"error": str(e)}, False)
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            if self.draining:
+                return 503, {"status": "draining"}
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.metrics.snapshot(self.admission)
+        if path != "/query":
+            return 404, {"error": f"Unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+        if self.draining:
+            return 503, {"error": "Server is shutting down"}
+
+        try:
+            query = json.loads(body or b"{}").get("query")
+        except (ValueError, AttributeError):
+            query = None
+        if not isinstance(query, str) or not query.strip():
+            self.metrics.observe(400)
+            return 400, {"error": 'Expected a JSON body {"query": "..."}'}
+
+        started = time.perf_counter()
+        try:
+            answer = await asyncio.wait_for(self._answer(query), self.timeout)
+        except QueueFull:
+            self.metrics.observe(429)
+            return 429, {"error": "Too many requests"}
+        except asyncio.TimeoutError:
+            self.metrics.observe(504, time.perf_counter() - started)
+            return 504, {"error": f"Query timed out after {self.timeout}s"}
+        except Exception as e:
+            logger.exception("Query failed: %r", query)
+            self.metrics.observe(500, time.perf_counter() - started)
+            return 500, {"error": repr(e)}
+        seconds = time.perf_counter() - started
+        self.metrics.observe(200, seconds)
+        return 200, {"answer": answer, "latency_ms": 1000 * seconds}
+
+    async def _answer(self, query: str):
+        async with self.admission:
+            return await self.pipeline.aprocess(query)
+
+    async def drain(self, timeout: float):
+        """Stop serving new queries and wait up to ``timeout`` seconds for in-flight ones."""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while len(self.admission) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if len(self.admission):
+            logger.warning("Shutting down with %d queries still running", len(self.admission))
+
+    async def close_connections(self):
+        """Close idle keep-alive connections and wait for their handlers to return."""
+        for writer in self._connections.values():
+            writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections), timeout=1.0)
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """Parse one HTTP/1.1 request; ``None`` when the client closed the connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0) or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+async def write_response(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+    body = json.dumps(payload).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(args):
+    metrics = Metrics()
+    started = time.perf_counter()
+    # blocking startup work runs off the event loop
+    pipeline = await asyncio.to_thread(build_pipeline, args, metrics)
+    logger.info("Pipeline ready in %.1fs", time.perf_counter() - started)
+
+    app = RagServer(pipeline, metrics, args.max_concurrency, args.max_queue, args.timeout)
+    server = await asyncio.start_server(app.handle_connection, args.host, args.port, backlog=1024)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Listening on http://%s:%d", args.host, args.port)
+    async with server:
+        await stop.wait()
+        logger.info("Shutting down")
+        server.close()
+        await app.drain(args.shutdown_timeout)
+        await app.close_connections()
+        await server.wait_closed()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data", help="file or directory of documents to index")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="simple")
+    parser.add_argument("--backend", choices=["chroma", "flat"], default="flat")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--cache-dir", help="directory of an on-disk embedding cache")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds per query")
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0)
+    parser.add_argument("--fake", action="store_true", help="use offline fake models instead of Google models")
+    parser.add_argument("--fake-docs", type=int, default=1000, help="synthetic documents when --data is not given")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake chat model seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake chat model seconds per word")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="fake embeddings seconds per call")
+    parser.add_argument("--log-level", default="INFO")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Memory and GC cost of holding a corpus as ``Document`` objects versus a ``ChunkStore``.
+
+Each layout is built in a fresh interpreter from the same synthetic chunks.
+``documents`` is the bookkeeping ``FlatVectorIndex`` keeps per chunk without a
+store (a list of ``Document`` objects, their ids and an id-to-row dict);
+``store`` is a ``ChunkStore``. For both the report gives build time, Python heap,
+RSS growth, the number of objects the garbage collector tracks, the time of a
+full collection, and the latency of turning ``--k`` random rows into
+``Document`` objects for a prompt, plus id lookups.
+
+    python -m benchmarks.bench_chunk_store --chunks 1000000 --words 50
+"""
+import argparse
+import gc
+import json
+import random
+import subprocess
+import sys
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.bench_flat_index import latency_stats, measure_build
+from rag_toolkit.chunk_store import ChunkStore
+from rag_toolkit.utils import DOC_ID_KEY, assign_document_ids
+
+VOCABULARY = [f"term{i}" for i in range(5000)]
+
+
+def synthetic_chunks(n_chunks, words, n_sources, seed=0):
+    rng = random.Random(seed)
+    for i in range(n_chunks):
+        yield Document(page_content=" ".join(rng.choices(VOCABULARY, k=words)),
+                       metadata={"source": f"docs/file_{i % n_sources}.pdf", "page": i // n_sources,
+                                 "start_index": rng.randrange(100000)})
+
+
+def build_documents(args):
+    documents = assign_document_ids(synthetic_chunks(args.chunks, args.words, args.sources))
+    ids = [document.metadata[DOC_ID_KEY] for document in documents]
+    positions = {doc_id: row for row, doc_id in enumerate(ids)}
+    return documents, ids, positions
+
+
+def build_store(args):
+    store = ChunkStore()
+    store.add_documents(synthetic_chunks(args.chunks, args.words, args.sources))
+    return store
+
+
+def full_gc_ms(repeat=3):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        gc.collect()
+        samples.append(time.perf_counter() - started)
+    return 1000 * min(samples)
+
+
+def bench_layout(args):
+    rng = random.Random(1)
+    samples = [[rng.randrange(args.chunks) for _ in range(args.k)] for _ in range(args.lookups)]
+
+    if args.layout == "documents":
+        (documents, ids, positions), report = measure_build(lambda: build_documents(args))
+
+        def top_k(rows):
+            return [documents[row] for row in rows]
+
+        def lookup(rows):
+            return [positions[ids[row]] for row in rows]
+    else:
+        store, report = measure_build(lambda: build_store(args))
+        report["columns_mb"] = store.nbytes / 2 ** 20
+        report["blob_mb"] = store.blob_nbytes / 2 ** 20
+
+        def top_k(rows):
+            return [store.ref(row).to_document() for row in rows]
+
+        def lookup(rows):
+            return [store.row_of(store.id(row)) for row in rows]
+
+    report["gc_tracked_objects"] = len(gc.get_objects())
+    report["full_gc_ms"] = full_gc_ms()
+    for name, fn in (("top_k_documents", top_k), ("id_lookup", lookup)):
+        latencies = []
+        for rows in samples:
+            started = time.perf_counter()
+            fn(rows)
+            latencies.append(time.perf_counter() - started)
+        report[name] = latency_stats(latencies)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=50, help="words per chunk")
+    parser.add_argument("--sources", type=int, default=1000, help="distinct source files")
+    parser.add_argument("--k", type=int, default=10, help="rows materialised per prompt")
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--layout", choices=["both", "documents", "store"], default="both",
+                        help="'both' measures each layout in its own interpreter")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.layout != "both":
+        print(json.dumps(bench_layout(args)))
+        return
+
+    report = {"chunks": args.chunks, "words_per_chunk": args.words, "sources": args.sources}
+    for layout in ("documents", "store"):
+        command = [sys.executable, "-m", "benchmarks.bench_chunk_store", "--layout", layout,
+                   "--chunks", str(args.chunks), "--words", str(args.words), "--sources", str(args.sources),
+                   "--k", str(args.k), "--lookups", str(args.lookups)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        report[layout] = json.loads(output.strip().splitlines()[-1])
+    report["heap_ratio"] = report["documents"]["python_heap_mb"] / report["store"]["python_heap_mb"]
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
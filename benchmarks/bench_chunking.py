@@ -0,0 +1,89 @@
+"""Throughput of the chunking stage.
+
+Chunks a synthetic corpus of paragraphs and sentences with ``TextChunker`` in
+character and token mode and reports characters per second, alongside
+langchain's ``RecursiveCharacterTextSplitter`` for reference.
+
+    python -m benchmarks.bench_chunking --mb 20
+"""
+import argparse
+import json
+import random
+import time
+
+from langchain.schema import Document
+
+from rag_toolkit.chunking import TextChunker
+
+WORDS = ("model data training error learning network feature value loss gradient "
+         "layer input output batch weight function vector matrix sample label").split()
+
+
+def synthetic_text(n_chars, seed=0):
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < n_chars:
+        sentences = [
+            " ".join(rng.choices(WORDS, k=rng.randint(6, 24))).capitalize() + rng.choice(".?!")
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def measure(chunk, documents, n_chars, repeat):
+    best, n_chunks = float("inf"), 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        n_chunks = sum(1 for _ in chunk(documents))
+        best = min(best, time.perf_counter() - started)
+    return {"seconds": best, "chunks": n_chunks, "mchars_per_second": n_chars / best / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=10, help="corpus size in millions of characters")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--token-chunk-size", type=int, default=256)
+    parser.add_argument("--token-chunk-overlap", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    per_doc = int(args.mb * 1e6 / args.docs)
+    documents = [Document(page_content=synthetic_text(per_doc, seed=i), metadata={"source": f"doc-{i}"})
+                 for i in range(args.docs)]
+    n_chars = sum(len(document.page_content) for document in documents)
+
+    chars = TextChunker(args.chunk_size, args.chunk_overlap, unit="chars")
+    tokens = TextChunker(args.token_chunk_size, args.token_chunk_overlap, unit="tokens")
+    report = {
+        "chars": n_chars,
+        "documents": args.docs,
+        "text_chunker_chars": measure(chars.iter_chunks, documents, n_chars, args.repeat),
+        "text_chunker_tokens": measure(tokens.iter_chunks, documents, n_chars, args.repeat),
+    }
+
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        pass
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+                                                  add_start_index=True)
+        report["recursive_character_text_splitter"] = measure(splitter.split_documents, documents, n_chars,
+                                                              args.repeat)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Microbenchmark of document deduplication and reciprocal rank fusion.
+
+Compares the id-based ``MultiQueryRetriever.get_unique_union`` and
+``FusionRetriever.reciprocal_rank_fusion`` against the previous approach of
+round-tripping every document through ``langchain.load.dumps``/``loads``.
+
+    python -m benchmarks.bench_document_identity --queries 10 --k 50 --chunk-chars 4000
+"""
+import argparse
+import json
+import random
+import time
+
+from langchain.load import dumps, loads
+from langchain.schema import Document
+
+from rag_toolkit.retriever import FusionRetriever, MultiQueryRetriever
+from rag_toolkit.utils import assign_document_ids
+
+
+def legacy_unique_union(documents):
+    flattened_docs = [dumps(doc) for sublist in documents for doc in sublist]
+    return [loads(doc) for doc in set(flattened_docs)]
+
+
+def legacy_reciprocal_rank_fusion(results, k=60):
+    fused_scores = {}
+    for docs in results:
+        for rank, doc in enumerate(docs):
+            doc_str = dumps(doc)
+            fused_scores[doc_str] = fused_scores.get(doc_str, 0) + 1 / (rank + k)
+    return [(loads(doc), score) for doc, score in sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)]
+
+
+def best_of(fn, arg, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - started)
+    return 1000 * min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=10, help="generated queries per request")
+    parser.add_argument("--k", type=int, default=50, help="documents retrieved per query")
+    parser.add_argument("--chunk-chars", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    filler = "lorem ipsum dolor sit amet " * (args.chunk_chars // 27 + 1)
+    corpus = [
+        Document(page_content=f"{i} {filler[:args.chunk_chars]}", metadata={"source": "bench.pdf", "page": i})
+        for i in range(args.corpus)
+    ]
+    hashed = [[rng.choice(corpus) for _ in range(args.k)] for _ in range(args.queries)]
+    stamped_corpus = assign_document_ids([Document(page_content=d.page_content, metadata=dict(d.metadata))
+                                          for d in corpus])
+    stamped = [[stamped_corpus[int(d.metadata["page"])] for d in results] for results in hashed]
+
+    union = MultiQueryRetriever.get_unique_union
+    fusion = FusionRetriever.reciprocal_rank_fusion
+    report = {
+        "queries": args.queries,
+        "k": args.k,
+        "chunk_chars": args.chunk_chars,
+        "unique_union_ms": {
+            "dumps_loads": best_of(legacy_unique_union, hashed, args.repeat),
+            "content_hash": best_of(lambda r: union(None, r), hashed, args.repeat),
+            "precomputed_id": best_of(lambda r: union(None, r), stamped, args.repeat),
+        },
+        "reciprocal_rank_fusion_ms": {
+            "dumps_loads": best_of(legacy_reciprocal_rank_fusion, hashed, args.repeat),
+            "content_hash": best_of(lambda r: fusion(None, r), hashed, args.repeat),
+            "precomputed_id": best_of(lambda r: fusion(None, r), stamped, args.repeat),
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
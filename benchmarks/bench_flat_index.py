@@ -0,0 +1,121 @@
+"""Compare the in-process FlatVectorIndex with the Chroma backend.
+
+Measures build time, single and batched query latency and memory for both
+backends on a synthetic corpus. Embeddings are precomputed so the numbers
+reflect the index, not the embeddings model.
+
+    python -m benchmarks.bench_flat_index --docs 50000 --dim 768
+"""
+import argparse
+import gc
+import json
+import resource
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from rag_toolkit.flat_index import FlatVectorIndex
+from rag_toolkit.vector_store import create_vector_store
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """Looks vectors up in a table so that embedding cost is ~zero."""
+
+    def __init__(self, texts, dim, seed=0):
+        rng = np.random.default_rng(seed)
+        self.table = dict(zip(texts, rng.standard_normal((len(texts), dim), dtype=np.float32).tolist()))
+        self.dim = dim
+        self.rng = rng
+
+    def embed_documents(self, texts):
+        return [self.table[text] for text in texts]
+
+    def embed_query(self, text):
+        vector = self.table.get(text)
+        return vector if vector is not None else self.rng.standard_normal(self.dim).tolist()
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_build(build):
+    gc.collect()
+    tracemalloc.start()
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    store = build()
+    seconds = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, {
+        "build_seconds": seconds,
+        "python_heap_mb": current / 2 ** 20,
+        "python_peak_mb": peak / 2 ** 20,
+        "max_rss_growth_mb": rss_mb() - rss_before,
+    }
+
+
+def latency_stats(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": 1000 * statistics.median(samples),
+        "p95_ms": 1000 * samples[int(0.95 * (len(samples) - 1))],
+        "mean_ms": 1000 * statistics.fmean(samples),
+    }
+
+
+def measure_queries(search, queries):
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        samples.append(time.perf_counter() - started)
+    return latency_stats(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=64, help="queries per batched call")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--backends", default="flat,chroma")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    texts = [f"synthetic chunk {i}" for i in range(args.docs)]
+    documents = [Document(page_content=text, metadata={"chunk": i}) for i, text in enumerate(texts)]
+    embeddings = PrecomputedEmbeddings(texts, args.dim)
+    queries = [texts[i] for i in np.random.default_rng(1).integers(0, args.docs, args.queries)]
+    query_vectors = [embeddings.embed_query(query) for query in queries]
+
+    report = {"docs": args.docs, "dim": args.dim, "k": args.k, "backends": {}}
+    for backend in args.backends.split(","):
+        store, result = measure_build(lambda: create_vector_store(documents, embeddings, backend=backend))
+        result["query"] = measure_queries(lambda q: store.similarity_search(q, k=args.k), queries)
+        result["query_by_vector"] = measure_queries(lambda v: store.similarity_search_by_vector(v, k=args.k),
+                                                    query_vectors)
+        if isinstance(store, FlatVectorIndex):
+            batches = [query_vectors[i:i + args.batch] for i in range(0, len(query_vectors), args.batch)]
+            batch = measure_queries(lambda b: store.similarity_search_with_score_by_vectors(b, k=args.k), batches)
+            batch["per_query_ms"] = batch["mean_ms"] / args.batch
+            result["batched_query"] = batch
+        report["backends"][backend] = result
+        del store
+        gc.collect()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Cold-start import time of the package and each submodule.
+
+Every import is timed in a fresh interpreter. The report lists the median
+import time per module and the heavy optional dependencies it loaded. The
+command exits with status 1 when a module goes over its budget or loads a
+dependency that should only be imported on first use, so it can run as a
+regression check in CI.
+
+    python -m benchmarks.bench_import_time --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Seconds, measured on a small cloud VM; scale with --budget-scale on slower machines.
+BUDGETS = {
+    "rag_toolkit": 0.05,
+    "rag_toolkit.utils": 0.05,
+    "rag_toolkit.streaming": 0.05,
+    "rag_toolkit.google_models": 0.05,
+    "rag_toolkit.data_loader": 0.4,
+    "rag_toolkit.chunking": 0.4,
+    "rag_toolkit.chunk_store": 0.4,
+    "rag_toolkit.flat_index": 0.6,
+    "rag_toolkit.cache": 0.6,
+    "rag_toolkit.embedding_cache": 0.6,
+    "rag_toolkit.context": 0.6,
+    "rag_toolkit.tracing": 0.6,
+    "rag_toolkit.vector_store": 0.8,
+    "rag_toolkit.retriever": 1.0,
+    "rag_toolkit.generator": 1.0,
+    "rag_toolkit.routing": 1.0,
+    "rag_toolkit.pipeline": 1.0,
+    "rag_toolkit.lexical_index": 1.2,
+    "rag_toolkit.fakes": 1.2,
+}
+
+# Only imported when the feature needing them is first used.
+LAZY_DEPENDENCIES = ["chromadb", "langchain_community", "langchain_google_genai", "langchain", "pypdf"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_DEPENDENCIES)],
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return statistics.median(run["seconds"] for run in runs), runs[0]["loaded"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per module")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget by this factor")
+    parser.add_argument("--modules", help="comma-separated subset of modules to measure")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    modules = args.modules.split(",") if args.modules else list(BUDGETS)
+    report = {"budget_scale": args.budget_scale, "modules": {}, "failures": []}
+    for module in modules:
+        seconds, loaded = measure(module, args.repeat)
+        budget = BUDGETS.get(module)
+        report["modules"][module] = {"seconds": seconds, "budget": budget, "lazy_dependencies_loaded": loaded}
+        if budget is not None and seconds > budget * args.budget_scale:
+            report["failures"].append(f"{module} took {seconds:.3f}s, budget {budget * args.budget_scale:.3f}s")
+        if loaded:
+            report["failures"].append(f"{module} imported {', '.join(loaded)} at load time")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    sys.exit(1 if report["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
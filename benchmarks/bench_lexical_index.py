@@ -0,0 +1,100 @@
+"""BM25 lexical index on a large synthetic corpus.
+
+Reports build and incremental-add throughput, postings memory, query latency
+for the lexical-only path and for hybrid (BM25 + flat vector) retrieval, and
+recall@1 for queries on identifiers planted in random documents.
+
+    python -m benchmarks.bench_lexical_index --docs 200000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from langchain.schema import Document
+
+from benchmarks.bench_flat_index import PrecomputedEmbeddings, measure_queries
+from rag_toolkit.flat_index import FlatVectorIndex
+from rag_toolkit.lexical_index import BM25Index, HybridRetriever
+
+
+def synthetic_corpus(n_docs, vocabulary, doc_tokens, identifiers, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    # Zipf-like term frequencies, like natural language
+    probabilities = 1.0 / np.arange(1, vocabulary + 1)
+    probabilities /= probabilities.sum()
+    planted = dict(zip(rng.choice(n_docs, size=identifiers, replace=False).tolist(),
+                       (f"ERR_{i:06d}" for i in range(identifiers))))
+
+    documents = []
+    for i in range(n_docs):
+        text = " ".join(rng.choice(words, size=doc_tokens, p=probabilities))
+        if i in planted:
+            text += f" raised {planted[i]}"
+        documents.append(Document(page_content=text, metadata={"source": f"doc-{i}"}))
+    return documents, planted, words, probabilities, rng
+
+
+def postings_mb(index):
+    arrays = index._postings_rows + index._postings_freqs
+    return sum(a.buffer_info()[1] * a.itemsize for a in arrays) / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--doc-tokens", type=int, default=100)
+    parser.add_argument("--identifiers", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256, help="embedding dimension for the hybrid run")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    documents, planted, words, probabilities, rng = synthetic_corpus(
+        args.docs, args.vocabulary, args.doc_tokens, args.identifiers)
+    initial, extra = documents[:int(0.99 * len(documents))], documents[int(0.99 * len(documents)):]
+
+    started = time.perf_counter()
+    index = BM25Index.from_documents(initial)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index.add_documents(extra)
+    add_seconds = time.perf_counter() - started
+
+    queries = [" ".join(rng.choice(words, size=rng.integers(2, 5), p=probabilities))
+               for _ in range(args.queries)]
+    identifier_queries = [(row, f"what does {code} mean") for row, code in list(planted.items())[:args.queries]]
+    hits = sum(index.search(query, 1)[:1] == [documents[row]] for row, query in identifier_queries)
+
+    report = {
+        "documents": args.docs,
+        "terms": len(index._terms),
+        "build_seconds": build_seconds,
+        "build_docs_per_second": len(initial) / build_seconds,
+        "incremental_add_docs_per_second": len(extra) / add_seconds,
+        "postings_mb": postings_mb(index),
+        "lexical_query": measure_queries(lambda query: index.search(query, args.k), queries),
+        "identifier_recall_at_1": hits / len(identifier_queries) if identifier_queries else None,
+    }
+
+    texts = [document.page_content for document in documents]
+    embeddings = PrecomputedEmbeddings(texts, args.dim)
+    vectors = FlatVectorIndex(embeddings)
+    vectors.add_embeddings(list(index._ids), documents, embeddings.embed_documents(texts))
+    hybrid = HybridRetriever(index=index, vector_retriever=vectors.as_retriever(search_kwargs={"k": 10}), k=args.k)
+    report["vector_query"] = measure_queries(lambda query: vectors.similarity_search(query, args.k), queries)
+    report["hybrid_query"] = measure_queries(hybrid.invoke, queries)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
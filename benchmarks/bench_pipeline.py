@@ -0,0 +1,182 @@
+"""Offline end-to-end benchmark of the toolkit.
+
+Every model is a deterministic fake from ``rag_toolkit.fakes`` with injected
+latency, so runs need no network and are reproducible. Reports ingestion
+throughput and vector search latency per backend, latency, throughput and
+per-request call counts for every retriever/generator pairing, router
+latency, and peak memory of each section.
+
+    python -m benchmarks.bench_pipeline --docs 5000 --queries 20 --llm-latency 0.05
+"""
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+from langchain.schema import Document
+
+from benchmarks.bench_flat_index import latency_stats, measure_queries, rss_mb
+from rag_toolkit import generator as G
+from rag_toolkit import retriever as R
+from rag_toolkit.fakes import FakeChatModel, FakeEmbeddings
+from rag_toolkit.pipeline import RagPipeline
+from rag_toolkit.routing import EmbedRouter, QueryRouter, TieredQueryRouter
+from rag_toolkit.tracing import InMemoryExporter, Tracer
+from rag_toolkit.vector_store import create_vector_store
+
+PAIRINGS = [
+    (R.SimpleRetriever, G.SimpleGenerator),
+    (R.MultiQueryRetriever, G.MultiQueryGenerator),
+    (R.FusionRetriever, G.FusionGenerator),
+    (R.DecomposeRetriever, G.RecursiveGenerator),
+    (R.DecomposeRetriever, G.IndividualGenerator),
+    (R.StepBackRetriever, G.StepBackGenerator),
+    (R.HyDERetriever, G.HyDEGenerator),
+]
+
+DATASOURCES = ["python_docs", "js_docs", "golang_docs"]
+
+
+def synthetic_corpus(n_docs, doc_words, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(5000)])
+    return [Document(page_content=" ".join(rng.choice(words, size=doc_words)), metadata={"source": f"doc-{i}"})
+            for i in range(n_docs)], words, rng
+
+
+class peak_memory:
+    """Records the peak Python heap allocated inside the block, in ``self.mb``."""
+
+    def __enter__(self):
+        gc.collect()
+        tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+
+def bench_pairing(retrieval_cls, generator_cls, llm, base_retriever, queries, concurrency):
+    exporter = InMemoryExporter()
+    pipeline = RagPipeline(retrieval_cls(model=llm, base_retriever=base_retriever), generator_cls(model=llm),
+                           tracer=Tracer([exporter]))
+    samples = []
+    started = time.perf_counter()
+    for query in queries:
+        query_started = time.perf_counter()
+        pipeline.process(query)
+        samples.append(time.perf_counter() - query_started)
+    sequential_seconds = time.perf_counter() - started
+
+    async def run_concurrently():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(query):
+            async with semaphore:
+                await pipeline.aprocess(query)
+
+        await asyncio.gather(*(one(query) for query in queries))
+
+    started = time.perf_counter()
+    asyncio.run(run_concurrently())
+    async_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pipeline.process_batch(queries, max_concurrency=concurrency)
+    batch_seconds = time.perf_counter() - started
+
+    traces = exporter.traces[:len(queries)]
+    counters = sorted({name for trace in traces for name in trace.counters})
+    return {
+        "latency": latency_stats(samples),
+        "sequential_qps": len(queries) / sequential_seconds,
+        "async_qps": len(queries) / async_seconds,
+        "batch_qps": len(queries) / batch_seconds,
+        "per_request": {name: statistics.fmean(trace.counters.get(name, 0) for trace in traces) for name in counters},
+    }
+
+
+def bench_routers(args, embeddings, queries):
+    llm = FakeChatModel(latency=args.llm_latency, choices=DATASOURCES)
+    keywords = {"python_docs": ["python"], "js_docs": ["javascript"], "golang_docs": ["golang"]}
+    examples = {source: [f"question about {source} {i}" for i in range(5)] for source in DATASOURCES}
+    routers = {
+        "llm": QueryRouter(llm, DATASOURCES),
+        "tiered": TieredQueryRouter(llm, DATASOURCES, keywords=keywords, examples=examples,
+                                    embeddings_model=embeddings),
+    }
+    # half of the queries name their datasource, the rest need the slower tiers
+    mixed = [f"{query} in {name}" if i % 2 else query
+             for i, (query, name) in enumerate(zip(queries, ["python", "javascript", "golang"] * len(queries)))]
+    report = {name: measure_queries(router.route, mixed) for name, router in routers.items()}
+    report["tiered"]["fast_path_rate"] = routers["tiered"].fast_path_rate
+
+    embed_router = EmbedRouter(embeddings, [f"You answer questions about {source}." for source in DATASOURCES])
+    report["embed"] = measure_queries(embed_router.route_query, mixed)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--doc-words", type=int, default=80)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--backends", default="flat,chroma")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per chat model call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per generated word")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="seconds per embeddings call")
+    parser.add_argument("--embed-text-latency", type=float, default=0.0001, help="seconds per embedded text")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    documents, words, rng = synthetic_corpus(args.docs, args.doc_words, args.seed)
+    queries = [" ".join(rng.choice(words, size=6)) for _ in range(args.queries)]
+    embeddings = FakeEmbeddings(size=args.dim, latency=args.embed_latency,
+                                per_text_latency=args.embed_text_latency, seed=args.seed)
+    llm = FakeChatModel(latency=args.llm_latency, per_token_latency=args.token_latency, seed=args.seed)
+
+    config = {name: value for name, value in vars(args).items() if name != "output"}
+    report = {"config": config, "backends": {}, "pairings": {}}
+    stores = {}
+    for backend in args.backends.split(","):
+        with peak_memory() as memory:
+            started = time.perf_counter()
+            stores[backend] = create_vector_store(documents, embeddings, backend=backend)
+            seconds = time.perf_counter() - started
+        report["backends"][backend] = {
+            "ingest_seconds": seconds,
+            "ingest_docs_per_second": args.docs / seconds,
+            "ingest_peak_mb": memory.mb,
+            "search": measure_queries(lambda q: stores[backend].similarity_search(q, k=args.k), queries),
+        }
+
+    base_retriever = stores[args.backends.split(",")[0]].as_retriever(search_kwargs={"k": args.k})
+    for retrieval_cls, generator_cls in PAIRINGS:
+        with peak_memory() as memory:
+            result = bench_pairing(retrieval_cls, generator_cls, llm, base_retriever, queries, args.concurrency)
+        result["peak_mb"] = memory.mb
+        report["pairings"][f"{retrieval_cls.__name__}/{generator_cls.__name__}"] = result
+
+    with peak_memory() as memory:
+        report["routers"] = bench_routers(args, embeddings, queries)
+    report["routers"]["peak_mb"] = memory.mb
+    report["max_rss_mb"] = rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Recall, memory and latency of quantized FlatVectorIndex vectors.
+
+Builds a float32 index and an ``int8`` index over the same synthetic
+clustered embeddings. Queries are noisy copies of random
+corpus vectors. Every quantized index is searched with each ``--rescore``
+factor, where ``0`` ranks on the codes alone. The report gives recall@k
+against the exact float32 results, the memory held by the vectors, the size of
+the memory-mapped float32 file and single-query and batched latency.
+
+    python -m benchmarks.bench_quantization --docs 200000 --dim 768 --k 10 --rescore 0,2,4,8
+"""
+import argparse
+import gc
+import json
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from benchmarks.bench_flat_index import measure_queries, rss_mb
+from rag_toolkit.fakes import FakeEmbeddings
+from rag_toolkit.flat_index import QUANTIZATIONS, FlatVectorIndex
+
+
+def synthetic_embeddings(n_docs, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, n_docs)]
+    vectors += 0.6 * rng.standard_normal((n_docs, dim), dtype=np.float32)
+    return vectors
+
+
+def noisy_queries(vectors, n_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), n_queries)]
+    return queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+
+def build(quantization, ids, documents, vectors, batch_size=10000):
+    index = FlatVectorIndex(FakeEmbeddings(size=vectors.shape[1]), quantization=quantization)
+    started = time.perf_counter()
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        index.add_embeddings(ids[start:end], documents[start:end], vectors[start:end])
+    return index, time.perf_counter() - started
+
+
+def search_ids(index, queries, k, batch):
+    results = []
+    for start in range(0, len(queries), batch):
+        hits = index.similarity_search_with_score_by_vectors(queries[start:start + batch], k)
+        results.extend([doc.id for doc, _ in row] for row in hits)
+    return results
+
+
+def recall_at_k(results, truth):
+    return float(np.mean([len(set(found) & set(exact)) / len(exact) for found, exact in zip(results, truth)]))
+
+
+def measure_search(index, queries, args):
+    batches = [queries[i:i + args.batch] for i in range(0, len(queries), args.batch)]
+    batched = measure_queries(lambda b: index.similarity_search_with_score_by_vectors(b, k=args.k), batches)
+    batched["per_query_ms"] = batched["mean_ms"] / args.batch
+    return {
+        "query_by_vector": measure_queries(lambda v: index.similarity_search_by_vector(v, k=args.k), queries),
+        "batched_query": batched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32, help="queries per batched call")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", default="0,2,4,8", help="comma-separated rescore factors")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.docs, args.dim, args.clusters)
+    queries = noisy_queries(vectors, args.queries)
+    ids = [f"chunk-{i}" for i in range(args.docs)]
+    documents = [Document(id=doc_id, page_content=doc_id) for doc_id in ids]
+
+    report = {"docs": args.docs, "dim": args.dim, "k": args.k, "indexes": {}}
+    exact, seconds = build(None, ids, documents, vectors)
+    truth = search_ids(exact, queries, args.k, args.batch)
+    report["indexes"]["float32"] = {
+        "build_seconds": seconds,
+        "vectors_mb": exact.nbytes / 2 ** 20,
+        "recall_at_k": 1.0,
+        **measure_search(exact, queries, args),
+    }
+    del exact
+    gc.collect()
+
+    for quantization in QUANTIZATIONS:
+        index, seconds = build(quantization, ids, documents, vectors)
+        result = {
+            "build_seconds": seconds,
+            "vectors_mb": index.nbytes / 2 ** 20,
+            "memory_mapped_mb": index.vectors.nbytes / 2 ** 20,
+            "rescore": {},
+        }
+        for rescore in [int(factor) for factor in args.rescore.split(",")]:
+            index.rescore = rescore
+            result["rescore"][str(rescore)] = {
+                "recall_at_k": recall_at_k(search_ids(index, queries, args.k, args.batch), truth),
+                **measure_search(index, queries, args),
+            }
+        report["indexes"][quantization] = result
+        del index
+        gc.collect()
+    report["max_rss_mb"] = rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Load test of ``app.server`` with fake models.
+
+Starts the server in a subprocess with ``--fake``, sends ``--requests``
+queries from ``--clients`` concurrent keep-alive connections and reports
+throughput, latency percentiles and the count of each status code
+(``429`` when admission control rejects a query, ``504`` on timeout). It
+ends by reading ``/metrics`` and shutting the server down with SIGTERM.
+
+    python -m benchmarks.bench_server --clients 64 --requests 2000 --max-concurrency 16 --max-queue 32
+"""
+import argparse
+import asyncio
+import json
+import signal
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_flat_index import latency_stats
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, json.loads(await reader.readexactly(int(headers["content-length"])))
+
+
+async def get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return await request(reader, writer, "GET", path)
+    finally:
+        writer.close()
+
+
+async def wait_until_healthy(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await get(host, port, "/health"))[0] == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"Server not healthy after {timeout}s")
+
+
+async def load(host, port, clients, total, queries):
+    statuses, latencies = {}, []
+    counter = iter(range(total))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in counter:
+            started = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", "/query", {"query": queries[i % len(queries)]})
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - started, statuses, latencies
+
+
+async def run(args, server):
+    await wait_until_healthy(args.host, args.port, args.startup_timeout)
+    queries = [f"question {i} about topic {i % 50}" for i in range(args.distinct_queries)]
+    seconds, statuses, latencies = await load(args.host, args.port, args.clients, args.requests, queries)
+    _, metrics = await get(args.host, args.port, "/metrics")
+
+    server.send_signal(signal.SIGTERM)
+    started = time.perf_counter()
+    returncode = await asyncio.to_thread(server.wait, args.startup_timeout)
+    return {
+        "requests": args.requests,
+        "clients": args.clients,
+        "seconds": seconds,
+        "throughput_qps": statuses.get(200, 0) / seconds,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "latency": latency_stats(latencies) if latencies else None,
+        "server_metrics": metrics,
+        "shutdown_seconds": time.perf_counter() - started,
+        "shutdown_returncode": returncode,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--distinct-queries", type=int, default=100)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args, server_args = parser.parse_known_args()
+
+    server = subprocess.Popen([sys.executable, "-m", "app.server", "--fake", "--host", args.host,
+                               "--port", str(args.port), "--log-level", "WARNING", *server_args])
+    try:
+        report = asyncio.run(run(args, server))
+    finally:
+        if server.poll() is None:
+            server.kill()
+    report["server_args"] = server_args
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
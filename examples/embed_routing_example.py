@@ -15,4 +15,7 @@ templates = [
 # Initialize EmbedRouter with a set of general templates
 embed_router = EmbedRouter(llm, templates)
 
-print(embed_router.route_query( "What is quantum entanglement?")) 
\ No newline at end of file
+print(embed_router.route_query( "What is quantum entanglement?")) 
+# Route a batch of queries: the distinct queries are embedded concurrently, then scored with one matrix product
+for prompt in embed_router.route_queries(["How do I reverse a list in Python?", "Is 97 a prime number?"]):
+    print(prompt)
@@ -27,3 +27,21 @@ l.foreach(l=> print(l+1))
 selected_datasource = router.route(question)
 
 print(f"Selected Datasource: {selected_datasource}")
+
+
+# Skip the LLM call when keyword rules are confident
+from rag_toolkit.routing import TieredQueryRouter
+
+tiered_router = TieredQueryRouter(
+    model=llm,
+    datasources=datasources,
+    keywords={
+        "python_docs": ["python", "pip", "pandas", "django"],
+        "js_docs": ["javascript", "npm", "react", "const"],
+        "golang_docs": ["golang", "goroutine"],
+        "ruby_docs": ["ruby", "rails", "gem"],
+    },
+)
+
+print(tiered_router.route_batch([question, "How do I install a gem?", "How do goroutines share memory?"]))
+print(tiered_router.stats())
@@ -0,0 +1,47 @@
+"""RAG Toolkit.
+
+The public names below are importable from the package itself
+(``from rag_toolkit import RagPipeline``). Submodules are only imported when
+one of their names is first accessed, so ``import rag_toolkit`` is instant and
+a caller pays only for the parts it uses.
+"""
+import importlib
+
+_EXPORTS = {
+    "cache": ["InMemoryCache", "QueryCache", "SQLiteCache", "SemanticAnswerCache"],
+    "chunk_store": ["ChunkRef", "ChunkStore"],
+    "chunking": ["TextChunker", "chunk_documents", "iter_chunks"],
+    "context": ["ContextPacker", "PackingReport"],
+    "data_loader": ["load_csv_documents", "load_directory", "load_documents", "load_json_documents",
+                    "load_pdf_pages", "load_text_documents"],
+    "embedding_cache": ["EmbeddingCache"],
+    "fakes": ["FakeChatModel", "FakeEmbeddings"],
+    "flat_index": ["FlatVectorIndex"],
+    "generator": ["FusionGenerator", "HyDEGenerator", "IndividualGenerator", "MultiQueryGenerator",
+                  "RecursiveGenerator", "SimpleGenerator", "StepBackGenerator"],
+    "google_models": ["initialize_embedding", "initialize_llm"],
+    "lexical_index": ["BM25Index", "HybridRetriever", "LexicalRetriever", "create_lexical_retriever"],
+    "pipeline": ["BatchResult", "RagPipeline"],
+    "retriever": ["DecomposeRetriever", "FusionRetriever", "HyDERetriever", "MultiQueryRetriever",
+                  "SimpleRetriever", "StepBackRetriever"],
+    "routing": ["EmbedRouter", "QueryRouter", "TieredQueryRouter"],
+    "tracing": ["Tracer"],
+    "vector_store": ["EmbeddingIngestor", "IncrementalVectorStore", "create_hybrid_retriever",
+                     "create_vector_store", "create_vector_store_retriever"],
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
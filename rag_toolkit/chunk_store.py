@@ -0,0 +1,411 @@
+import copy
+import json
+import mmap
+import os
+import tempfile
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .utils import DOC_ID_KEY, content_hash, stable_hash
+
+_MISSING = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+
+
+def _id_hash(doc_id: str) -> int:
+    return int.from_bytes(bytes.fromhex(stable_hash(doc_id, digest_size=8)), "little", signed=True)
+
+
+class _Column:
+    """One metadata key. Integer values that fit in 64 bits are stored as they
+    are, anything else (including ``_MISSING`` itself) as a code into the
+    store's table of interned values; ``_MISSING`` marks rows without the key."""
+
+    __slots__ = ("interned", "values")
+
+    def __init__(self, rows: int):
+        self.interned = False
+        self.values = array("q", [_MISSING]) * rows
+
+    def encode(self, value: Any, store: "ChunkStore") -> int:
+        if not self.interned:
+            if type(value) is int and _MISSING < value <= _INT64_MAX:
+                return value
+            self.interned = True
+            self.values = array("q", (_MISSING if v == _MISSING else store._intern(v) for v in self.values))
+        return store._intern(value)
+
+    def decode(self, code: int, store: "ChunkStore") -> Any:
+        if not self.interned:
+            return code
+        value = store._values[code]
+        return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+
+
+class ChunkRef:
+    """Lightweight reference to one chunk of a ``ChunkStore``.
+
+    Quacks like a ``Document``: ``page_content``, ``metadata`` and ``id`` are
+    read from the store on first access and the ``Document`` built from them
+    is cached, so only the chunks a caller actually reads are materialised.
+    Two refs are equal, and hash alike, when they point at the same row of the
+    same store. A ref never equals a ``Document``, since equal objects must
+    hash alike; compare ``to_document()`` for content equality.
+    """
+
+    __slots__ = ("store", "row", "_document")
+
+    type = "Document"
+
+    def __init__(self, store: "ChunkStore", row: int):
+        self.store = store
+        self.row = row
+        self._document = None
+
+    def to_document(self) -> Document:
+        if self._document is None:
+            self._document = self.store.document(self.row)
+        return self._document
+
+    @property
+    def page_content(self) -> str:
+        return self.to_document().page_content
+
+    @property
+    def metadata(self) -> dict:
+        return self.to_document().metadata
+
+    @property
+    def id(self) -> Optional[str]:
+        return self.to_document().id
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ChunkRef):
+            return self.store is other.store and self.row == other.row
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), self.row))
+
+    def __repr__(self) -> str:
+        return repr(self.to_document())
+
+
+class ChunkStore:
+    """Columnar, append-only storage for millions of chunks.
+
+    Ids and texts are appended to a single UTF-8 blob that is read back through
+    ``mmap``; per row the store keeps only a few fixed-size array entries (blob
+    offset, id and text lengths, 64-bit id hash) and one entry per metadata
+    column. Integer metadata is stored inline and every other value is interned,
+    so a ``source`` shared by a thousand chunks is held once. Nothing here is a
+    per-chunk Python object, which keeps both memory and GC work flat as the
+    corpus grows; ``ref`` hands out ``ChunkRef`` objects that build a
+    ``Document`` only when read.
+
+    Adding a document whose id is already stored overwrites that row in place
+    (the old text stays in the blob as garbage). ``version`` is bumped on every
+    write.
+    """
+
+    BLOB_FILE = "chunks.bin"
+    COLUMNS_FILE = "columns.npz"
+    METADATA_FILE = "chunks.json"
+
+    # Id hashes of new rows are kept in a dict and merged into the sorted lookup table at this size.
+    MERGE_THRESHOLD = 1 << 16
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path (str, optional): Directory holding the blob, created if missing. A
+                directory that already holds a saved store is refused; ``load`` re-opens
+                it. Without a path the blob lives in an anonymous temporary file.
+        """
+        if path is not None and self.exists(path):
+            raise ValueError(f"{path} already holds a saved ChunkStore; open it with ChunkStore.load")
+        self._open(path, blob_size=0)
+
+    def _open(self, path: Optional[str], blob_size: int):
+        self.path = path
+        if path is None:
+            self._file = tempfile.TemporaryFile()
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._file = open(os.path.join(path, self.BLOB_FILE), "a+b")
+            self._file.truncate(blob_size)
+        self._blob_size = blob_size
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped = 0
+
+        self._starts = array("q")
+        self._id_lengths = array("i")
+        self._text_lengths = array("i")
+        self._hashes = array("q")
+        self._columns: Dict[str, _Column] = {}
+        self._values: List[Any] = []
+        self._codes: Dict[Any, int] = {}
+
+        self._sorted_hashes = np.empty(0, dtype=np.int64)
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+        self._recent: Dict[int, int] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    # ------------------------------------------------------------------ #
+    # Writes
+    # ------------------------------------------------------------------ #
+    def add_documents(self, documents: Iterable[Document], ids: Optional[Iterable[str]] = None) -> List[int]:
+        """Append ``documents`` (any iterable, consumed lazily) and return their rows.
+
+        The id of each document is taken from ``ids``, else from
+        ``metadata["doc_id"]``, else its content hash, the same defaults as
+        ``assign_document_ids``.
+        """
+        ids = iter(ids) if ids is not None else None
+        rows = []
+        for document in documents:
+            doc_id = next(ids) if ids is not None else None
+            doc_id = doc_id or document.metadata.get(DOC_ID_KEY) or content_hash(document)
+            id_bytes = doc_id.encode("utf-8")
+            text_bytes = document.page_content.encode("utf-8")
+            start = self._write(id_bytes + text_bytes)
+
+            h = _id_hash(doc_id)
+            row = self._find(doc_id, h)
+            if row is None:
+                row = len(self._starts)
+                self._starts.append(start)
+                self._id_lengths.append(len(id_bytes))
+                self._text_lengths.append(len(text_bytes))
+                self._hashes.append(h)
+                if h in self._recent or len(self._recent) >= self.MERGE_THRESHOLD:
+                    self._merge_recent()
+                self._recent[h] = row
+                for column in self._columns.values():
+                    column.values.append(_MISSING)
+            else:
+                self._starts[row] = start
+                self._text_lengths[row] = len(text_bytes)
+                for column in self._columns.values():
+                    column.values[row] = _MISSING
+            self._set_metadata(row, document.metadata)
+            rows.append(row)
+
+        if rows:
+            self.version += 1
+        return rows
+
+    def delete(self, ids: Sequence[str]) -> List[int]:
+        """Remove ``ids`` and return the rows they had. Later rows move up to close the gaps."""
+        removed = sorted({row for row in (self.row_of(doc_id) for doc_id in ids) if row is not None})
+        if not removed:
+            return []
+        keep = np.ones(len(self), dtype=bool)
+        keep[removed] = False
+
+        def compact(column: array) -> array:
+            return array(column.typecode, np.frombuffer(column, dtype=column.typecode)[keep].tobytes())
+
+        self._starts = compact(self._starts)
+        self._id_lengths = compact(self._id_lengths)
+        self._text_lengths = compact(self._text_lengths)
+        self._hashes = compact(self._hashes)
+        for column in self._columns.values():
+            column.values = compact(column.values)
+        self._rebuild_lookup()
+        self.version += 1
+        return removed
+
+    def _write(self, data: bytes) -> int:
+        start = self._blob_size
+        self._file.write(data)
+        self._blob_size += len(data)
+        return start
+
+    def _set_metadata(self, row: int, metadata: dict):
+        for key, value in metadata.items():
+            if key == DOC_ID_KEY:
+                continue
+            column = self._columns.get(key)
+            if column is None:
+                column = self._columns[key] = _Column(len(self))
+            column.values[row] = column.encode(value, self)
+
+    def _intern(self, value: Any) -> int:
+        try:
+            key = (type(value), value)
+            hash(key)
+        except TypeError:
+            key = (type(value), json.dumps(value, sort_keys=True, default=str))
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self._values)
+            self._values.append(copy.deepcopy(value) if isinstance(value, (list, dict)) else value)
+        return code
+
+    # ------------------------------------------------------------------ #
+    # Reads
+    # ------------------------------------------------------------------ #
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Row of ``doc_id``, or ``None`` when it is not stored."""
+        return self._find(doc_id, _id_hash(doc_id))
+
+    def _find(self, doc_id: str, h: int) -> Optional[int]:
+        candidates = [self._recent[h]] if h in self._recent else []
+        if len(self._sorted_hashes):
+            lo = np.searchsorted(self._sorted_hashes, h, side="left")
+            hi = np.searchsorted(self._sorted_hashes, h, side="right")
+            candidates += self._sorted_rows[lo:hi].tolist()
+        for row in candidates:
+            if self.id(row) == doc_id:
+                return row
+        return None
+
+    def rows_of(self, ids: Iterable[str]) -> List[int]:
+        """Rows of the stored ``ids``, skipping unknown ones."""
+        return [row for row in map(self.row_of, ids) if row is not None]
+
+    def id(self, row: int) -> str:
+        start = self._starts[row]
+        return self._blob()[start:start + self._id_lengths[row]].decode("utf-8")
+
+    def ids(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self.id(row)
+
+    def text(self, row: int) -> str:
+        start = self._starts[row] + self._id_lengths[row]
+        return self._blob()[start:start + self._text_lengths[row]].decode("utf-8")
+
+    def texts(self, rows: Iterable[int]) -> List[str]:
+        return [self.text(row) for row in rows]
+
+    def metadata(self, row: int) -> dict:
+        metadata = {}
+        for key, column in self._columns.items():
+            code = column.values[row]
+            if code != _MISSING:
+                metadata[key] = column.decode(code, self)
+        metadata[DOC_ID_KEY] = self.id(row)
+        return metadata
+
+    def document(self, row: int) -> Document:
+        """Build a new ``Document`` for ``row``."""
+        return Document(page_content=self.text(row), metadata=self.metadata(row))
+
+    def ref(self, row: int) -> ChunkRef:
+        return ChunkRef(self, row)
+
+    def iter_documents(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Document]:
+        """Yield a new ``Document`` per row; only one is alive at a time unless the caller keeps it."""
+        for row in range(start, len(self) if stop is None else stop):
+            yield self.document(row)
+
+    @property
+    def blob_nbytes(self) -> int:
+        """Size of the text blob, which lives in the page cache rather than the Python heap."""
+        return self._blob_size
+
+    @property
+    def nbytes(self) -> int:
+        """In-memory size of the row columns and interned values, excluding the mapped blob."""
+        columns = [self._starts, self._id_lengths, self._text_lengths, self._hashes,
+                   *(column.values for column in self._columns.values())]
+        return (sum(column.itemsize * len(column) for column in columns)
+                + self._sorted_hashes.nbytes + self._sorted_rows.nbytes)
+
+    def _blob(self) -> mmap.mmap:
+        if self._mapped < self._blob_size:
+            self._file.flush()
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = self._blob_size
+        return self._mmap
+
+    def _merge_recent(self):
+        rows = np.fromiter(self._recent.values(), dtype=np.int64, count=len(self._recent))
+        hashes = np.frombuffer(self._hashes, dtype=np.int64)[rows]
+        all_hashes = np.concatenate([self._sorted_hashes, hashes])
+        all_rows = np.concatenate([self._sorted_rows, rows])
+        order = np.argsort(all_hashes, kind="stable")
+        self._sorted_hashes, self._sorted_rows = all_hashes[order], all_rows[order]
+        self._recent = {}
+
+    def _rebuild_lookup(self):
+        hashes = np.frombuffer(self._hashes, dtype=np.int64)
+        order = np.argsort(hashes, kind="stable")
+        self._sorted_hashes, self._sorted_rows = hashes[order], order.astype(np.int64)
+        self._recent = {}
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+    def save(self, path: Optional[str] = None):
+        """Write the columns next to the blob; with another ``path`` the blob is copied there too."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("ChunkStore has no path; pass one to save")
+        os.makedirs(path, exist_ok=True)
+        self._file.flush()
+        if path != self.path:
+            with open(os.path.join(path, self.BLOB_FILE), "wb") as f:
+                f.write(self._blob()[:self._blob_size] if self._blob_size else b"")
+
+        columns = {"starts": self._starts, "id_lengths": self._id_lengths,
+                   "text_lengths": self._text_lengths, "hashes": self._hashes}
+        columns.update({f"column_{i}": column.values for i, column in enumerate(self._columns.values())})
+        np.savez(os.path.join(path, self.COLUMNS_FILE),
+                 **{name: np.frombuffer(values, dtype=np.dtype(values.typecode)) for name, values in columns.items()})
+        with open(os.path.join(path, self.METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump({"blob_size": self._blob_size,
+                       "columns": [[key, column.interned] for key, column in self._columns.items()],
+                       "values": self._values}, f, ensure_ascii=False, default=str)
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, cls.METADATA_FILE))
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkStore":
+        """Open a store saved with ``save``; new chunks are appended to the same blob."""
+        with open(os.path.join(path, cls.METADATA_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls.__new__(cls)
+        store._open(path, blob_size=meta["blob_size"])
+
+        with np.load(os.path.join(path, cls.COLUMNS_FILE)) as columns:
+            def load_array(name, typecode):
+                return array(typecode, columns[name].tobytes())
+
+            store._starts = load_array("starts", "q")
+            store._id_lengths = load_array("id_lengths", "i")
+            store._text_lengths = load_array("text_lengths", "i")
+            store._hashes = load_array("hashes", "q")
+            for i, (key, interned) in enumerate(meta["columns"]):
+                column = store._columns[key] = _Column(0)
+                column.values = load_array(f"column_{i}", "q")
+                column.interned = interned
+
+        # JSON turns tuples into lists, so the table is restored as-is rather than re-interned
+        store._values = meta["values"]
+        for code, value in enumerate(store._values):
+            try:
+                store._codes.setdefault((type(value), value), code)
+            except TypeError:
+                store._codes.setdefault((type(value), json.dumps(value, sort_keys=True, default=str)), code)
+        store._rebuild_lookup()
+        return store
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mapped = 0
+        self._file.close()
@@ -0,0 +1,158 @@
+import re
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from .utils import DOC_ID_KEY
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", ". ", "? ", "! ", "; ", ", ", " ")
+
+# Words and individual punctuation marks: a cheap, dependency-free approximation
+# of LLM tokens (roughly 1.3 tokens per English word).
+DEFAULT_TOKEN_PATTERN = r"\w+|[^\w\s]"
+
+
+class TextChunker:
+    """Split text into overlapping chunks on paragraph and sentence boundaries.
+
+    A chunk ends at the last paragraph break inside its size window, falling
+    back to a line break, a sentence end, a clause break and finally a space;
+    only text without any of those is cut mid-word. Boundaries are searched
+    with ``str.rfind`` from the end of the window, so splitting is linear in
+    the length of the text.
+    """
+
+    def __init__(self,
+                 chunk_size: int = 1000,
+                 chunk_overlap: int = 200,
+                 unit: str = "chars",
+                 separators: Sequence[str] = DEFAULT_SEPARATORS,
+                 token_pattern: str = DEFAULT_TOKEN_PATTERN):
+        """
+        Args:
+            chunk_size (int): Maximum chunk length, in ``unit``.
+            chunk_overlap (int): Length shared by consecutive chunks, in ``unit``.
+            unit (str): ``"chars"`` or ``"tokens"``.
+            separators (Sequence[str]): Preferred split points, best first.
+            token_pattern (str): Regex matching one token when ``unit="tokens"``.
+        """
+        if unit not in ("chars", "tokens"):
+            raise ValueError("Unsupported unit. Supported units: chars, tokens")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be non-negative and smaller than chunk_size")
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self.separators = tuple(separators)
+        self.token_regex = re.compile(token_pattern)
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Return the ``(start, end)`` character offsets of every chunk of ``text``."""
+        if self.unit == "tokens":
+            return self._token_spans(text)
+        return self._char_spans(text)
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Lazily chunk ``documents``, keeping their metadata and adding char offsets."""
+        for document in documents:
+            metadata = {key: value for key, value in document.metadata.items() if key != DOC_ID_KEY}
+            text = document.page_content
+            for chunk_index, (start, end) in enumerate(self.split_spans(text)):
+                yield Document(
+                    page_content=text[start:end],
+                    metadata={**metadata, "chunk_index": chunk_index, "start_index": start, "end_index": end},
+                )
+
+    def chunk_documents(self, documents: Iterable[Document]) -> List[Document]:
+        return list(self.iter_chunks(documents))
+
+    # ------------------------------------------------------------------ #
+    # Internals
+    # ------------------------------------------------------------------ #
+    def _boundary(self, text: str, lo: int, hi: int) -> int:
+        """Best split point in ``text[lo:hi]``, or ``hi`` if there is none."""
+        for separator in self.separators:
+            pos = text.rfind(separator, lo, hi)
+            if pos != -1:
+                return pos + len(separator)
+        return hi
+
+    @staticmethod
+    def _trim(text: str, start: int, end: int) -> Tuple[int, int]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def _char_spans(self, text: str) -> List[Tuple[int, int]]:
+        spans = []
+        n = len(text)
+        start = 0
+        while start < n:
+            limit = start + self.chunk_size
+            end = n if limit >= n else self._boundary(text, start + self.chunk_size // 2, limit)
+
+            span = self._trim(text, start, end)
+            if span[0] < span[1]:
+                spans.append(span)
+            if end >= n:
+                break
+
+            next_start = end - self.chunk_overlap
+            if self.chunk_overlap:
+                # start the overlap at a word boundary rather than mid-word
+                space = text.find(" ", next_start, end)
+                next_start = space + 1 if space != -1 else next_start
+            # never step back more than half a chunk, even with a large overlap
+            start = max(next_start, (start + end + 1) // 2)
+        return spans
+
+    def _token_spans(self, text: str) -> List[Tuple[int, int]]:
+        starts, ends = [], []
+        for match in self.token_regex.finditer(text):
+            starts.append(match.start())
+            ends.append(match.end())
+
+        spans = []
+        n_tokens = len(starts)
+        first = 0
+        while first < n_tokens:
+            last = first + self.chunk_size
+            if last >= n_tokens:
+                end = ends[-1]
+            else:
+                end = self._boundary(text, starts[first + self.chunk_size // 2], ends[last - 1])
+
+            spans.append(self._trim(text, starts[first], end))
+            consumed = bisect_right(ends, end)
+            if consumed >= n_tokens:
+                break
+            first = max(consumed - self.chunk_overlap, (first + consumed + 1) // 2)
+        return spans
+
+
+def iter_chunks(documents: Iterable[Document],
+                chunk_size: int = 1000,
+                chunk_overlap: int = 200,
+                unit: str = "chars",
+                separators: Optional[Sequence[str]] = None) -> Iterator[Document]:
+    """Stream chunks of ``documents`` (a list or any loader iterator)."""
+    chunker = TextChunker(chunk_size, chunk_overlap, unit, separators or DEFAULT_SEPARATORS)
+    return chunker.iter_chunks(documents)
+
+
+def chunk_documents(documents: Iterable[Document],
+                    chunk_size: int = 1000,
+                    chunk_overlap: int = 200,
+                    unit: str = "chars",
+                    separators: Optional[Sequence[str]] = None) -> List[Document]:
+    """Split ``documents`` into overlapping, boundary-aware chunks."""
+    return list(iter_chunks(documents, chunk_size, chunk_overlap, unit, separators))
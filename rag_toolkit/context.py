@@ -0,0 +1,205 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .chunk_store import ChunkRef
+from .chunking import DEFAULT_TOKEN_PATTERN
+from .flat_index import normalize_rows
+from .utils import document_id
+
+_TOKEN_REGEX = re.compile(DEFAULT_TOKEN_PATTERN)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: words and punctuation marks."""
+    return sum(1 for _ in _TOKEN_REGEX.finditer(text))
+
+
+@dataclass
+class PackingReport:
+    documents_in: int = 0
+    documents_out: int = 0
+    duplicates_removed: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+
+class ContextPacker:
+    """Turn raw retriever output into a compact, token-budgeted ``{context}`` string.
+
+    Accepts what the retrieval chains produce: documents (or ``ChunkRef``s),
+    ``(document, score)`` pairs from rank fusion, or lists of either. Chunks are deduplicated by
+    content, ordered by score (retrieval order when there are no scores),
+    optionally re-ordered by maximal marginal relevance to push out near
+    duplicates, and added until ``max_tokens`` is reached. Every call records
+    a ``PackingReport`` comparing the packed context with the raw output the
+    prompt would otherwise have received.
+    """
+
+    def __init__(self,
+                 max_tokens: int = 2000,
+                 mmr_lambda: Optional[float] = None,
+                 vectorstore=None,
+                 embeddings_model=None,
+                 metadata_keys: Sequence[str] = ("source", "page"),
+                 token_counter: Optional[Callable[[str], int]] = None,
+                 on_report: Optional[Callable[[PackingReport], None]] = None):
+        """
+        Args:
+            max_tokens (int): Token budget of the packed context.
+            mmr_lambda (float, optional): Enables MMR diversification; 1.0 keeps the
+                relevance order, lower values favour diversity.
+            vectorstore (optional): Store to read the chunks' embeddings from for MMR
+                (``FlatVectorIndex`` or Chroma).
+            embeddings_model (optional): Embeds chunks for MMR when they are not in ``vectorstore``.
+            metadata_keys (Sequence[str]): Metadata shown in each chunk's header.
+            token_counter (Callable[[str], int], optional): Token counter, defaults to ``estimate_tokens``.
+            on_report (Callable[[PackingReport], None], optional): Called with every report.
+        """
+        if max_tokens < 1:
+            raise ValueError("max_tokens must be a positive integer")
+        if mmr_lambda is not None and vectorstore is None and embeddings_model is None:
+            raise ValueError("MMR needs a vectorstore or an embeddings_model")
+
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.vectorstore = vectorstore
+        self.embeddings_model = embeddings_model
+        self.metadata_keys = tuple(metadata_keys)
+        self.count_tokens = token_counter or estimate_tokens
+        self.on_report = on_report
+        self.last_report: Optional[PackingReport] = None
+
+    def __call__(self, results) -> str:
+        return self.pack(results)
+
+    def pack(self, results) -> str:
+        candidates = self._flatten(results)
+        report = PackingReport(documents_in=len(candidates), tokens_in=self.count_tokens(str(results)))
+
+        if any(score is not None for _, score in candidates):
+            candidates.sort(key=lambda item: item[1] if item[1] is not None else float("-inf"), reverse=True)
+        unique, seen = [], set()
+        for document, score in candidates:
+            key = " ".join(document.page_content.split())
+            if key and key not in seen:
+                seen.add(key)
+                unique.append((document, score))
+        report.duplicates_removed = len(candidates) - len(unique)
+
+        if self.mmr_lambda is not None and len(unique) > 2:
+            unique = [unique[i] for i in self._mmr_order(unique)]
+
+        blocks, used = [], 0
+        for document, _ in unique:
+            block = self.format_document(len(blocks) + 1, document)
+            tokens = self.count_tokens(block)
+            if used + tokens > self.max_tokens:
+                if blocks:
+                    continue
+                block = self._truncate(block, self.max_tokens)
+                tokens = self.count_tokens(block)
+            blocks.append(block)
+            used += tokens
+
+        context = "\n\n".join(blocks)
+        report.documents_out = len(blocks)
+        report.tokens_out = self.count_tokens(context)
+        self.last_report = report
+        if self.on_report is not None:
+            self.on_report(report)
+        return context
+
+    def format_document(self, number: int, document: Document) -> str:
+        meta = ", ".join(f"{key}={document.metadata[key]}" for key in self.metadata_keys
+                         if key in document.metadata)
+        header = f"[{number}]" + (f" ({meta})" if meta else "")
+        return f"{header} {' '.join(document.page_content.split())}"
+
+    # ------------------------------------------------------------------ #
+    # Internals
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _flatten(results) -> List[Tuple[Document, Optional[float]]]:
+        flat = []
+        stack = [results]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (Document, ChunkRef)):
+                flat.append((item, None))
+            elif isinstance(item, tuple) and len(item) == 2 and isinstance(item[0], (Document, ChunkRef)):
+                flat.append((item[0], float(item[1])))
+            elif isinstance(item, (list, tuple)):
+                stack.extend(reversed(item))
+        return flat
+
+    def _mmr_order(self, candidates: List[Tuple[Document, Optional[float]]]) -> List[int]:
+        """Greedy MMR over the candidates, relevance taken from their scores or ranks."""
+        vectors = self._vectors([document for document, _ in candidates])
+        if vectors is None:
+            return list(range(len(candidates)))
+
+        n = len(candidates)
+        scores = np.array([score if score is not None else np.nan for _, score in candidates], dtype=np.float64)
+        if np.isnan(scores).any():
+            relevance = 1.0 - np.arange(n) / n
+        else:
+            spread = scores.max() - scores.min()
+            relevance = (scores - scores.min()) / spread if spread else np.ones(n)
+
+        similarity = vectors @ vectors.T
+        order = [0]
+        chosen = np.zeros(n, dtype=bool)
+        chosen[0] = True
+        max_similarity = similarity[0].copy()
+        for _ in range(n - 1):
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity
+            mmr[chosen] = -np.inf
+            best = int(mmr.argmax())
+            order.append(best)
+            chosen[best] = True
+            np.maximum(max_similarity, similarity[best], out=max_similarity)
+        return order
+
+    def _vectors(self, documents: List[Document]) -> Optional[np.ndarray]:
+        ids = [document_id(document) for document in documents]
+        store = self.vectorstore
+        vectors = None
+        if hasattr(store, "get_vectors_by_ids"):
+            vectors = store.get_vectors_by_ids(ids)
+        elif getattr(store, "_collection", None) is not None:
+            got = store._collection.get(ids=ids, include=["embeddings"])
+            by_id = dict(zip(got["ids"], got["embeddings"]))
+            if all(doc_id in by_id for doc_id in ids):
+                vectors = [by_id[doc_id] for doc_id in ids]
+
+        if vectors is None or len(vectors) != len(ids):
+            if self.embeddings_model is None:
+                return None
+            vectors = self.embeddings_model.embed_documents([document.page_content for document in documents])
+        return normalize_rows(vectors)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of ``text`` ending on a word boundary that ``count_tokens`` fits in ``max_tokens``.
+
+        Binary search over the cut points, so the configured counter runs a
+        logarithmic number of times.
+        """
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        cuts = [match.end() for match in _TOKEN_REGEX.finditer(text)]
+        lo, hi = -1, len(cuts) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count_tokens(text[:cuts[mid]]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:cuts[lo]] if lo >= 0 else ""
@@ -1,21 +1,47 @@
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.schema import Document
+from langchain_core.documents import Document
 import json
 import csv
-from typing import List, Optional, Union
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-def load_pdf_pages(file_path: str, 
-                   start_page: int = 0, 
-                   end_page: Optional[int] = None, 
-                   save_path: Optional[str] = None) -> List[Document]:
+if TYPE_CHECKING:
+    from .chunk_store import ChunkStore
+
+FILE_TYPES = {
+    ".pdf": "pdf",
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".txt": "txt",
+    ".csv": "csv",
+}
+
+def iter_pdf_pages(file_path: str,
+                   start_page: int = 0,
+                   end_page: Optional[int] = None) -> Iterator[Document]:
+    """Yield one ``Document`` per page, parsing only the requested page range."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    pages = range(len(reader.pages))[start_page:end_page or None]
 
-    loader = PyPDFLoader(file_path)
-    docs = loader.load()
+    for page_number in pages:
+        yield Document(
+            page_content=reader.pages[page_number].extract_text(extraction_mode="plain"),
+            metadata={"source": file_path, "page": page_number},
+        )
 
-    if end_page:
-        docs = docs[start_page:end_page]
-    else:
-        docs = docs[start_page:]
+def load_pdf_pages(file_path: str,
+                   start_page: int = 0,
+                   end_page: Optional[int] = None,
+                   save_path: Optional[str] = None) -> List[Document]:
+
+    docs = list(iter_pdf_pages(file_path, start_page=start_page, end_page=end_page))
 
     print(f"Loaded {len(docs)} documents from pages {start_page} to {end_page if end_page else 'end'}.")
 
@@ -30,58 +56,306 @@ def load_pdf_pages(file_path: str,
 
     return docs
 
-def load_json_documents(file_path: str) -> List[Document]:
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _iter_json_array(f, chunk_size: int = 1 << 16) -> Iterator:
+    """Decode the elements of a top-level JSON array one at a time.
+
+    Raises ``json.JSONDecodeError`` for anything but a single JSON array whose
+    elements are separated by exactly one comma.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        # Read at least as much as is still undecoded, so an element spanning
+        # many chunks is retried a logarithmic number of times, not once per chunk.
+        nonlocal buffer, pos, eof
+        chunk = f.read(max(chunk_size, len(buffer) - pos))
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def error(msg):
+        return json.JSONDecodeError(msg, buffer, pos)
+
+    def close():
+        # consume the closing bracket; only whitespace may follow it
+        nonlocal pos
+        pos += 1
+        skip_whitespace()
+        if pos < len(buffer):
+            raise error("Extra data")
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != "[":
+        raise error("Expecting a JSON array of documents")
+    pos += 1
+    skip_whitespace()
+    if buffer[pos:pos + 1] == "]":
+        close()
+        return
+
+    while True:
+        if pos >= len(buffer):
+            raise error("Unterminated JSON array")
+        if buffer[pos] in ",]":
+            raise error("Expecting value")
+        try:
+            entry, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if not eof and (end == len(buffer) or (_is_number(entry) and buffer[end] in "eE.+-")):
+            fill()  # a number may continue in the next chunk
+            continue
+        yield entry
+        pos = end
+
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise error("Unterminated JSON array")
+        if buffer[pos] == "]":
+            close()
+            return
+        if buffer[pos] != ",":
+            raise error("Expecting ',' delimiter")
+        pos += 1
+        skip_whitespace()
+
+def iter_json_documents(file_path: str, jsonl: Optional[bool] = None) -> Iterator[Document]:
+    """Yield documents from a JSON array or a JSON-lines file without loading it whole.
+
+    ``jsonl`` defaults to ``True`` for ``.jsonl``/``.ndjson`` files.
+    """
+
+    if jsonl is None:
+        jsonl = os.path.splitext(file_path)[1].lower() in (".jsonl", ".ndjson")
 
     with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+        entries = (json.loads(line) for line in f if line.strip()) if jsonl else _iter_json_array(f)
+        for entry in entries:
+            yield Document(page_content=entry["page_content"], metadata={"id": entry["metadata"]})
 
-    return [
-        Document(page_content=entry["page_content"], metadata={"id": entry["metadata"]})
-        for entry in data
-    ]
+def load_json_documents(file_path: str, jsonl: Optional[bool] = None) -> List[Document]:
 
-def load_text_documents(file_path: str, 
-                        lines_per_chunk: int = 1) -> List[Document]:
+    return list(iter_json_documents(file_path, jsonl=jsonl))
+
+def iter_text_documents(file_path: str,
+                        lines_per_chunk: int = 1) -> Iterator[Document]:
+    """Yield chunks of ``lines_per_chunk`` lines while reading the file line by line."""
 
     with open(file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
+        lines = []
+        idx = 0
+        for line in f:
+            lines.append(line)
+            if len(lines) == lines_per_chunk:
+                yield Document(page_content="\n".join(lines).strip(), metadata={"chunk_index": idx})
+                lines = []
+                idx += 1
+        if lines:
+            yield Document(page_content="\n".join(lines).strip(), metadata={"chunk_index": idx})
 
-    chunks = [
-        "\n".join(lines[i:i + lines_per_chunk]).strip()
-        for i in range(0, len(lines), lines_per_chunk)
-    ]
+def load_text_documents(file_path: str,
+                        lines_per_chunk: int = 1) -> List[Document]:
 
-    return [
-        Document(page_content=chunk, metadata={"chunk_index": idx})
-        for idx, chunk in enumerate(chunks)
-    ]
+    return list(iter_text_documents(file_path, lines_per_chunk=lines_per_chunk))
+
+def iter_csv_documents(file_path: str,
+                       content_column: str,
+                       metadata_columns: Optional[List[str]] = None) -> Iterator[Document]:
 
-def load_csv_documents(file_path: str, 
-                       content_column: str, 
-                       metadata_columns: Optional[List[str]] = None) -> List[Document]:
-    
-    documents = []
     with open(file_path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
             metadata = {col: row[col] for col in metadata_columns} if metadata_columns else {}
-            documents.append(Document(page_content=row[content_column], metadata=metadata))
+            yield Document(page_content=row[content_column], metadata=metadata)
+
+def load_csv_documents(file_path: str,
+                       content_column: str,
+                       metadata_columns: Optional[List[str]] = None) -> List[Document]:
+
+    documents = list(iter_csv_documents(file_path, content_column, metadata_columns))
 
     print(f"Loaded {len(documents)} documents from {file_path}.")
     return documents
 
-def load_documents(file_path: str, 
-                   file_type: str, 
-                   **kwargs) -> Union[List[Document], ValueError]:
+def load_documents(file_path: str,
+                   file_type: str,
+                   lazy: bool = False,
+                   store: Optional["ChunkStore"] = None,
+                   **kwargs) -> Union[List[Document], Iterator[Document], "ChunkStore"]:
+    """Load documents of the given type; with ``lazy=True`` return an iterator instead of a list.
+
+    With a ``store`` the documents are streamed into that ``ChunkStore`` one at a
+    time and the store is returned.
+    """
 
     loaders = {
         "pdf": load_pdf_pages,
         "json": load_json_documents,
+        "jsonl": lambda path, **kw: load_json_documents(path, jsonl=True, **kw),
         "txt": load_text_documents,
         "csv": load_csv_documents
     }
 
+    lazy_loaders = {
+        "pdf": iter_pdf_pages,
+        "json": iter_json_documents,
+        "jsonl": lambda path, **kw: iter_json_documents(path, jsonl=True, **kw),
+        "txt": iter_text_documents,
+        "csv": iter_csv_documents
+    }
+
     if file_type not in loaders:
-        raise ValueError("Unsupported file type. Supported types: pdf, json, txt, csv")
+        raise ValueError("Unsupported file type. Supported types: pdf, json, jsonl, txt, csv")
+
+    if store is not None:
+        store.add_documents(lazy_loaders[file_type](file_path, **kwargs))
+        return store
+
+    if lazy:
+        return lazy_loaders[file_type](file_path, **kwargs)
 
     return loaders[file_type](file_path, **kwargs)
+
+
+@dataclass
+class FileLoadResult:
+    path: str
+    file_type: str
+    documents: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+def _load_file(file_path: str, file_type: str, kwargs: dict) -> Tuple[List[Document], float, Optional[str]]:
+    """Process-pool worker: parse one file, never raising."""
+
+    started = time.perf_counter()
+    try:
+        docs = list(load_documents(file_path, file_type, lazy=True, **kwargs))
+    except Exception as e:
+        return [], time.perf_counter() - started, f"{type(e).__name__}: {e}"
+    return docs, time.perf_counter() - started, None
+
+def find_files(directory: str,
+               pattern: str = "**/*",
+               extensions: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """Return ``(path, file_type)`` for every supported file under ``directory``, sorted by path."""
+
+    allowed = {ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in extensions or FILE_TYPES}
+    files = []
+    for path in glob.glob(os.path.join(directory, pattern), recursive=True):
+        ext = os.path.splitext(path)[1].lower()
+        if ext in allowed and ext in FILE_TYPES and os.path.isfile(path):
+            files.append((path, FILE_TYPES[ext]))
+    return sorted(files)
+
+def iter_directory(directory: str,
+                   pattern: str = "**/*",
+                   extensions: Optional[List[str]] = None,
+                   max_workers: Optional[int] = None,
+                   loader_kwargs: Optional[Dict[str, dict]] = None,
+                   on_file: Optional[Callable[[FileLoadResult], None]] = None) -> Iterator[Document]:
+    """
+    Parse every supported file under ``directory`` on a process pool.
+
+    Documents are yielded file by file in sorted path order, regardless of which
+    file finishes first. A file that fails to parse is skipped; its error and
+    parse time are reported through ``on_file`` like every other file.
+
+    Args:
+        directory (str): Root directory to search.
+        pattern (str): Glob pattern relative to ``directory``.
+        extensions (List[str], optional): Restrict to these extensions, e.g. ``["pdf"]``.
+        max_workers (int, optional): Worker processes, defaults to the CPU count; ``1`` parses in-process.
+        loader_kwargs (Dict[str, dict], optional): Extra loader arguments per file type,
+            e.g. ``{"txt": {"lines_per_chunk": 5}}``.
+        on_file (Callable, optional): Called with a ``FileLoadResult`` for every file.
+    """
+
+    files = find_files(directory, pattern, extensions)
+    loader_kwargs = loader_kwargs or {}
+    max_workers = max_workers or os.cpu_count() or 1
+
+    def report(path, file_type, docs, seconds, error):
+        if on_file is not None:
+            on_file(FileLoadResult(path, file_type, len(docs), seconds, error))
+
+    if max_workers == 1:
+        for path, file_type in files:
+            docs, seconds, error = _load_file(path, file_type, loader_kwargs.get(file_type, {}))
+            report(path, file_type, docs, seconds, error)
+            yield from docs
+        return
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    in_flight = deque()
+    try:
+        for path, file_type in files:
+            in_flight.append((path, file_type, executor.submit(_load_file, path, file_type,
+                                                               loader_kwargs.get(file_type, {}))))
+            if len(in_flight) < 2 * max_workers:
+                continue
+            path, file_type, future = in_flight.popleft()
+            docs, seconds, error = future.result()
+            report(path, file_type, docs, seconds, error)
+            yield from docs
+
+        while in_flight:
+            path, file_type, future = in_flight.popleft()
+            docs, seconds, error = future.result()
+            report(path, file_type, docs, seconds, error)
+            yield from docs
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def load_directory(directory: str,
+                   pattern: str = "**/*",
+                   extensions: Optional[List[str]] = None,
+                   max_workers: Optional[int] = None,
+                   loader_kwargs: Optional[Dict[str, dict]] = None,
+                   on_file: Optional[Callable[[FileLoadResult], None]] = None,
+                   lazy: bool = False,
+                   store: Optional["ChunkStore"] = None) -> Union[List[Document], Iterator[Document], "ChunkStore"]:
+    """Load every supported file under ``directory`` in parallel; see ``iter_directory``.
+
+    With a ``store`` the documents are appended to that ``ChunkStore`` as each
+    file finishes, instead of being collected in a list, and the store is returned.
+    """
+
+    if store is not None:
+        store.add_documents(iter_directory(directory, pattern, extensions, max_workers, loader_kwargs, on_file))
+        return store
+
+    if lazy:
+        return iter_directory(directory, pattern, extensions, max_workers, loader_kwargs, on_file)
+
+    results = []
+
+    def collect(result):
+        results.append(result)
+        if on_file is not None:
+            on_file(result)
+
+    docs = list(iter_directory(directory, pattern, extensions, max_workers, loader_kwargs, collect))
+    failed = [result for result in results if result.error]
+    print(f"Loaded {len(docs)} documents from {len(results)} files in {directory} "
+          f"({sum(result.seconds for result in results):.2f}s parse time, {len(failed)} failed).")
+    for result in failed:
+        print(f"Failed to load {result.path}: {result.error}")
+    return docs
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .tracing import record
+from .utils import model_name, stable_hash
+
+
+class EmbeddingCache(Embeddings):
+    """Persistent, content-addressed cache wrapped around any embeddings model.
+
+    Vectors are stored as rows of a float32 memory-mapped file and addressed by
+    ``hash(model name + chunk text)``, so an unchanged chunk is never sent to
+    the embeddings API twice, even across process restarts. The key -> row
+    index is kept in an append-only log next to the vectors and compacted from
+    time to time. Once ``max_entries`` is reached the least recently used
+    entries are evicted and their rows reused.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    INDEX_FILE = "index.log"
+    META_FILE = "meta.json"
+
+    def __init__(
+        self,
+        embeddings_model,
+        cache_dir: str,
+        max_entries: int = 100_000,
+        namespace: Optional[str] = None,
+        cache_queries: bool = False,
+    ):
+        """
+        Open (or create) an embedding cache.
+
+        Args:
+            embeddings_model : The embeddings model to wrap.
+            cache_dir (str): Directory holding the cache files.
+            max_entries (int): Maximum number of cached vectors before eviction.
+            namespace (str, optional): Key namespace, defaults to the model name.
+            cache_queries (bool): Also cache ``embed_query`` results.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be a positive integer")
+
+        self.embeddings_model = embeddings_model
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.namespace = namespace or model_name(embeddings_model)
+        self.cache_queries = cache_queries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._free_slots: List[int] = []
+        self._log_lines = 0
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------ #
+    # Embeddings interface
+    # ------------------------------------------------------------------ #
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embeddings_model.embed_documents(list(missing.values()))
+            found.update(self._store(list(missing.keys()), vectors))
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        if not self.cache_queries:
+            return self.embeddings_model.embed_query(text)
+
+        key = self._key(text, kind="query")
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+
+        vector = self.embeddings_model.embed_query(text)
+        return self._store([key], [vector])[key]
+
+    # ------------------------------------------------------------------ #
+    # Stats and maintenance
+    # ------------------------------------------------------------------ #
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._index),
+            "max_entries": self.max_entries,
+            "hit_rate": self.hit_rate,
+        }
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, text: str) -> bool:
+        return self._key(text) in self._index
+
+    def flush(self):
+        """Flush vectors to disk and rewrite the index in LRU order."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._compact()
+
+    def clear(self):
+        """Drop every cached vector."""
+        with self._lock:
+            self._index.clear()
+            self._free_slots = list(range(self._capacity - 1, -1, -1))
+            self._compact()
+
+    # ------------------------------------------------------------------ #
+    # Internals
+    # ------------------------------------------------------------------ #
+    def _key(self, text: str, kind: str = "document") -> str:
+        return stable_hash(self.namespace, kind, text)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found, misses = {}, 0
+        with self._lock:
+            for key in keys:
+                slot = self._index.get(key)
+                if slot is None:
+                    misses += 1
+                    continue
+                self._index.move_to_end(key)
+                if key not in found:
+                    found[key] = self._vectors[slot].tolist()
+            self.hits += len(keys) - misses
+            self.misses += misses
+        record("embedding_cache_hits", len(keys) - misses)
+        record("embedding_cache_misses", misses)
+        return found
+
+    def _store(self, keys: List[str], vectors: List[List[float]]) -> Dict[str, List[float]]:
+        stored = {}
+        with self._lock:
+            if self._dim is None:
+                self._set_dim(len(vectors[0]))
+
+            lines = []
+            for key, vector in zip(keys, vectors):
+                if key in self._index:
+                    slot = self._index[key]
+                    self._index.move_to_end(key)
+                else:
+                    slot = self._allocate_slot()
+                    self._index[key] = slot
+                self._vectors[slot] = vector
+                lines.append(f"{key}\t{slot}\n")
+                stored[key] = self._vectors[slot].tolist()
+
+            self._vectors.flush()
+            self._append_log(lines)
+        return stored
+
+    def _allocate_slot(self) -> int:
+        if not self._free_slots:
+            if len(self._index) >= self.max_entries or self._capacity >= self.max_entries:
+                _, slot = self._index.popitem(last=False)
+                self.evictions += 1
+                return slot
+
+            old_capacity = self._capacity
+            self._resize(min(max(old_capacity * 2, 1024), self.max_entries))
+            self._free_slots.extend(range(self._capacity - 1, old_capacity - 1, -1))
+
+        return self._free_slots.pop()
+
+    def _set_dim(self, dim: int):
+        self._dim = dim
+        with open(self._path(self.META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "namespace": self.namespace}, f)
+
+    def _resize(self, capacity: int):
+        """Resize the vectors file to ``capacity`` rows and remap it."""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+
+        path = self._path(self.VECTORS_FILE)
+        with open(path, "ab") as f:
+            f.truncate(capacity * self._dim * 4)
+
+        self._capacity = capacity
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+
+    def _append_log(self, lines: List[str]):
+        with open(self._path(self.INDEX_FILE), "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        self._log_lines += len(lines)
+        if self._log_lines > 2 * len(self._index) + 1024:
+            self._compact()
+
+    def _compact(self):
+        path = self._path(self.INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{key}\t{slot}\n" for key, slot in self._index.items())
+        os.replace(tmp_path, path)
+        self._log_lines = len(self._index)
+
+    def _load(self):
+        meta_path = self._path(self.META_FILE)
+        if not os.path.exists(meta_path):
+            return
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self._dim = json.load(f)["dim"]
+
+        vectors_path = self._path(self.VECTORS_FILE)
+        rows = os.path.getsize(vectors_path) // (self._dim * 4) if os.path.exists(vectors_path) else 0
+
+        slot_owner: Dict[int, str] = {}
+        index_path = self._path(self.INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    key, _, slot = line.rstrip("\n").partition("\t")
+                    if not slot.isdigit() or int(slot) >= rows:
+                        continue  # torn write from an interrupted process
+                    slot = int(slot)
+                    previous = slot_owner.get(slot)
+                    if previous is not None and previous != key:
+                        self._index.pop(previous, None)
+                    self._index.pop(key, None)
+                    self._index[key] = slot
+                    slot_owner[slot] = key
+                    self._log_lines += 1
+
+        capacity = min(rows, self.max_entries)
+        self._index = OrderedDict((key, slot) for key, slot in self._index.items() if slot < capacity)
+        while len(self._index) > self.max_entries:
+            self._index.popitem(last=False)
+
+        used = set(self._index.values())
+        self._free_slots = [slot for slot in range(capacity - 1, -1, -1) if slot not in used]
+        if capacity:
+            self._resize(capacity)
@@ -0,0 +1,231 @@
+"""Deterministic, offline stand-ins for the model classes used by the toolkit.
+
+They let pipelines, ingestion and benchmarks run without network access while
+still behaving like remote models: calls can be slowed down with injected
+latency and made to fail at a configurable rate.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, PrivateAttr
+
+from .utils import stable_hash
+
+
+class FakeModelError(RuntimeError):
+    """Raised by fake models to simulate a failed API call."""
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic embeddings model with injectable latency and failures.
+
+    The same text always maps to the same unit vector, so similarity search over
+    fake embeddings is reproducible between runs.
+    """
+
+    def __init__(self,
+                 size: int = 64,
+                 latency: float = 0.0,
+                 per_text_latency: float = 0.0,
+                 error_rate: float = 0.0,
+                 seed: int = 0,
+                 model: str = "fake-embedding"):
+        """
+        Args:
+            size (int): Dimension of the returned vectors.
+            latency (float): Seconds slept per call.
+            per_text_latency (float): Extra seconds slept per embedded text.
+            error_rate (float): Probability that a call raises ``FakeModelError``.
+            seed (int): Seed for the failure injection.
+            model (str): Model name, used e.g. to namespace embedding caches.
+        """
+        self.size = size
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.error_rate = error_rate
+        self.model = model
+        self.calls = 0
+        self.texts_embedded = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int(stable_hash(self.model, text, digest_size=8), 16)
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _call(self, n_texts: int):
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+        delay = self.latency + self.per_text_latency * n_texts
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeModelError("Injected embedding failure")
+        with self._lock:
+            self.texts_embedded += n_texts
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._call(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._call(1)
+        return self._vector(text)
+
+    def reset_counters(self, error_rate: Optional[float] = None):
+        with self._lock:
+            self.calls = 0
+            self.texts_embedded = 0
+            if error_rate is not None:
+                self.error_rate = error_rate
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model with injectable latency and failures.
+
+    A reply is drawn from the words of the prompt, seeded by a hash of the
+    prompt, so the same prompt always gets the same reply. Replies have
+    ``lines`` lines, which query-generating retrievers read as sub-queries.
+    Token usage is reported as word counts.
+
+    ``with_structured_output`` is supported for pydantic schemas with string
+    fields, which are set to one of ``choices`` (e.g. a router's datasources).
+    """
+
+    latency: float = 0.0
+    per_token_latency: float = 0.0
+    lines: int = 3
+    words_per_line: int = 8
+    choices: Optional[List[str]] = None
+    error_rate: float = 0.0
+    seed: int = 0
+    model: str = "fake-chat"
+    calls: int = 0
+
+    _random: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs: Any):
+        """
+        Args:
+            latency (float): Seconds slept per call, before the first token.
+            per_token_latency (float): Extra seconds slept per generated word.
+            lines (int): Lines per reply.
+            words_per_line (int): Words per line.
+            choices (List[str], optional): Values for the string fields of structured output.
+            error_rate (float): Probability that a call raises ``FakeModelError``.
+            seed (int): Seed for the failure injection.
+            model (str): Model name, used e.g. to namespace caches.
+        """
+        super().__init__(**kwargs)
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _call(self) -> bool:
+        with self._lock:
+            self.calls += 1
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def _rng(self, prompt: str):
+        return np.random.default_rng(int(stable_hash(self.model, prompt, digest_size=8), 16))
+
+    def _reply(self, messages: List[BaseMessage]) -> tuple:
+        prompt = "\n".join(str(message.content) for message in messages)
+        words = re.findall(r"\w+", prompt) or ["fake"]
+        picks = self._rng(prompt).choice(words, size=(self.lines, self.words_per_line))
+        reply = "\n".join(" ".join(line) for line in picks)
+        usage = {"input_tokens": len(words), "output_tokens": picks.size, "total_tokens": len(words) + picks.size}
+        return reply, usage
+
+    def _chunks(self, reply: str) -> List[str]:
+        return re.findall(r"\S+\s*", reply)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        fail = self._call()
+        reply, usage = self._reply(messages)
+        delay = self.latency + self.per_token_latency * usage["output_tokens"]
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeModelError("Injected chat model failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        fail = self._call()
+        reply, usage = self._reply(messages)
+        delay = self.latency + self.per_token_latency * usage["output_tokens"]
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise FakeModelError("Injected chat model failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        fail = self._call()
+        reply, usage = self._reply(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeModelError("Injected chat model failure")
+        chunks = self._chunks(reply)
+        for i, text in enumerate(chunks):
+            if self.per_token_latency:
+                time.sleep(self.per_token_latency)
+            message = AIMessageChunk(content=text, usage_metadata=usage if i == len(chunks) - 1 else None)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(text)
+            yield ChatGenerationChunk(message=message)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                       **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        fail = self._call()
+        reply, usage = self._reply(messages)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if fail:
+            raise FakeModelError("Injected chat model failure")
+        chunks = self._chunks(reply)
+        for i, text in enumerate(chunks):
+            if self.per_token_latency:
+                await asyncio.sleep(self.per_token_latency)
+            message = AIMessageChunk(content=text, usage_metadata=usage if i == len(chunks) - 1 else None)
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(text)
+            yield ChatGenerationChunk(message=message)
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        if not (isinstance(schema, type) and issubclass(schema, BaseModel)):
+            raise ValueError("Unsupported schema. Supported schemas: pydantic models")
+
+        def parse(message: AIMessage):
+            rng = self._rng(str(message.content))
+            values = {}
+            for name, field in schema.model_fields.items():
+                if self.choices:
+                    values[name] = self.choices[int(rng.integers(len(self.choices)))]
+                else:
+                    values[name] = str(message.content).split("\n")[0]
+            return schema(**values)
+
+        return self | RunnableLambda(parse, name=schema.__name__)
+
+    def reset_counters(self, error_rate: Optional[float] = None):
+        with self._lock:
+            self.calls = 0
+            if error_rate is not None:
+                self.error_rate = error_rate
@@ -0,0 +1,548 @@
+import json
+import os
+import tempfile
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from .chunk_store import ChunkStore
+from .utils import DOC_ID_KEY, assign_document_ids, embed_queries
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return ``vectors`` as a contiguous float32 matrix of unit-length rows."""
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2, copy=True)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return np.ascontiguousarray(matrix)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the ``k`` largest scores per row, best first.
+
+    Uses ``argpartition`` so the cost is linear in the number of rows rather
+    than a full sort.
+    """
+    n = scores.shape[1]
+    k = min(k, n)
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+# float16 is left out on purpose: NumPy has no fast float16 -> float32 upcast,
+# so scoring float16 codes was several times slower than plain float32 search.
+QUANTIZATIONS = ("int8",)
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode float32 rows as ``int8`` codes with one float32 scale per row."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class QuantizedVectors:
+    """Vectors of a ``FlatVectorIndex`` held in memory as int8 codes.
+
+    Only the codes are resident: 1 byte per dimension plus a 4-byte scale per
+    row, against 4 bytes per dimension in float32. The float32 rows are written to a file and memory-mapped. Queries
+    are scored against the codes block by block; ``top_k`` can then re-rank
+    the best candidates by their float32 rows, which reads only those rows
+    from disk.
+    """
+
+    QUANTIZED_FILE = "quantized.npz"
+    BLOCK_ROWS = 8192
+
+    def __init__(self, kind: str, dim: int = 0):
+        """
+        Args:
+            kind (str): ``"int8"``.
+            dim (int): Embedding dimension, set by the first ``put`` when ``0``.
+        """
+        if kind not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization. Supported quantizations: {', '.join(QUANTIZATIONS)}")
+        self.kind = kind
+        self.size = 0
+        self._codes = np.empty((0, dim), dtype=kind)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._file = None
+        self._full = np.empty((0, dim), dtype=np.float32)
+
+    @property
+    def dim(self) -> int:
+        return self._codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of the codes and scales."""
+        return self._codes[:self.size].nbytes + self._scales[:self.size].nbytes
+
+    def full(self) -> np.ndarray:
+        """The float32 rows, memory-mapped."""
+        if self._file is not None and self._full.shape[0] != self.size:
+            self._full = (np.memmap(self._file, dtype=np.float32, mode="r", shape=(self.size, self.dim))
+                          if self.size else np.empty((0, self.dim), dtype=np.float32))
+        return self._full
+
+    def put(self, rows: np.ndarray, vectors: np.ndarray):
+        """Write unit ``vectors`` at ``rows``; rows past the end grow the index, gaps are zero."""
+        if vectors.shape[1] != self.dim:
+            if self.size:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            self._codes = np.empty((0, vectors.shape[1]), dtype=self.kind)
+        row_bytes = 4 * vectors.shape[1]
+        f = self._writable_file()
+        end = max(self.size, int(rows.max()) + 1)
+        if end > self.size:
+            if end > len(self._codes):
+                capacity = max(end, 2 * len(self._codes), 1024)
+                codes = np.zeros((capacity, self.dim), dtype=self.kind)
+                codes[:self.size] = self._codes[:self.size]
+                self._codes = codes
+                scales = np.ones(capacity, dtype=np.float32)
+                scales[:self.size] = self._scales[:self.size]
+                self._scales = scales
+            f.truncate(end * row_bytes)
+            self.size = end
+
+        self._codes[rows], self._scales[rows] = quantize(vectors)
+        if np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+            f.seek(int(rows[0]) * row_bytes)
+            f.write(vectors.tobytes())
+        else:
+            for row, vector in zip(rows, vectors):
+                f.seek(int(row) * row_bytes)
+                f.write(vector.tobytes())
+
+    def compact(self, keep: np.ndarray):
+        """Keep only the rows in ``keep``, in that order."""
+        full = self.full()
+        f = tempfile.TemporaryFile(buffering=0)
+        for start in range(0, len(keep), self.BLOCK_ROWS):
+            f.write(np.ascontiguousarray(full[keep[start:start + self.BLOCK_ROWS]]).tobytes())
+        self._codes = self._codes[keep]
+        self._scales = self._scales[keep]
+        self._replace_file(f, len(keep))
+
+    def top_k(self, queries: np.ndarray, k: int, rescore: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """Like ``top_k(queries @ vectors.T, k)`` but scored on the codes.
+
+        The ``rescore * k`` best candidates are re-ranked by their float32 rows;
+        ``rescore=0`` returns the approximate ranking and scores.
+        """
+        approx = np.empty((len(queries), self.size), dtype=np.float32)
+        for start in range(0, self.size, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, self.size)
+            approx[:, start:end] = queries @ self._codes[start:end].astype(np.float32).T
+            approx[:, start:end] *= self._scales[start:end]
+        if not rescore:
+            return top_k(approx, k)
+
+        candidates, _ = top_k(approx, max(k, rescore * k))
+        exact = np.einsum("qcd,qd->qc", self.full()[candidates], queries)
+        order, scores = top_k(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), scores
+
+    def _writable_file(self):
+        if self._file is None:
+            f = tempfile.TemporaryFile(buffering=0)
+            for start in range(0, self.size, self.BLOCK_ROWS):
+                f.write(np.ascontiguousarray(self._full[start:start + self.BLOCK_ROWS]).tobytes())
+            self._replace_file(f, self.size)
+        return self._file
+
+    def _replace_file(self, f, size: int):
+        if self._file is not None:
+            self._file.close()
+        self._file = f
+        self.size = size
+        self._full = np.empty((0, self.dim), dtype=np.float32)
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+    def save(self, path: str, vectors_file: str):
+        """Write the float32 rows as ``vectors_file`` and the codes next to them."""
+        target = os.path.join(path, vectors_file)
+        full = self.full()
+        same_file = (self._file is None and isinstance(full, np.memmap) and os.path.exists(target)
+                     and os.path.samefile(full.filename, target))
+        if not same_file:
+            out = np.lib.format.open_memmap(target, mode="w+", dtype=np.float32, shape=(self.size, self.dim))
+            for start in range(0, self.size, self.BLOCK_ROWS):
+                out[start:start + self.BLOCK_ROWS] = full[start:start + self.BLOCK_ROWS]
+            out.flush()
+            del out
+        np.savez(os.path.join(path, self.QUANTIZED_FILE), kind=np.array(self.kind),
+                 codes=self._codes[:self.size], scales=self._scales[:self.size])
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, cls.QUANTIZED_FILE))
+
+    @classmethod
+    def open(cls, path: str, vectors: np.ndarray, kind: Optional[str] = None) -> "QuantizedVectors":
+        """Wrap the memory-mapped float32 ``vectors`` saved in ``path``.
+
+        Saved codes are reused when their kind matches ``kind`` (or ``kind`` is
+        ``None``); otherwise the vectors are quantized block by block.
+        """
+        codes = scales = None
+        if cls.exists(path):
+            with np.load(os.path.join(path, cls.QUANTIZED_FILE)) as saved:
+                if kind in (None, str(saved["kind"])):
+                    kind, codes, scales = str(saved["kind"]), saved["codes"], saved["scales"]
+        quantized = cls(kind, vectors.shape[1])
+        quantized._full = vectors
+        quantized.size = len(vectors)
+        if codes is None:
+            blocks = [quantize(np.asarray(vectors[start:start + cls.BLOCK_ROWS], dtype=np.float32))
+                      for start in range(0, len(vectors), cls.BLOCK_ROWS)]
+            codes = np.concatenate([block for block, _ in blocks]) if blocks else quantized._codes
+            scales = np.concatenate([block for _, block in blocks]) if blocks else quantized._scales
+        quantized._codes, quantized._scales = codes, scales
+        return quantized
+
+
+class FlatVectorIndex(VectorStore):
+    """Exact in-process vector index backed by a single float32 matrix.
+
+    Embeddings are L2-normalised on insert and kept in one contiguous matrix,
+    so a query is a single matrix-vector product followed by ``argpartition``.
+    Batches of queries are answered with one matrix-matrix product. The index
+    can be saved to a directory and re-opened memory-mapped. Scores are cosine
+    similarities (higher is better). ``version`` is bumped on every write.
+
+    With a ``chunk_store`` the documents live in that store instead of a list
+    of ``Document`` objects: matrix row ``i`` is store row ``i`` and searches
+    return ``ChunkRef`` objects.
+
+    With ``quantization`` only int8 codes of the vectors stay in
+    memory (see ``QuantizedVectors``); the float32 vectors are memory-mapped
+    from disk and used to rescore the best candidates of every search.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    DOCUMENTS_FILE = "documents.jsonl"
+
+    def __init__(self,
+                 embedding,
+                 dim: Optional[int] = None,
+                 chunk_store: Optional[ChunkStore] = None,
+                 quantization: Optional[str] = None,
+                 rescore: int = 4):
+        """
+        Args:
+            embedding : Embeddings model used for documents and queries.
+            dim (int, optional): Embedding dimension, inferred from the first insert.
+            chunk_store (ChunkStore, optional): Empty store to keep the documents in; use
+                ``from_chunk_store`` to index one that already holds chunks.
+            quantization (str, optional): ``"int8"`` to search compact codes
+                of the vectors and keep the float32 vectors in a memory-mapped file.
+            rescore (int): With quantization, the ``rescore * k`` best candidates are re-ranked
+                by their float32 vectors; ``0`` returns the approximate ranking.
+        """
+        if chunk_store is not None and len(chunk_store):
+            raise ValueError("chunk_store must be empty; use FlatVectorIndex.from_chunk_store to index its chunks")
+        self.embedding = embedding
+        self.chunk_store = chunk_store
+        self._matrix = np.empty((0, dim or 0), dtype=np.float32)
+        self._quantized = QuantizedVectors(quantization, dim or 0) if quantization else None
+        self.rescore = rescore
+        self._size = 0
+        self._documents: List[Document] = []
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self.version = 0
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the vectors: the float32 matrix, or the codes when quantized."""
+        if self._quantized is not None:
+            return self._quantized.nbytes
+        return self.vectors.nbytes
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The normalised embedding matrix, one row per document."""
+        if self._quantized is not None:
+            return self._quantized.full()
+        return self._matrix[:self._size]
+
+    # ------------------------------------------------------------------ #
+    # Writes
+    # ------------------------------------------------------------------ #
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(page_content=text, metadata=metadata or {})
+                     for text, metadata in zip(texts, metadatas)]
+        # ``VectorStore.add_documents`` passes ``doc.id`` for every document, ``None`` where it is unset
+        ids = list(ids) if ids else [None] * len(texts)
+        ids = [doc_id or (metadata or {}).get(DOC_ID_KEY) or str(uuid.uuid4()) for doc_id, metadata in zip(ids, metadatas)]
+        documents = assign_document_ids(documents, ids)
+        self.add_embeddings(ids, documents, self.embedding.embed_documents(texts))
+        return ids
+
+    def add_embeddings(self, ids: List[str], documents: List[Document], embeddings: Sequence[Sequence[float]]):
+        """Insert pre-computed embeddings; existing ids are overwritten.
+
+        An id repeated within ``ids`` keeps its last document and embedding. The
+        signature matches the ingestion sink used by ``EmbeddingIngestor``.
+        """
+        if not ids:
+            return
+        vectors = normalize_rows(embeddings)
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            vectors = vectors[keep]
+        if self.chunk_store is not None:
+            rows = self.chunk_store.add_documents(documents, ids)
+        else:
+            rows = []
+            for doc_id, document in zip(ids, documents):
+                row = self._positions.get(doc_id)
+                if row is None:
+                    row = self._positions[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._documents.append(document)
+                else:
+                    self._documents[row] = document
+                rows.append(row)
+        self._put(rows, vectors)
+        self.version += 1
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if self.chunk_store is not None:
+            rows = set(self.chunk_store.delete(ids or []))
+        else:
+            rows = {self._positions[doc_id] for doc_id in ids or [] if doc_id in self._positions}
+        if not rows:
+            return False
+
+        mask = np.ones(self._size, dtype=bool)
+        mask[list(rows)] = False
+        keep = np.flatnonzero(mask)
+        if self._quantized is not None:
+            self._quantized.compact(keep)
+        else:
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+        if self.chunk_store is None:
+            self._documents = [self._documents[row] for row in keep]
+            self._ids = [self._ids[row] for row in keep]
+            self._positions = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._size = len(keep)
+        self.version += 1
+        return True
+
+    def get_by_ids(self, ids: Sequence[str]) -> List[Document]:
+        if self.chunk_store is not None:
+            return [self.chunk_store.ref(row) for row in self.chunk_store.rows_of(ids)]
+        return [self._documents[self._positions[doc_id]] for doc_id in ids if doc_id in self._positions]
+
+    def get_vectors_by_ids(self, ids: Sequence[str]) -> np.ndarray:
+        """Normalised embeddings of the indexed ``ids``, skipping unknown ones."""
+        if self.chunk_store is not None:
+            return self.vectors[self.chunk_store.rows_of(ids)]
+        rows = [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+        return self.vectors[rows]
+
+    def _reserve(self, rows: int, dim: int):
+        if self._matrix.shape[1] != dim:
+            if self._size:
+                raise ValueError(f"Embedding dimension {dim} does not match index dimension {self._matrix.shape[1]}")
+            self._matrix = np.empty((0, dim), dtype=np.float32)
+
+        if rows > self._matrix.shape[0] or not self._matrix.flags.writeable:
+            capacity = max(rows, 2 * self._matrix.shape[0], 1024)
+            matrix = np.empty((capacity, dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    def _put(self, rows: Sequence[int], vectors: np.ndarray):
+        """Write ``vectors`` at ``rows``, growing the matrix for rows past the end."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        if self._quantized is not None:
+            self._quantized.put(rows, vectors)
+            self._size = self._quantized.size
+            return
+        end = max(self._size, int(rows.max()) + 1)
+        self._reserve(end, vectors.shape[1])
+        self._writable()[self._size:end] = 0  # rows of batches still in flight
+        self._matrix[rows] = vectors
+        self._size = end
+
+    def _writable(self) -> np.ndarray:
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix[:self._size])
+        return self._matrix
+
+    # ------------------------------------------------------------------ #
+    # Search
+    # ------------------------------------------------------------------ #
+    def similarity_search_with_score_by_vectors(self,
+                                                embeddings: Sequence[Sequence[float]],
+                                                k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """Top-``k`` documents and cosine scores for every query vector, in one matmul."""
+        if self._size == 0:
+            return [[] for _ in embeddings]
+        queries = normalize_rows(embeddings)
+        if self._quantized is not None:
+            indices, scores = self._quantized.top_k(queries, k, self.rescore)
+        else:
+            indices, scores = top_k(queries @ self.vectors.T, k)
+        return [
+            [(self._document(i), float(s)) for i, s in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors([embedding], k)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def batch_similarity_search_with_score(self, queries: List[str], k: int = 4,
+                                           max_concurrency: Optional[int] = None) -> List[List[Tuple[Document, float]]]:
+        """Answer ``N`` queries with a single matmul over their query embeddings.
+
+        The queries are embedded with concurrent ``embed_query`` calls, on at
+        most ``max_concurrency`` threads.
+        """
+        if not queries:
+            return []
+        return self.similarity_search_with_score_by_vectors(embed_queries(self.embedding, queries, max_concurrency), k)
+
+    def batch_similarity_search(self, queries: List[str], k: int = 4,
+                                max_concurrency: Optional[int] = None) -> List[List[Document]]:
+        hits = self.batch_similarity_search_with_score(queries, k, max_concurrency)
+        return [[doc for doc, _ in docs] for docs in hits]
+
+    def _document(self, row: int) -> Document:
+        return self._documents[row] if self.chunk_store is None else self.chunk_store.ref(row)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda score: (score + 1.0) / 2.0
+
+    # ------------------------------------------------------------------ #
+    # Construction and persistence
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def from_texts(cls,
+                   texts: List[str],
+                   embedding,
+                   metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None,
+                   **kwargs: Any) -> "FlatVectorIndex":
+        index = cls(embedding, **kwargs)
+        index.add_texts(texts, metadatas=metadatas, ids=ids)
+        return index
+
+    @classmethod
+    def from_chunk_store(cls,
+                         chunk_store: ChunkStore,
+                         embedding,
+                         batch_size: int = 256,
+                         ingestor=None,
+                         **kwargs: Any) -> "FlatVectorIndex":
+        """Embed every chunk of ``chunk_store`` into an index that keeps its documents there.
+
+        Args:
+            chunk_store (ChunkStore): Store whose chunks are indexed, in row order.
+            embedding : Embeddings model used for documents and queries.
+            batch_size (int): Chunks per ``embed_documents`` call without an ingestor.
+            ingestor (EmbeddingIngestor, optional): Embed in concurrent, rate-limited batches.
+            **kwargs: Passed to the constructor, e.g. ``quantization``.
+        """
+        index = cls(embedding, **kwargs)
+        index.chunk_store = chunk_store
+        if ingestor is not None:
+            ingestor.ingest(chunk_store.iter_documents(), embedding, ids=chunk_store.ids(), resume=False,
+                            sink=lambda ids, documents, embeddings: index._put(chunk_store.rows_of(ids),
+                                                                               normalize_rows(embeddings)))
+        else:
+            for start in range(0, len(chunk_store), batch_size):
+                rows = range(start, min(start + batch_size, len(chunk_store)))
+                index._put(rows, normalize_rows(embedding.embed_documents(chunk_store.texts(rows))))
+        index.version += 1
+        return index
+
+    def save(self, path: str):
+        """Write the index to ``path`` (a directory)."""
+        os.makedirs(path, exist_ok=True)
+        if self._quantized is not None:
+            self._quantized.save(path, self.VECTORS_FILE)
+        else:
+            np.save(os.path.join(path, self.VECTORS_FILE), self.vectors)
+        if self.chunk_store is not None:
+            self.chunk_store.save(path)
+            return
+        with open(os.path.join(path, self.DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            for doc_id, document in zip(self._ids, self._documents):
+                f.write(json.dumps({"id": doc_id,
+                                    "page_content": document.page_content,
+                                    "metadata": document.metadata}, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, path: str, embedding, mmap: bool = True, quantization: Optional[str] = None,
+             rescore: int = 4) -> "FlatVectorIndex":
+        """Open an index saved with ``save``; vectors are memory-mapped unless ``mmap=False``.
+
+        An index saved with a chunk store re-opens its store from the same directory.
+        An index saved quantized is re-opened quantized; ``quantization`` quantizes
+        one saved without (the float32 vectors then always stay memory-mapped).
+        """
+        quantized = quantization is not None or QuantizedVectors.exists(path)
+        matrix = np.load(os.path.join(path, cls.VECTORS_FILE), mmap_mode="r" if mmap or quantized else None)
+        index = cls(embedding, dim=matrix.shape[1], rescore=rescore)
+        if quantized:
+            index._quantized = QuantizedVectors.open(path, matrix, quantization)
+        else:
+            index._matrix = matrix
+        index._size = matrix.shape[0]
+        if ChunkStore.exists(path):
+            index.chunk_store = ChunkStore.load(path)
+            return index
+        with open(os.path.join(path, cls.DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                index._ids.append(entry["id"])
+                index._documents.append(Document(page_content=entry["page_content"], metadata=entry["metadata"]))
+        index._positions = {doc_id: row for row, doc_id in enumerate(index._ids)}
+        return index
@@ -1,15 +1,38 @@
-from langchain.prompts import ChatPromptTemplate
+import asyncio
+import logging
+import time
+from concurrent.futures import wait
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from langchain_core.prompts import ChatPromptTemplate
 from operator import itemgetter
 from langchain_core.output_parsers import StrOutputParser
 from abc import ABC, abstractmethod
-from langchain_core.runnables import RunnablePassthrough
-from .retriever import SimpleRetriever
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.runnables.config import ContextThreadPoolExecutor, run_in_executor
+from .retriever import SimpleRetriever, abatch_retrieve, batch_retrieve
+from .streaming import ProgressEvent
+from .tracing import CONTEXT_PACKING
+
+logger = logging.getLogger(__name__)
 
 class BaseGenerator(ABC):
-    def __init__(self, model, template: str = None):
+    # Whether ``answer`` runs the retrieval strategy's query-generation chain;
+    # ``RagPipeline.process_batch`` only prefetches generated queries if so.
+    generates_queries = True
+
+    def __init__(self, model, template: str = None, context_packer=None):
+        """
+        Args:
+            model : The LLM used for generation.
+            template (str, optional): Overrides the default prompt template.
+            context_packer (ContextPacker, optional): Dedupes, diversifies and budgets the
+                retrieved documents before they are put into the prompt.
+        """
         self.model = model
         self.template = template or self.default_template()
         self.prompt = ChatPromptTemplate.from_template(template=self.template)
+        self.context_packer = context_packer
 
     @abstractmethod
     def default_template(self):
@@ -21,65 +44,165 @@ class BaseGenerator(ABC):
         """Generate an answer based on the query and retrieval approach."""
         pass
 
+    async def aanswer(self, query, retrieval_approach):
+        """Asynchronously generate an answer based on the query and retrieval approach.
+
+        The default runs ``answer`` off the event loop.
+        """
+        return await run_in_executor(None, self.answer, query, retrieval_approach)
+
+    def stream(self, query, retrieval_approach, progress: bool = False):
+        """Yield the answer in chunks as the model produces them.
+
+        Multi-stage generators stream only their final stage; with ``progress``
+        they first yield a ``ProgressEvent`` for every intermediate stage. The
+        default yields the whole answer at once.
+        """
+        yield self.answer(query, retrieval_approach)
+
+    async def astream(self, query, retrieval_approach, progress: bool = False):
+        """Asynchronously yield the answer in chunks as the model produces them."""
+        yield await self.aanswer(query, retrieval_approach)
+
+    def pack(self, retrieval_chain):
+        """Put ``self.context_packer`` after ``retrieval_chain``; a no-op without a packer."""
+        if self.context_packer is None:
+            return retrieval_chain
+        return retrieval_chain | RunnableLambda(self.context_packer, name=CONTEXT_PACKING)
+
     def build_chain(self, context, question):
         """Builds a reusable chain for generating answers."""
         return {
             "context": context,
             "question": question
         } | self.prompt | self.model | StrOutputParser()
-    
 
 
-class SimpleGenerator(BaseGenerator):
+class ChainGenerator(ABC):
+    """Mixin for generators whose answer is a single chain.
+
+    Subclasses implement ``answer_chain``; ``answer``, ``aanswer``, ``stream``
+    and ``astream`` all run it, so the async and streaming paths need no extra code.
+    """
+
+    @abstractmethod
+    def answer_chain(self, retrieval_approach):
+        """Chain mapping ``{"question": query}`` to the final answer."""
+        pass
+
+    def answer(self, query, retrieval_approach):
+        return self.answer_chain(retrieval_approach).invoke({"question": query})
+
+    async def aanswer(self, query, retrieval_approach):
+        return await self.answer_chain(retrieval_approach).ainvoke({"question": query})
+
+    def stream(self, query, retrieval_approach, progress: bool = False):
+        yield from self.answer_chain(retrieval_approach).stream({"question": query})
+
+    async def astream(self, query, retrieval_approach, progress: bool = False):
+        async for chunk in self.answer_chain(retrieval_approach).astream({"question": query}):
+            yield chunk
+
+
+class SimpleGenerator(ChainGenerator, BaseGenerator):
+    generates_queries = False
+
     def default_template(self):
         return """Answer the following question based on this context:\n\n{context}\n\nQuestion: {question}"""
 
-    def answer(self, query, retrieval_approach):
-        chain = self.build_chain(context = itemgetter('question') | (retrieval_approach.base_retriever), 
-                                 question=itemgetter("question"))
-        
-        return chain.invoke({"question": query})
+    def answer_chain(self, retrieval_approach):
+        return self.build_chain(context = self.pack(itemgetter('question') | (retrieval_approach.base_retriever)),
+                                question=itemgetter("question"))
 
 
 
 
-class MultiQueryGenerator(BaseGenerator):
+class MultiQueryGenerator(ChainGenerator, BaseGenerator):
     def default_template(self):
         return """Answer the following question based on this context:\n\n{context}\n\nQuestion: {question}"""
 
-    def answer(self, query, retrieval_approach):
-        chain = self.build_chain(
-            context=retrieval_approach.build_retrieval_chain(retrieval_approach.get_unique_union),
+    def answer_chain(self, retrieval_approach):
+        return self.build_chain(
+            context=self.pack(retrieval_approach.build_retrieval_chain(retrieval_approach.get_unique_union)),
             question=itemgetter("question")
         )
-        return chain.invoke({"question": query})
 
 
 
-class FusionGenerator(BaseGenerator):
+class FusionGenerator(ChainGenerator, BaseGenerator):
     def default_template(self):
         return """Answer the following question based on this context:\n\n{context}\n\nQuestion: {question}"""
 
-    def answer(self, query, retrieval_approach):
-        chain = self.build_chain(
-            context=retrieval_approach.build_retrieval_chain(retrieval_approach.reciprocal_rank_fusion),
+    def answer_chain(self, retrieval_approach):
+        return self.build_chain(
+            context=self.pack(retrieval_approach.build_retrieval_chain(retrieval_approach.reciprocal_rank_fusion)),
             question=itemgetter("question")
         )
-        return chain.invoke({"question": query})
 
 
 
 
+@dataclass
+class IterationTiming:
+    question: str
+    seconds: float
+
+
+@dataclass
+class RecursiveReport:
+    """Timings of one ``RecursiveGenerator`` run."""
+    sub_questions: int = 0
+    skipped_questions: int = 0
+    retrieval_seconds: float = 0.0
+    iterations: List[IterationTiming] = field(default_factory=list)
+
+    @property
+    def generation_seconds(self) -> float:
+        return sum(iteration.seconds for iteration in self.iterations)
+
+
 class RecursiveGenerator(BaseGenerator):
+    """Answers the sub-questions in order, each with the previous question + answer pairs.
+
+    Only the LLM calls depend on earlier answers, so the context of every
+    sub-question is retrieved up front in one batch, the sub-questions embedded
+    concurrently (see ``batch_retrieve`` and ``abatch_retrieve``), and the loop
+    itself makes no retrieval calls.
+    """
+
+    def __init__(self, model, template: str = None, max_sub_questions: int = None, context_packer=None,
+                 on_report: Callable[[RecursiveReport], None] = None):
+        """
+        Args:
+            model : The LLM used for generation.
+            template (str, optional): Overrides the default prompt template.
+            max_sub_questions (int, optional): Answer at most this many of the generated sub-questions.
+            context_packer (ContextPacker, optional): Packs the documents retrieved for each sub-question.
+            on_report (Callable[[RecursiveReport], None], optional): Called with the timings of every run.
+        """
+        super().__init__(model, template, context_packer)
+        if max_sub_questions is not None and max_sub_questions < 1:
+            raise ValueError("max_sub_questions must be a positive integer")
+        self.max_sub_questions = max_sub_questions
+        self.on_report = on_report
+        self.last_report: Optional[RecursiveReport] = None
+
     def default_template(self):
         return (
             """Here is the question you need to answer:\n\n---\n{question}\n---\n\nHere is any available background question + answer pairs:\n\n---\n{q_a_pairs}\n---\n\nHere is additional context relevant to the question:\n\n---\n{context}\n---\n\nUse the above context and any background question + answer pairs to answer the question: {question}"""
         )
 
-    def build_chain(self, retrieval_approach):
+    def build_chain(self, retrieval_approach, documents: dict = None):
+        """Answer chain for one sub-question; ``documents`` maps questions to prefetched results."""
+        base_retriever = retrieval_approach.base_retriever
+        if documents is not None:
+            base_retriever = RunnableLambda(
+                lambda q: documents[q] if q in documents else retrieval_approach.base_retriever.invoke(q),
+                name="prefetched_retriever",
+            )
         return (
             {
-                "context": itemgetter("question") | retrieval_approach.base_retriever,
+                "context": self.pack(itemgetter("question") | base_retriever),
                 "question": itemgetter("question"),
                 "q_a_pairs": itemgetter("q_a_pairs")
             }
@@ -93,21 +216,131 @@ class RecursiveGenerator(BaseGenerator):
         return f"Question: {question}\nAnswer: {answer}\n"
 
     def answer(self, query, retrieval_approach):
-        questions = retrieval_approach.generate_queries(query)
+        questions, report = self._limit(query, retrieval_approach.generate_queries(query))
+        rag_chain = self.build_chain(retrieval_approach, self._prefetch(questions, retrieval_approach, report))
         q_a_pairs = ""
 
-        rag_chain = self.build_chain(retrieval_approach)
         for q in questions:
+            started = time.perf_counter()
             answer = rag_chain.invoke({"question": q, "q_a_pairs": q_a_pairs})
+            report.iterations.append(IterationTiming(q, time.perf_counter() - started))
+            q_a_pair = self.format_qa_pair(q, answer)
+            q_a_pairs += f"\n---\n{q_a_pair}"
+
+        self._report(report)
+        return answer
+
+    async def aanswer(self, query, retrieval_approach):
+        questions, report = self._limit(query, await retrieval_approach.agenerate_queries(query))
+        documents = await self._aprefetch(questions, retrieval_approach, report)
+        rag_chain = self.build_chain(retrieval_approach, documents)
+        q_a_pairs = ""
+
+        for q in questions:
+            started = time.perf_counter()
+            answer = await rag_chain.ainvoke({"question": q, "q_a_pairs": q_a_pairs})
+            report.iterations.append(IterationTiming(q, time.perf_counter() - started))
             q_a_pair = self.format_qa_pair(q, answer)
             q_a_pairs += f"\n---\n{q_a_pair}"
 
+        self._report(report)
         return answer
 
+    def stream(self, query, retrieval_approach, progress: bool = False):
+        questions, report = self._limit(query, retrieval_approach.generate_queries(query))
+        if progress:
+            yield ProgressEvent("sub_questions", f"Generated {len(questions)} sub-questions", {"questions": questions})
+        rag_chain = self.build_chain(retrieval_approach, self._prefetch(questions, retrieval_approach, report))
+        if progress:
+            yield self._retrieval_event(report)
+        q_a_pairs = ""
+        for q in questions[:-1]:
+            started = time.perf_counter()
+            answer = rag_chain.invoke({"question": q, "q_a_pairs": q_a_pairs})
+            report.iterations.append(IterationTiming(q, time.perf_counter() - started))
+            q_a_pairs += f"\n---\n{self.format_qa_pair(q, answer)}"
+            if progress:
+                yield ProgressEvent("sub_answer", q, {"question": q, "answer": answer,
+                                                      "seconds": report.iterations[-1].seconds})
+
+        started = time.perf_counter()
+        yield from rag_chain.stream({"question": questions[-1], "q_a_pairs": q_a_pairs})
+        report.iterations.append(IterationTiming(questions[-1], time.perf_counter() - started))
+        self._report(report)
+
+    async def astream(self, query, retrieval_approach, progress: bool = False):
+        questions, report = self._limit(query, await retrieval_approach.agenerate_queries(query))
+        if progress:
+            yield ProgressEvent("sub_questions", f"Generated {len(questions)} sub-questions", {"questions": questions})
+        documents = await self._aprefetch(questions, retrieval_approach, report)
+        rag_chain = self.build_chain(retrieval_approach, documents)
+        if progress:
+            yield self._retrieval_event(report)
+        q_a_pairs = ""
+        for q in questions[:-1]:
+            started = time.perf_counter()
+            answer = await rag_chain.ainvoke({"question": q, "q_a_pairs": q_a_pairs})
+            report.iterations.append(IterationTiming(q, time.perf_counter() - started))
+            q_a_pairs += f"\n---\n{self.format_qa_pair(q, answer)}"
+            if progress:
+                yield ProgressEvent("sub_answer", q, {"question": q, "answer": answer,
+                                                      "seconds": report.iterations[-1].seconds})
+
+        started = time.perf_counter()
+        async for chunk in rag_chain.astream({"question": questions[-1], "q_a_pairs": q_a_pairs}):
+            yield chunk
+        report.iterations.append(IterationTiming(questions[-1], time.perf_counter() - started))
+        self._report(report)
+
+    def _limit(self, query, questions):
+        # without sub-questions the query itself is the only question
+        questions = list(questions) or [query]
+        kept = questions[:self.max_sub_questions] if self.max_sub_questions else questions
+        return kept, RecursiveReport(sub_questions=len(kept), skipped_questions=len(questions) - len(kept))
+
+    @staticmethod
+    def _prefetch(questions, retrieval_approach, report: RecursiveReport) -> dict:
+        started = time.perf_counter()
+        documents = dict(zip(questions, batch_retrieve(retrieval_approach.base_retriever, questions)))
+        report.retrieval_seconds = time.perf_counter() - started
+        return documents
 
+    @staticmethod
+    async def _aprefetch(questions, retrieval_approach, report: RecursiveReport) -> dict:
+        started = time.perf_counter()
+        documents = dict(zip(questions, await abatch_retrieve(retrieval_approach.base_retriever, questions)))
+        report.retrieval_seconds = time.perf_counter() - started
+        return documents
+
+    @staticmethod
+    def _retrieval_event(report: RecursiveReport) -> ProgressEvent:
+        return ProgressEvent("retrieval", f"Retrieved context for {report.sub_questions} sub-questions",
+                             {"seconds": report.retrieval_seconds})
+
+    def _report(self, report: RecursiveReport):
+        self.last_report = report
+        if self.on_report is not None:
+            self.on_report(report)
 
 
 class IndividualGenerator(BaseGenerator):
+    def __init__(self, model, template: str = None, max_concurrency: int = 4, sub_question_timeout: float = None,
+                 context_packer=None):
+        """
+        Args:
+            model : The LLM used for the sub-answers and the final synthesis.
+            template (str, optional): Synthesis prompt template.
+            max_concurrency (int): Maximum number of sub-questions answered at once.
+            sub_question_timeout (float, optional): One deadline for the whole batch of
+                sub-questions, not a per-sub-question limit: seconds all of them together may
+                take, counted from when they are submitted. Sub-questions that fail or are not
+                answered by then are left out of the synthesis.
+            context_packer (ContextPacker, optional): Packs the documents retrieved for each sub-question.
+        """
+        super().__init__(model, template, context_packer)
+        self.max_concurrency = max(1, max_concurrency)
+        self.sub_question_timeout = sub_question_timeout
+
     def default_template(self):
         return """Here is a set of Q+A pairs:\n\n{context}\n\nUse these to synthesize an answer to the question: {question}"""
 
@@ -117,25 +350,114 @@ class IndividualGenerator(BaseGenerator):
         )
 
     def generate_qa(self, query, retrieval_approach):
-        sg = SimpleGenerator(model=self.model)
+        sg = SimpleGenerator(model=self.model, context_packer=self.context_packer)
         sub_questions = retrieval_approach.generate_queries(query)
-        answers = [
-            sg.answer(sub_question, retrieval_approach)
-            for sub_question in sub_questions
-        ]
-        return answers, sub_questions
+        results = self._answer_concurrently(
+            lambda sub_question: sg.answer(sub_question, retrieval_approach), sub_questions
+        )
+        return self._collect_answers(sub_questions, results)
+
+    async def agenerate_qa(self, query, retrieval_approach):
+        sg = SimpleGenerator(model=self.model, context_packer=self.context_packer)
+        sub_questions = await retrieval_approach.agenerate_queries(query)
+        if not sub_questions:
+            return self._collect_answers(sub_questions, [])
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def answer_one(sub_question):
+            async with semaphore:
+                return await sg.aanswer(sub_question, retrieval_approach)
+
+        tasks = [asyncio.ensure_future(answer_one(sub_question)) for sub_question in sub_questions]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.sub_question_timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+        results = [(task.exception() or task.result()) if task in done else self._timeout_error()
+                   for task in tasks]
+        return self._collect_answers(sub_questions, results)
+
+    def _answer_concurrently(self, answer_fn, sub_questions):
+        """Run ``answer_fn`` over the sub-questions on a bounded thread pool.
+
+        Returns one entry per sub-question, either its answer or the exception
+        it raised. ``sub_question_timeout`` is one deadline for the whole batch,
+        counted from submission, not a limit per sub-question; sub-questions still queued then are cancelled and get a
+        ``TimeoutError``. Threads cannot be interrupted, so calls already running
+        are abandoned rather than cancelled: they finish in the background and
+        their answers are discarded.
+        """
+        results = [None] * len(sub_questions)
+        if not sub_questions:
+            return results
+
+        executor = ContextThreadPoolExecutor(max_workers=min(self.max_concurrency, len(sub_questions)))
+        try:
+            futures = [executor.submit(answer_fn, sub_question) for sub_question in sub_questions]
+            done, _ = wait(futures, timeout=self.sub_question_timeout)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for i, future in enumerate(futures):
+            results[i] = (future.exception() or future.result()) if future in done else self._timeout_error()
+        return results
+
+    def _timeout_error(self) -> TimeoutError:
+        return TimeoutError(f"Sub-question not answered within {self.sub_question_timeout}s")
+
+    @staticmethod
+    def _collect_answers(sub_questions, results):
+        answers, answered = [], []
+        errors = []
+        for sub_question, result in zip(sub_questions, results):
+            if isinstance(result, BaseException):
+                errors.append(result)
+                logger.warning("Dropping sub-question %r: %r", sub_question, result)
+                continue
+            answers.append(result)
+            answered.append(sub_question)
+
+        if errors and not answers:
+            raise errors[0]
+        return answers, answered
+
+    def synthesis_chain(self):
+        return self.build_chain(context=itemgetter('context') , question=itemgetter("question"))
 
     def answer(self, query, retrieval_approach):
         answers, questions = self.generate_qa(query, retrieval_approach)
         context = self.format_qa_pairs(questions, answers)
-        chain = self.build_chain(context=itemgetter('context') , question=itemgetter("question"))
+        chain = self.synthesis_chain()
         return chain.invoke({"question": query, "context": context})
 
+    async def aanswer(self, query, retrieval_approach):
+        answers, questions = await self.agenerate_qa(query, retrieval_approach)
+        context = self.format_qa_pairs(questions, answers)
+        chain = self.synthesis_chain()
+        return await chain.ainvoke({"question": query, "context": context})
+
+    def stream(self, query, retrieval_approach, progress: bool = False):
+        answers, questions = self.generate_qa(query, retrieval_approach)
+        if progress:
+            for q, a in zip(questions, answers):
+                yield ProgressEvent("sub_answer", q, {"question": q, "answer": a})
+        context = self.format_qa_pairs(questions, answers)
+        yield from self.synthesis_chain().stream({"question": query, "context": context})
+
+    async def astream(self, query, retrieval_approach, progress: bool = False):
+        answers, questions = await self.agenerate_qa(query, retrieval_approach)
+        if progress:
+            for q, a in zip(questions, answers):
+                yield ProgressEvent("sub_answer", q, {"question": q, "answer": a})
+        context = self.format_qa_pairs(questions, answers)
+        async for chunk in self.synthesis_chain().astream({"question": query, "context": context}):
+            yield chunk
 
 
 
 
-class StepBackGenerator(BaseGenerator):
+
+class StepBackGenerator(ChainGenerator, BaseGenerator):
     def default_template(self):
         return  """You are an expert of world knowledge. I am going to ask you a question. Your response should be comprehensive and not contradicted with the following context if they are relevant. Otherwise, ignore them if they are not relevant.
 
@@ -147,30 +469,26 @@ class StepBackGenerator(BaseGenerator):
 
     def build_chain(self, retrival_approch):
         return {
-            "normal_context": itemgetter('question')| retrival_approch.base_retriever,
+            "normal_context": self.pack(itemgetter('question')| retrival_approch.base_retriever),
             "question": itemgetter('question'),
-            "step_back_context": retrival_approch.build_query_gen_chain() | retrival_approch.base_retriever
+            "step_back_context": self.pack(retrival_approch.build_query_gen_chain() | retrival_approch.base_retriever)
         } | self.prompt | self.model | StrOutputParser()
 
-    def answer(self, query, retrieval_approach):
-        chain = self.build_chain(retrival_approch=retrieval_approach)
+    def answer_chain(self, retrieval_approach):
+        return self.build_chain(retrival_approch=retrieval_approach)
 
-        return chain.invoke({"question": query})
-    
 
 
 
-class HyDEGenerator(BaseGenerator):
+class HyDEGenerator(ChainGenerator, BaseGenerator):
     def default_template(self):
         return  """Answer the following question based on this context:
             {context}
             Question: {question}
             """
 
-    def answer(self, query, retrieval_approach):
-        chain = self.build_chain(question=itemgetter('question') 
-                                 , context = retrieval_approach.build_retrieval_chain())
+    def answer_chain(self, retrieval_approach):
+        return self.build_chain(question=itemgetter('question')
+                                , context = self.pack(retrieval_approach.build_retrieval_chain()))
 
-        return chain.invoke({"question": query})
-    
 
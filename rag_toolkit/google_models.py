@@ -1,7 +1,8 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+# langchain_google_genai is imported on first use; it is the slowest import of the toolkit.
+
 
 def initialize_llm(api_key , model_name):
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
     llm = ChatGoogleGenerativeAI(
         model=model_name,
@@ -16,5 +17,6 @@ def initialize_llm(api_key , model_name):
 
 
 def initialize_embedding(api_key , model_name):
-    return GoogleGenerativeAIEmbeddings(google_api_key=api_key , model= model_name)
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+    return GoogleGenerativeAIEmbeddings(google_api_key=api_key , model= model_name)
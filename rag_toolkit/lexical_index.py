@@ -0,0 +1,250 @@
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever as LangchainRetriever
+from pydantic import ConfigDict
+
+from .flat_index import top_k
+from .retriever import reciprocal_rank_fusion
+from .utils import assign_document_ids, document_id
+
+# Words, plus identifiers joined by dots, dashes or underscores (``ERR_CONN-42``,
+# ``os.path.join``) kept whole alongside their parts.
+DEFAULT_TOKEN_PATTERN = r"\w+(?:[.\-]\w+)*"
+_COMPOUND_SEPARATORS = re.compile(r"[.\-]")
+
+
+class BM25Index:
+    """In-process BM25 inverted index.
+
+    Every term has a postings list made of two ``array`` columns, document row
+    and term frequency, which are scored in bulk as NumPy views. Documents are
+    appended incrementally; re-adding or deleting an id tombstones its old row,
+    and the postings are compacted once tombstones pass ``compact_threshold``
+    of the rows. Queries need no network call.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, token_pattern: str = DEFAULT_TOKEN_PATTERN,
+                 compact_threshold: float = 0.25):
+        """
+        Args:
+            k1 (float): Term-frequency saturation.
+            b (float): Document-length normalisation.
+            token_pattern (str): Regex matching one term; matching is case-insensitive.
+            compact_threshold (float): Fraction of tombstoned rows that triggers ``compact``.
+        """
+        self.k1 = k1
+        self.b = b
+        self.token_regex = re.compile(token_pattern)
+        self.compact_threshold = compact_threshold
+        self._terms: Dict[str, int] = {}
+        self._postings_rows: List[array] = []
+        self._postings_freqs: List[array] = []
+        self._df = array("i")
+        self._lengths = array("i")
+        self._live = array("b")
+        self._documents: List[Document] = []
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._total_length = 0
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def tokenize(self, text: str) -> List[str]:
+        text = text.lower()
+        tokens = self.token_regex.findall(text)
+        if "." in text or "-" in text:
+            tokens += [part for token in tokens if "." in token or "-" in token
+                       for part in _COMPOUND_SEPARATORS.split(token) if part]
+        return tokens
+
+    # ------------------------------------------------------------------ #
+    # Writes
+    # ------------------------------------------------------------------ #
+    def add_documents(self, documents: Iterable[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Index ``documents``; an id that is already indexed is replaced."""
+        documents = assign_document_ids(documents, ids)
+        terms, postings_rows, postings_freqs, df = self._terms, self._postings_rows, self._postings_freqs, self._df
+        added = []
+        for document in documents:
+            doc_id = document_id(document)
+            if doc_id in self._positions:
+                self._tombstone(self._positions[doc_id])
+
+            row = len(self._documents)
+            tokens = self.tokenize(document.page_content)
+            for term, freq in Counter(tokens).items():
+                term_id = terms.get(term)
+                if term_id is None:
+                    term_id = terms[term] = len(postings_rows)
+                    postings_rows.append(array("i"))
+                    postings_freqs.append(array("i"))
+                    df.append(0)
+                postings_rows[term_id].append(row)
+                postings_freqs[term_id].append(freq)
+                df[term_id] += 1
+
+            self._lengths.append(len(tokens))
+            self._live.append(1)
+            self._total_length += len(tokens)
+            self._documents.append(document)
+            self._ids.append(doc_id)
+            self._positions[doc_id] = row
+            added.append(doc_id)
+        self._maybe_compact()
+        return added
+
+    def delete(self, ids: List[str]) -> bool:
+        rows = [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+        for row in rows:
+            self._tombstone(row)
+        self._maybe_compact()
+        return bool(rows)
+
+    def _tombstone(self, row: int):
+        del self._positions[self._ids[row]]
+        self._live[row] = 0
+        self._total_length -= self._lengths[row]
+        self._dead += 1
+        for term in set(self.tokenize(self._documents[row].page_content)):
+            self._df[self._terms[term]] -= 1
+
+    def _maybe_compact(self):
+        if self._dead and self._dead > self.compact_threshold * len(self._documents):
+            self.compact()
+
+    def compact(self):
+        """Drop tombstoned rows from the postings and renumber the live rows."""
+        if not self._dead:
+            return
+        live = np.frombuffer(self._live, dtype=np.int8).astype(bool)
+        new_rows = np.cumsum(live, dtype=np.int32) - 1
+
+        terms: Dict[str, int] = {}
+        postings_rows: List[array] = []
+        postings_freqs: List[array] = []
+        for term, term_id in self._terms.items():
+            if not self._df[term_id]:
+                continue
+            rows = np.frombuffer(self._postings_rows[term_id], dtype=np.int32)
+            keep = live[rows]
+            terms[term] = len(postings_rows)
+            postings_rows.append(array("i", new_rows[rows[keep]].tobytes()))
+            freqs = np.frombuffer(self._postings_freqs[term_id], dtype=np.int32)
+            postings_freqs.append(array("i", freqs[keep].tobytes()))
+
+        kept = np.flatnonzero(live)
+        self._terms, self._postings_rows, self._postings_freqs = terms, postings_rows, postings_freqs
+        self._df = array("i", (len(rows) for rows in postings_rows))
+        self._lengths = array("i", np.frombuffer(self._lengths, dtype=np.int32)[kept].tobytes())
+        self._live = array("b", bytes([1]) * len(kept))
+        self._documents = [self._documents[row] for row in kept]
+        self._ids = [self._ids[row] for row in kept]
+        self._positions = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._dead = 0
+
+    # ------------------------------------------------------------------ #
+    # Search
+    # ------------------------------------------------------------------ #
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every row for ``query``; deleted rows score 0."""
+        n_rows = len(self._documents)
+        scores = np.zeros(n_rows, dtype=np.float32)
+        n_docs = len(self._positions)
+        if not n_docs:
+            return scores
+
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        live = np.frombuffer(self._live, dtype=np.int8).astype(bool) if self._dead else None
+        avg_length = self._total_length / n_docs
+        for term in set(self.tokenize(query)):
+            term_id = self._terms.get(term)
+            if term_id is None or not self._df[term_id]:
+                continue
+            rows = np.frombuffer(self._postings_rows[term_id], dtype=np.int32)
+            freqs = np.frombuffer(self._postings_freqs[term_id], dtype=np.int32).astype(np.float32)
+            if live is not None:
+                keep = live[rows]
+                rows, freqs = rows[keep], freqs[keep]
+            df = self._df[term_id]
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / avg_length)
+            scores[rows] += idf * freqs * (self.k1 + 1) / (freqs + norm)
+        return scores
+
+    def search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Top-``k`` documents matching at least one query term, best first."""
+        scores = self.scores(query)
+        if not len(scores):
+            return []
+        indices, values = top_k(scores[None, :], k)
+        return [(self._documents[i], float(s)) for i, s in zip(indices[0], values[0]) if s > 0]
+
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.search_with_score(query, k)]
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], **kwargs: Any) -> "BM25Index":
+        index = cls(**kwargs)
+        index.add_documents(documents)
+        return index
+
+    def as_retriever(self, k: int = 4) -> "LexicalRetriever":
+        return LexicalRetriever(index=self, k=k)
+
+
+class LexicalRetriever(LangchainRetriever):
+    """Keyword-only retriever over a ``BM25Index``: no embeddings call, no network."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: BM25Index
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.index.search(query, self.k)
+
+
+class HybridRetriever(LangchainRetriever):
+    """Fuse BM25 and vector-search results with reciprocal rank fusion.
+
+    Lexical matching catches exact identifiers (error codes, API names) that
+    embeddings blur; vector search catches paraphrases.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: BM25Index
+    vector_retriever: Any
+    k: int = 4
+    fetch_k: int = 10
+    rrf_k: int = 60
+
+    def _fuse(self, lexical: List[Document], semantic: List[Document]) -> List[Document]:
+        return [doc for doc, _ in reciprocal_rank_fusion([lexical, semantic], k=self.rrf_k)[:self.k]]
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical = self.index.search(query, self.fetch_k)
+        semantic = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(lexical, semantic)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        lexical = self.index.search(query, self.fetch_k)
+        semantic = await self.vector_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(lexical, semantic)
+
+
+def create_lexical_retriever(documents, k=2, **kwargs) -> LexicalRetriever:
+    """BM25 retriever over ``documents``, built without any embeddings call."""
+    return BM25Index.from_documents(documents, **kwargs).as_retriever(k=k)
@@ -1,10 +1,230 @@
-from .retriever import Retrieval
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from .retriever import Retrieval, batch_retrieve
 from .generator import BaseGenerator
+from .streaming import AsyncTokenStream, TokenStream
+from .tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchResult:
+    query: str
+    answer: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
 class RagPipeline:
-    def __init__(self, retrieval: Retrieval, generator: BaseGenerator):
+    def __init__(self, retrieval: Retrieval, generator: BaseGenerator, answer_cache=None, corpus=None,
+                 tracer: Optional[Tracer] = None):
+        """
+        Args:
+            retrieval (Retrieval): Retrieval strategy.
+            generator (BaseGenerator): Generation strategy.
+            answer_cache (SemanticAnswerCache, optional): Reuses answers to the same or similar questions.
+            corpus (optional): Object with a ``version`` counter that changes with the indexed content,
+                e.g. an ``IncrementalVectorStore``; defaults to the retriever's vector store. Without
+                either, cached answers survive index updates until ``answer_cache.invalidate()``.
+            tracer (Tracer, optional): Records per-stage spans and call counts of every request.
+        """
         self.retrieval = retrieval
         self.generator = generator
+        self.answer_cache = answer_cache
+        self.corpus = corpus
+        self.tracer = tracer
+        if answer_cache is not None and self.corpus_version() is None:
+            logger.warning("The answer cache cannot see corpus updates: pass corpus= (an object with a "
+                           "`version`) or call answer_cache.invalidate() after changing the index.")
+
+    def corpus_version(self):
+        corpus = self.corpus
+        if corpus is None:
+            corpus = getattr(getattr(self.retrieval, "base_retriever", None), "vectorstore", None)
+        return getattr(corpus, "version", None)
+
+    def answer_cache_scope(self) -> str:
+        name = f"{self.retrieval.name()}/{type(self.generator).__name__}"
+        return self.answer_cache.scope(name, self.corpus_version())
 
     def process(self, query: str):
-        return self.generator.answer(query=query , retrieval_approach= self.retrieval)
+        with self._trace(query):
+            return self._answer(query, self.retrieval)
+
+    async def aprocess(self, query: str):
+        with self._trace(query):
+            if self.answer_cache is None:
+                return await self.generator.aanswer(query=query , retrieval_approach= self.retrieval)
+            return await self.answer_cache.aget_or_compute(
+                query, self.answer_cache_scope(),
+                lambda: self.generator.aanswer(query=query, retrieval_approach=self.retrieval),
+            )
+
+    def stream(self, query: str, progress: bool = False) -> TokenStream:
+        """
+        Stream the answer to ``query`` token by token.
+
+        Args:
+            query (str): The question.
+            progress (bool): Also yield a ``ProgressEvent`` for every intermediate
+                stage of multi-stage generators.
+
+        Returns:
+            TokenStream: Iterator of answer chunks exposing ``time_to_first_token``,
+            ``total_time`` and the accumulated ``text``.
+        """
+        if self.tracer is None:
+            return TokenStream(self._stream(query, progress))
+        return TokenStream(self.tracer.trace_iter(query, lambda: self._stream(query, progress)))
+
+    def astream(self, query: str, progress: bool = False) -> AsyncTokenStream:
+        """Async counterpart of ``stream``; iterate it with ``async for``."""
+        if self.tracer is None:
+            return AsyncTokenStream(self._astream(query, progress))
+        return AsyncTokenStream(self.tracer.atrace_iter(query, lambda: self._astream(query, progress)))
+
+    def _stream(self, query: str, progress: bool):
+        if self.answer_cache is None:
+            yield from self.generator.stream(query, self.retrieval, progress=progress)
+            return
+
+        scope = self.answer_cache_scope()
+        answer, vector = self.answer_cache.lookup(query, scope)
+        if answer is not None:
+            yield answer
+            return
+        chunks = []
+        for chunk in self.generator.stream(query, self.retrieval, progress=progress):
+            if isinstance(chunk, str):
+                chunks.append(chunk)
+            yield chunk
+        self.answer_cache.store(query, scope, "".join(chunks), vector)
+
+    async def _astream(self, query: str, progress: bool):
+        if self.answer_cache is None:
+            async for chunk in self.generator.astream(query, self.retrieval, progress=progress):
+                yield chunk
+            return
+
+        scope = self.answer_cache_scope()
+        answer, vector = await self.answer_cache.alookup(query, scope)
+        if answer is not None:
+            yield answer
+            return
+        chunks = []
+        async for chunk in self.generator.astream(query, self.retrieval, progress=progress):
+            if isinstance(chunk, str):
+                chunks.append(chunk)
+            yield chunk
+        self.answer_cache.store(query, scope, "".join(chunks), vector)
+
+    def process_batch(self, queries: List[str], max_concurrency: int = 8) -> List[BatchResult]:
+        """
+        Answer many queries, sharing work across the batch.
+
+        Identical queries are answered once. The query-generation prompts of the
+        whole batch go through the model's ``batch``, and every query and
+        generated sub-query is then embedded concurrently and searched together
+        (see ``batch_retrieve``). Answers are generated on at most ``max_concurrency``
+        threads from the prefetched results.
+
+        Args:
+            queries (List[str]): The questions to answer.
+            max_concurrency (int): Maximum number of concurrent LLM calls.
+
+        Returns:
+            List[BatchResult]: One result per query, in input order; a failed query
+            carries its exception in ``error`` instead of raising.
+
+        With a tracer, the whole batch is recorded as a single trace since most
+        of its work is shared between queries.
+        """
+        with self._trace(queries, name="process_batch"):
+            return self._process_batch(queries, max_concurrency)
+
+    def _process_batch(self, queries: List[str], max_concurrency: int) -> List[BatchResult]:
+        unique = list(dict.fromkeys(queries))
+        results = {}
+
+        pending = unique
+        if self.answer_cache is not None:
+            scope = self.answer_cache_scope()
+            for query in unique:
+                answer = self.answer_cache.backend.get(self.answer_cache.key(query, scope))
+                if answer is not None:
+                    results[query] = BatchResult(query, answer)
+            pending = [query for query in unique if query not in results]
+
+        retrieval = self._prefetched_retrieval(pending, max_concurrency, results)
+        pending = [query for query in pending if query not in results]
+
+        def answer_one(query):
+            try:
+                return BatchResult(query, self._answer(query, retrieval))
+            except Exception as e:
+                return BatchResult(query, error=e)
+
+        if pending:
+            with ContextThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(pending)))) as executor:
+                for result in executor.map(answer_one, pending):
+                    results[result.query] = result
+
+        return [results[query] for query in queries]
+
+    def _trace(self, query, name: str = "pipeline"):
+        return self.tracer.trace(query, name=name) if self.tracer is not None else nullcontext()
+
+    def _answer(self, query: str, retrieval):
+        if self.answer_cache is None:
+            return self.generator.answer(query=query , retrieval_approach= retrieval)
+        return self.answer_cache.get_or_compute(
+            query, self.answer_cache_scope(),
+            lambda: self.generator.answer(query=query, retrieval_approach=retrieval),
+        )
+
+    def _prefetched_retrieval(self, queries: List[str], max_concurrency: int, results: dict):
+        """
+        Copy of the retrieval strategy (see ``BaseRetriever.with_prefetched``) whose
+        query generation and base retriever answer from results computed for the
+        whole batch up front.
+
+        Queries whose query generation fails get an error entry in ``results``.
+        Lookups that were not prefetched fall through to the real chain.
+        """
+        retrieval = self.retrieval
+        if not hasattr(retrieval, "with_prefetched") or not queries:
+            return retrieval
+        base_retriever = retrieval.base_retriever
+
+        generated = {}
+        if self.generator.generates_queries:
+            query_gen_chain = retrieval.build_query_gen_chain()
+            outputs = query_gen_chain.batch([{"question": query} for query in queries],
+                                            config={"max_concurrency": max_concurrency},
+                                            return_exceptions=True)
+            for query, output in zip(queries, outputs):
+                if isinstance(output, Exception):
+                    results[query] = BatchResult(query, error=output)
+                else:
+                    generated[query] = output
+
+        search_queries = [query for query in queries if query not in results]
+        for output in generated.values():
+            search_queries.extend(output if isinstance(output, list) else [output])
+        search_queries = list(dict.fromkeys(search_queries))
+
+        documents = {}
+        try:
+            documents = dict(zip(search_queries, batch_retrieve(base_retriever, search_queries, max_concurrency)))
+        except Exception as e:
+            logger.warning("Batched retrieval failed, retrieving per query: %r", e)
+        return retrieval.with_prefetched(queries=generated, documents=documents)
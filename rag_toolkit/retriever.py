@@ -1,7 +1,36 @@
+import asyncio
+import copy
 from abc import ABC, abstractmethod
 from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain.load import dumps, loads
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import get_executor_for_config
+from .tracing import QUERY_GENERATION, record, span
+from .utils import aembed_queries, document_id, embed_queries, model_name, stable_hash
+
+
+def reciprocal_rank_fusion(results: list[list], k=60):
+    """Fuse ranked document lists into ``(document, score)`` pairs, best first."""
+    fused_scores = {}
+    docs_by_id = {}
+
+    for docs in results:
+        for rank, doc in enumerate(docs):
+            doc_id = document_id(doc)
+            docs_by_id.setdefault(doc_id, doc)
+            fused_scores[doc_id] = fused_scores.get(doc_id, 0) + 1 / (rank + k)
+
+    reranked_results = [
+        (docs_by_id[doc_id], score)
+        for doc_id, score in sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
+    ]
+
+    return reranked_results
+
+
+def question(x) -> str:
+    """The question of a query-generation chain input, given as a string or ``{"question": ...}``."""
+    return x["question"] if isinstance(x, dict) else x
 
 
 class Retrieval(ABC):
@@ -19,23 +48,113 @@ class Retrieval(ABC):
 
 
 class BaseRetriever(Retrieval):
-    def __init__(self, model, base_retriever, template=None):
+    def __init__(self, model, base_retriever, template=None, query_cache=None):
+        """
+        Args:
+            model : LLM used to generate the search queries.
+            base_retriever : Retriever the generated queries are run against.
+            template (str, optional): Overrides the default query-generation prompt.
+            query_cache (QueryCache, optional): Caches generated queries per question.
+        """
         self.model = model
         self.base_retriever = base_retriever
         self.template = template
+        self.query_cache = query_cache
+        self._query_cache_scope = None
+        self._prefetched_queries = None
 
     def build_query_gen_chain(self):
-        return (
+        return self.with_query_cache(
             self.generate_retrieval_prompt()
             | self.model
             | StrOutputParser()
             | (lambda x: [q.strip() for q in x.split("\n") if q.strip()])
         )
 
+    def with_prefetched(self, queries: dict = None, documents: dict = None) -> "BaseRetriever":
+        """Copy of this retrieval strategy that answers from results computed up front.
+
+        Args:
+            queries (dict, optional): Generated queries per question, returned by the
+                query-generation chain instead of calling the LLM.
+            documents (dict, optional): Documents per search query, returned by
+                ``base_retriever`` instead of searching again.
+
+        Questions and search queries missing from the dicts go through the real chains.
+        """
+        prefetched = copy.copy(self)
+        if queries:
+            prefetched._prefetched_queries = queries
+        if documents:
+            base_retriever = self.base_retriever
+
+            async def aretrieve(q):
+                return documents[q] if q in documents else await base_retriever.ainvoke(q)
+
+            prefetched.base_retriever = RunnableLambda(
+                lambda q: documents[q] if q in documents else base_retriever.invoke(q),
+                afunc=aretrieve, name="prefetched_retriever",
+            )
+        return prefetched
+
+    def with_query_cache(self, query_gen_chain):
+        """Put ``self.query_cache`` in front of ``query_gen_chain``.
+
+        The returned runnable is named ``query_generation`` so traces can tell
+        query-generation LLM calls from answer generation. On a copy made by
+        ``with_prefetched``, prefetched queries are returned before either.
+        """
+        if self.query_cache is None:
+            query_gen_chain = query_gen_chain.with_config(run_name=QUERY_GENERATION)
+        else:
+            cache = self.query_cache
+            scope = self.query_cache_scope()
+            chain = query_gen_chain
+
+            def generate(x, config):
+                return cache.get_or_compute(question(x), scope, lambda: chain.invoke(x, config))
+
+            async def agenerate(x, config):
+                return await cache.aget_or_compute(question(x), scope, lambda: chain.ainvoke(x, config))
+
+            query_gen_chain = RunnableLambda(generate, afunc=agenerate, name=QUERY_GENERATION)
+
+        if self._prefetched_queries is None:
+            return query_gen_chain
+        prefetched = self._prefetched_queries
+
+        def generate_prefetched(x, config):
+            return prefetched[question(x)] if question(x) in prefetched else query_gen_chain.invoke(x, config)
+
+        async def agenerate_prefetched(x, config):
+            if question(x) in prefetched:
+                return prefetched[question(x)]
+            return await query_gen_chain.ainvoke(x, config)
+
+        return RunnableLambda(generate_prefetched, afunc=agenerate_prefetched, name="prefetched_query_gen")
+
+    def query_cache_scope(self) -> str:
+        """Cache scope of this retriever: its type, prompt template and model."""
+        if self._query_cache_scope is None:
+            self._query_cache_scope = stable_hash(
+                type(self).__name__, repr(self.generate_retrieval_prompt()), model_name(self.model)
+            )
+        return self._query_cache_scope
+
     def generate_queries(self, input_query: str):
         query_gen_chain = self.build_query_gen_chain()
         return query_gen_chain.invoke(input_query)
 
+    async def agenerate_queries(self, input_query: str):
+        query_gen_chain = self.build_query_gen_chain()
+        return await query_gen_chain.ainvoke(input_query)
+
+    def retrieve_documents(self, input_query: str):
+        return self.base_retriever.invoke(input_query)
+
+    async def aretrieve_documents(self, input_query: str):
+        return await self.base_retriever.ainvoke(input_query)
+
     def build_retrieval_chain(self, aggregation_fn):
         return (
             self.build_query_gen_chain()
@@ -48,8 +167,12 @@ class SimpleRetriever(BaseRetriever):
     def name(self) -> str:
         return "Simple Retrieval"
 
-    def retrieve_documents(self, input_query: str):
-        return self.base_retriever.get_relevant_documents.invoke(input_query)
+    def generate_retrieval_prompt(self):
+        return ChatPromptTemplate.from_template(self.template or "{question}")
+
+    def build_query_gen_chain(self):
+        # Simple retrieval searches with the question itself, no LLM call involved.
+        return RunnableLambda(lambda x: [x["question"] if isinstance(x, dict) else x])
 
 
 class MultiQueryRetriever(BaseRetriever):
@@ -69,10 +192,16 @@ class MultiQueryRetriever(BaseRetriever):
         retrieval_chain = self.build_retrieval_chain(aggregation_fn=self.get_unique_union)
         return retrieval_chain.invoke(input_query)
 
+    async def aretrieve_documents(self, input_query: str):
+        retrieval_chain = self.build_retrieval_chain(aggregation_fn=self.get_unique_union)
+        return await retrieval_chain.ainvoke(input_query)
+
     def get_unique_union(self, documents: list[list]):
-        flattened_docs = [dumps(doc) for sublist in documents for doc in sublist]
-        unique_docs = list(set(flattened_docs))
-        return [loads(doc) for doc in unique_docs]
+        unique_docs = {}
+        for sublist in documents:
+            for doc in sublist:
+                unique_docs.setdefault(document_id(doc), doc)
+        return list(unique_docs.values())
 
 
 class FusionRetriever(BaseRetriever):
@@ -90,20 +219,12 @@ class FusionRetriever(BaseRetriever):
         retrieval_chain = self.build_retrieval_chain(aggregation_fn=self.reciprocal_rank_fusion)
         return retrieval_chain.invoke({'question': input_query})
 
-    def reciprocal_rank_fusion(self, results: list[list], k=60):
-        fused_scores = {}
-
-        for docs in results:
-            for rank, doc in enumerate(docs):
-                doc_str = dumps(doc)
-                fused_scores[doc_str] = fused_scores.get(doc_str, 0) + 1 / (rank + k)
-
-        reranked_results = [
-            (loads(doc), score)
-            for doc, score in sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-        ]
+    async def aretrieve_documents(self, input_query: str):
+        retrieval_chain = self.build_retrieval_chain(aggregation_fn=self.reciprocal_rank_fusion)
+        return await retrieval_chain.ainvoke({'question': input_query})
 
-        return reranked_results
+    def reciprocal_rank_fusion(self, results: list[list], k=60):
+        return reciprocal_rank_fusion(results, k=k)
 
 
 class DecomposeRetriever(BaseRetriever):
@@ -159,7 +280,7 @@ class StepBackRetriever(BaseRetriever):
             ]
         )
     def build_query_gen_chain(self):
-        return (
+        return self.with_query_cache(
             self.generate_retrieval_prompt()
             | self.model
             | StrOutputParser()
@@ -179,7 +300,7 @@ class HyDERetriever(BaseRetriever):
         return ChatPromptTemplate.from_template(template)
 
     def build_query_gen_chain(self):
-        return (
+        return self.with_query_cache(
             self.generate_retrieval_prompt()
             | self.model
             | StrOutputParser()
@@ -189,4 +310,76 @@ class HyDERetriever(BaseRetriever):
         return (
             self.build_query_gen_chain()
             | self.base_retriever
-        )
\ No newline at end of file
+        )
+
+    def retrieve_documents(self, input_query: str):
+        return self.build_retrieval_chain().invoke(input_query)
+
+    async def aretrieve_documents(self, input_query: str):
+        return await self.build_retrieval_chain().ainvoke(input_query)
+
+
+def _vector_search(base_retriever):
+    """``(vectorstore, k, search_kwargs)`` of a similarity-search retriever, else ``None``."""
+    vectorstore = getattr(base_retriever, "vectorstore", None)
+    if (vectorstore is None or vectorstore.embeddings is None
+            or getattr(base_retriever, "search_type", None) != "similarity"):
+        return None
+    search_kwargs = dict(base_retriever.search_kwargs)
+    return vectorstore, search_kwargs.pop("k", 4), search_kwargs
+
+
+def _record_batch(results: list) -> list:
+    record("retriever_calls", len(results))
+    record("documents_retrieved", sum(len(docs) for docs in results))
+    return results
+
+
+def batch_retrieve(base_retriever, queries: list[str], max_concurrency: int = None) -> list[list]:
+    """Retrieve documents for many queries at once.
+
+    For a similarity-search retriever over a vector store, the queries are
+    embedded up front with concurrent ``embed_query`` calls, on at most
+    ``max_concurrency`` threads like ``base_retriever.batch``. A
+    ``FlatVectorIndex`` then answers them with one matrix product; other
+    stores are searched concurrently by vector. Other retrievers fall back to
+    ``base_retriever.batch``.
+    """
+    queries = list(queries)
+    search = _vector_search(base_retriever) if queries else None
+    if search is None:
+        return base_retriever.batch(queries, config={"max_concurrency": max_concurrency})
+
+    vectorstore, k, search_kwargs = search
+    with span("batch_retrieve", "retrieval", queries=len(queries)):
+        vectors = embed_queries(vectorstore.embeddings, queries, max_concurrency)
+        if hasattr(vectorstore, "similarity_search_with_score_by_vectors") and not search_kwargs:
+            results = [[doc for doc, _ in hits]
+                       for hits in vectorstore.similarity_search_with_score_by_vectors(vectors, k)]
+        else:
+            with get_executor_for_config({"max_concurrency": max_concurrency}) as executor:
+                results = list(executor.map(
+                    lambda vector: vectorstore.similarity_search_by_vector(vector, k=k, **search_kwargs), vectors))
+    return _record_batch(results)
+
+
+async def abatch_retrieve(base_retriever, queries: list[str], max_concurrency: int = None) -> list[list]:
+    """Async ``batch_retrieve``: the query embeddings are awaited concurrently, then searched together.
+
+    Other retrievers fall back to ``base_retriever.abatch``.
+    """
+    queries = list(queries)
+    search = _vector_search(base_retriever) if queries else None
+    if search is None:
+        return await base_retriever.abatch(queries, config={"max_concurrency": max_concurrency})
+
+    vectorstore, k, search_kwargs = search
+    with span("batch_retrieve", "retrieval", queries=len(queries)):
+        vectors = await aembed_queries(vectorstore.embeddings, queries)
+        if hasattr(vectorstore, "similarity_search_with_score_by_vectors") and not search_kwargs:
+            results = [[doc for doc, _ in hits]
+                       for hits in vectorstore.similarity_search_with_score_by_vectors(vectors, k)]
+        else:
+            results = await asyncio.gather(*(vectorstore.asimilarity_search_by_vector(vector, k=k, **search_kwargs)
+                                             for vector in vectors))
+    return _record_batch(list(results))
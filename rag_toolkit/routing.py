@@ -1,7 +1,13 @@
-from typing import List
+import re
+import threading
+from typing import Dict, List, Optional
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from pydantic import BaseModel, Field
-from langchain.utils.math import cosine_similarity
+
+from .cache import InMemoryCache
+from .flat_index import normalize_rows
+from .utils import embed_queries
 
 class DynamicRouteQuery(BaseModel):
     datasource: str = Field(
@@ -71,32 +77,235 @@ class QueryRouter:
 
 
 
+class TieredQueryRouter(QueryRouter):
+    """``QueryRouter`` that only calls the LLM when a cheap first stage is unsure.
+
+    A query is first matched against per-datasource keyword rules, then scored
+    against an embedding centroid per datasource built from example queries.
+    The first stage that picks a datasource with a clear margin over the
+    runner-up wins; everything else goes to the structured-output LLM.
+    """
+
+    def __init__(
+        self,
+        model,
+        datasources: List[str],
+        routing_logic: str = "Based on the context and keywords, choose the most relevant datasource.",
+        keywords: Optional[Dict[str, List[str]]] = None,
+        examples: Optional[Dict[str, List[str]]] = None,
+        embeddings_model=None,
+        keyword_margin: int = 1,
+        min_margin: float = 0.1,
+        min_similarity: float = 0.0,
+        max_concurrency: Optional[int] = None,
+    ):
+        """
+        Args:
+            model : The LLM model used for uncertain queries.
+            datasources (List[str]): List of datasources for routing.
+            routing_logic (str): System prompt describing the routing logic.
+            keywords (Dict[str, List[str]], optional): Keywords (case-insensitive, whole words) per datasource.
+            examples (Dict[str, List[str]], optional): Example queries per datasource, averaged into centroids.
+            embeddings_model (optional): Embeds the examples and incoming queries; required with ``examples``.
+            keyword_margin (int): Keyword matches the best datasource needs over the runner-up.
+            min_margin (float): Cosine similarity the best centroid needs over the runner-up.
+            min_similarity (float): Minimum cosine similarity to the best centroid.
+            max_concurrency (int, optional): Maximum number of questions embedded at once.
+        """
+        super().__init__(model, datasources, routing_logic)
+        for mapping in (keywords or {}, examples or {}):
+            unknown = set(mapping) - set(datasources)
+            if unknown:
+                raise ValueError(f"Unknown datasources: {', '.join(sorted(unknown))}")
+        if examples and embeddings_model is None:
+            raise ValueError("embeddings_model is required to route on examples")
+
+        self.keyword_margin = keyword_margin
+        self.min_margin = min_margin
+        self.min_similarity = min_similarity
+        self.max_concurrency = max_concurrency
+        self.embeddings = embeddings_model
+        self.keyword_patterns = {
+            datasource: [re.compile(rf"\b{re.escape(word)}\b", re.IGNORECASE) for word in words]
+            for datasource, words in (keywords or {}).items()
+        }
+
+        self.centroid_datasources: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        if examples:
+            self.centroid_datasources = [datasource for datasource in examples if examples[datasource]]
+            texts = [text for datasource in self.centroid_datasources for text in examples[datasource]]
+            vectors = normalize_rows(embeddings_model.embed_documents(texts))
+            bounds = np.cumsum([0] + [len(examples[datasource]) for datasource in self.centroid_datasources])
+            self.centroids = normalize_rows([vectors[start:end].mean(axis=0)
+                                             for start, end in zip(bounds[:-1], bounds[1:])])
+
+        self.keyword_routes = 0
+        self.embedding_routes = 0
+        self.llm_routes = 0
+        self._lock = threading.Lock()
+
+    def route(self, question: str) -> str:
+        """Route a question, calling the LLM only if the fast path is not confident."""
+        return self.route_batch([question])[0]
+
+    def route_batch(self, questions: List[str]) -> List[str]:
+        """
+        Route many questions: keywords first, then query embeddings against the
+        centroids for the rest, then one ``batch`` LLM call for whatever is still uncertain.
+        """
+        routes: List[Optional[str]] = [self.keyword_route(question) for question in questions]
+        keyword_routes = sum(route is not None for route in routes)
+
+        pending = [i for i, route in enumerate(routes) if route is None]
+        embedding_routes = 0
+        if pending and self.centroids is not None:
+            for i, route in zip(pending, self.embedding_routes_for([questions[i] for i in pending])):
+                routes[i] = route
+                embedding_routes += route is not None
+
+        pending = [i for i, route in enumerate(routes) if route is None]
+        if pending:
+            results = self.router.batch([{"question": questions[i]} for i in pending])
+            for i, result in zip(pending, results):
+                routes[i] = result.datasource
+
+        with self._lock:
+            self.keyword_routes += keyword_routes
+            self.embedding_routes += embedding_routes
+            self.llm_routes += len(pending)
+        return routes
+
+    def keyword_route(self, question: str) -> Optional[str]:
+        """Datasource whose keywords match clearly more often than any other's, if any."""
+        if not self.keyword_patterns:
+            return None
+        counts = sorted(
+            ((sum(bool(pattern.search(question)) for pattern in patterns), datasource)
+             for datasource, patterns in self.keyword_patterns.items()),
+            reverse=True,
+        )
+        best, datasource = counts[0]
+        runner_up = counts[1][0] if len(counts) > 1 else 0
+        if best > 0 and best - runner_up >= self.keyword_margin:
+            return datasource
+        return None
+
+    def embedding_routes_for(self, questions: List[str]) -> List[Optional[str]]:
+        """Closest centroid per question, or ``None`` where the margin is too small.
+
+        Each distinct question is embedded once, the calls running concurrently.
+        """
+        if self.centroids is None or not questions:
+            return [None for _ in questions]
+        distinct = list(dict.fromkeys(questions))
+        vectors = dict(zip(distinct, normalize_rows(embed_queries(self.embeddings, distinct, self.max_concurrency))))
+        scores = np.stack([vectors[question] for question in questions]) @ self.centroids.T
+        if scores.shape[1] == 1:
+            margins = scores[:, 0]
+        else:
+            top_two = -np.partition(-scores, 1, axis=1)[:, :2]
+            margins = top_two[:, 0] - top_two[:, 1]
+        best = scores.argmax(axis=1)
+        confident = (margins >= self.min_margin) & (scores.max(axis=1) >= self.min_similarity)
+        return [self.centroid_datasources[b] if ok else None for b, ok in zip(best, confident)]
+
+    @property
+    def fast_path_rate(self) -> float:
+        total = self.keyword_routes + self.embedding_routes + self.llm_routes
+        return (self.keyword_routes + self.embedding_routes) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "keyword_routes": self.keyword_routes,
+            "embedding_routes": self.embedding_routes,
+            "llm_routes": self.llm_routes,
+            "fast_path_rate": self.fast_path_rate,
+        }
+
+
 class EmbedRouter:
-    """Route queries to templates/prompts using embedding-based similarity."""
+    """Route queries to templates/prompts using embedding-based similarity.
+
+    Template embeddings are kept as one L2-normalised matrix. Routing a batch
+    of queries embeds each distinct uncached query once, the ``embed_query``
+    calls running concurrently, then scores them all with a single matrix
+    product. Query embeddings are kept in an LRU cache.
+    """
     
-    def __init__(self, embeddings_model, templates: List[str]):
+    def __init__(self, embeddings_model, templates: List[str], query_cache_size: int = 4096,
+                 max_concurrency: Optional[int] = None):
         """
         Initialize with a list of templates and an embedding model.
 
         Args:
             templates (List[str]): List of templates for routing.
             embeddings_model : Model for embedding similarity.
+            query_cache_size (int): Query embeddings kept in the LRU cache, ``0`` disables it.
+            max_concurrency (int, optional): Maximum number of queries embedded at once.
         """
-        self.templates = templates
+        self.templates = list(templates)
         self.embeddings = embeddings_model
-        self.template_embeddings = self.embeddings.embed_documents(self.templates)
+        self.template_embeddings = normalize_rows(self.embeddings.embed_documents(self.templates)) \
+            if self.templates else None
+        self.query_cache = InMemoryCache(query_cache_size) if query_cache_size else None
+        self.max_concurrency = max_concurrency
+        self._prompts: Dict[str, PromptTemplate] = {}
 
     def get_most_similar_template(self, query: str) -> str:
-        query_embedding = self.embeddings.embed_query(query)
-        similarity = cosine_similarity([query_embedding], self.template_embeddings)[0]
-        return self.templates[similarity.argmax()]
+        return self.get_most_similar_templates([query])[0]
+
+    def get_most_similar_templates(self, queries: List[str]) -> List[str]:
+        if self.template_embeddings is None:
+            raise ValueError("EmbedRouter has no templates to route to")
+        if not queries:
+            return []
+        similarity = self._embed_queries(queries) @ self.template_embeddings.T
+        return [self.templates[i] for i in similarity.argmax(axis=1)]
 
     def add_template(self, new_template: str):
 
+        embedding = normalize_rows(self.embeddings.embed_documents([new_template]))
         self.templates.append(new_template)
-        self.template_embeddings = self.embeddings.embed_documents(self.templates)
+        self.template_embeddings = embedding if self.template_embeddings is None \
+            else np.vstack([self.template_embeddings, embedding])
+
+    def remove_template(self, template: str):
+
+        i = self.templates.index(template)
+        del self.templates[i]
+        self.template_embeddings = np.delete(self.template_embeddings, i, axis=0) if self.templates else None
+        self._prompts.pop(template, None)
 
     def route_query(self, query: str) -> PromptTemplate:
 
         most_similar_template = self.get_most_similar_template(query)
-        return PromptTemplate.from_template(most_similar_template)
\ No newline at end of file
+        return self._prompt(most_similar_template)
+
+    def route_queries(self, queries: List[str]) -> List[PromptTemplate]:
+        """Route a batch of queries with one matrix multiply, embedding the distinct queries concurrently."""
+        return [self._prompt(template) for template in self.get_most_similar_templates(queries)]
+
+    def _prompt(self, template: str) -> PromptTemplate:
+        prompt = self._prompts.get(template)
+        if prompt is None:
+            prompt = self._prompts[template] = PromptTemplate.from_template(template)
+        return prompt
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Normalised embeddings of ``queries``, embedding each distinct uncached query once, concurrently."""
+        cached = {}
+        if self.query_cache is not None:
+            for query in queries:
+                vector = self.query_cache.get(query)
+                if vector is not None:
+                    cached[query] = vector
+
+        missing = list(dict.fromkeys(query for query in queries if query not in cached))
+        if missing:
+            for query, vector in zip(missing, normalize_rows(embed_queries(self.embeddings, missing, self.max_concurrency))):
+                cached[query] = vector
+                if self.query_cache is not None:
+                    self.query_cache.set(query, vector)
+
+        return np.stack([cached[query] for query in queries])
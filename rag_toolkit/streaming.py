@@ -0,0 +1,86 @@
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterator, Optional, Union
+
+
+@dataclass
+class ProgressEvent:
+    """Intermediate stage of a multi-stage generator, emitted before the answer tokens."""
+    stage: str
+    message: str
+    data: dict = field(default_factory=dict)
+
+
+class _StreamTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.time_to_first_token: Optional[float] = None
+        self.total_time: Optional[float] = None
+        self.chunks = []
+
+    def _record(self, chunk):
+        if isinstance(chunk, str):
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - self.started
+            self.chunks.append(chunk)
+
+    def _finish(self):
+        if self.total_time is None:
+            self.total_time = time.perf_counter() - self.started
+
+    @property
+    def text(self) -> str:
+        """The answer streamed so far."""
+        return "".join(self.chunks)
+
+    @property
+    def done(self) -> bool:
+        return self.total_time is not None
+
+    def timings(self) -> dict:
+        return {"time_to_first_token": self.time_to_first_token, "total_time": self.total_time}
+
+
+class TokenStream(_StreamTimings):
+    """Iterator over answer tokens (and ``ProgressEvent``s, if requested) that records its timings.
+
+    ``time_to_first_token`` and ``total_time`` are measured in seconds from
+    the creation of the stream and are set once the first token has been
+    yielded and the stream is exhausted, respectively.
+    """
+
+    def __init__(self, chunks: Iterator[Union[str, ProgressEvent]]):
+        super().__init__()
+        self._chunks = iter(chunks)
+
+    def __iter__(self) -> "TokenStream":
+        return self
+
+    def __next__(self) -> Union[str, ProgressEvent]:
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._finish()
+            raise
+        self._record(chunk)
+        return chunk
+
+
+class AsyncTokenStream(_StreamTimings):
+    """Async counterpart of ``TokenStream``."""
+
+    def __init__(self, chunks: AsyncIterator[Union[str, ProgressEvent]]):
+        super().__init__()
+        self._chunks = chunks.__aiter__()
+
+    def __aiter__(self) -> "AsyncTokenStream":
+        return self
+
+    async def __anext__(self) -> Union[str, ProgressEvent]:
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._finish()
+            raise
+        self._record(chunk)
+        return chunk
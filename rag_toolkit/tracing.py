@@ -0,0 +1,429 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+# Names given to pipeline stages that are langchain runs (see ``with_config(run_name=...)``).
+QUERY_GENERATION = "query_generation"
+CONTEXT_PACKING = "context_packing"
+_CHAIN_STAGES = {QUERY_GENERATION: QUERY_GENERATION, CONTEXT_PACKING: CONTEXT_PACKING, "StrOutputParser": "parsing"}
+
+
+@dataclass
+class Span:
+    span_id: int
+    name: str
+    stage: str
+    parent_id: Optional[int] = None
+    start_ms: float = 0.0
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class Trace:
+    """Everything recorded for one request: spans and per-request counters.
+
+    Counters include ``llm_calls``, ``prompt_tokens``, ``completion_tokens``,
+    ``embedding_calls``, ``embedded_texts``, ``retriever_calls``,
+    ``documents_retrieved`` and ``<cache>_hits``/``<cache>_misses``.
+    """
+    query: Any
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: float = field(default_factory=time.time)
+    duration_ms: Optional[float] = None
+    spans: List[Span] = field(default_factory=list)
+    counters: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def stage_durations(self) -> Dict[str, float]:
+        """Total milliseconds spent per stage; nested stages are included in their parents."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.duration_ms is not None:
+                totals[span.stage] = totals.get(span.stage, 0.0) + span.duration_ms
+        return totals
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["query"] = self.query if isinstance(self.query, (str, int, float, type(None))) else repr(self.query)
+        data["stage_durations"] = self.stage_durations()
+        return data
+
+
+class TraceExporter(ABC):
+    @abstractmethod
+    def export(self, trace: Trace):
+        pass
+
+
+class InMemoryExporter(TraceExporter):
+    """Keeps the last ``max_traces`` traces in ``traces``."""
+
+    def __init__(self, max_traces: int = 1000):
+        self.max_traces = max_traces
+        self.traces: List[Trace] = []
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        with self._lock:
+            self.traces.append(trace)
+            del self.traces[:-self.max_traces]
+
+
+class LoggingExporter(TraceExporter):
+    """Logs a one-line summary of every trace."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger("rag_toolkit.tracing")
+        self.level = level
+
+    def export(self, trace: Trace):
+        stages = ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in sorted(trace.stage_durations().items()))
+        counters = ", ".join(f"{name}={value}" for name, value in sorted(trace.counters.items()))
+        self.logger.log(self.level, "trace %s %.1fms [%s] [%s]%s", trace.trace_id, trace.duration_ms or 0.0,
+                        stages, counters, f" error={trace.error}" if trace.error else "")
+
+
+class JsonLinesExporter(TraceExporter):
+    """Appends every trace as one JSON object per line to ``path``."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        line = json.dumps(trace.to_dict(), default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class TraceHandler(BaseCallbackHandler):
+    """Callback handler collecting the spans and counters of one request."""
+
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        # run id -> (span or None, id of the closest enclosing span, enclosing stage)
+        self._runs: Dict[UUID, tuple] = {}
+        self._current: ContextVar[Optional[Span]] = ContextVar(f"rag_toolkit_span_{trace.trace_id}", default=None)
+
+    # ------------------------------------------------------------------ #
+    # Spans and counters
+    # ------------------------------------------------------------------ #
+    def count(self, counter: str, n: int = 1):
+        with self._lock:
+            self.trace.counters[counter] = self.trace.counters.get(counter, 0) + n
+
+    def start_span(self, name: str, stage: str, parent_id: Optional[int] = None, **attributes) -> Span:
+        with self._lock:
+            span = Span(len(self.trace.spans), name, stage, parent_id,
+                        1000 * (time.perf_counter() - self._origin), attributes=attributes)
+            self.trace.spans.append(span)
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.duration_ms = 1000 * (time.perf_counter() - self._origin) - span.start_ms
+        if error is not None:
+            span.error = repr(error)
+
+    @contextmanager
+    def span(self, name: str, stage: str, **attributes):
+        parent = self._current.get()
+        span = self.start_span(name, stage, parent.span_id if parent else None, **attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        finally:
+            self._current.reset(token)
+            if span.duration_ms is None:
+                self.end_span(span)
+
+    def _enclosing(self, parent_run_id: Optional[UUID]):
+        if parent_run_id is not None and parent_run_id in self._runs:
+            span, parent_id, stage = self._runs[parent_run_id]
+            return (span.span_id, span.stage) if span is not None else (parent_id, stage)
+        current = self._current.get()
+        return (current.span_id, current.stage) if current is not None else (None, None)
+
+    def _start_run(self, run_id: UUID, parent_run_id: Optional[UUID], name: Optional[str],
+                   stage: Optional[str], **attributes) -> Optional[Span]:
+        parent_id, parent_stage = self._enclosing(parent_run_id)
+        span = self.start_span(name, stage, parent_id, **attributes) if stage is not None else None
+        self._runs[run_id] = (span, parent_id, parent_stage)
+        return span
+
+    def _end_run(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        span, _, _ = self._runs.pop(run_id, (None, None, None))
+        if span is not None:
+            self.end_span(span, error)
+        return span
+
+    # ------------------------------------------------------------------ #
+    # Langchain callbacks
+    # ------------------------------------------------------------------ #
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        self._start_run(run_id, parent_run_id, name, _CHAIN_STAGES.get(name))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_run(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_run(run_id, error)
+
+    def _on_model_start(self, serialized, run_id, parent_run_id, kwargs):
+        _, enclosing_stage = self._enclosing(parent_run_id)
+        name = kwargs.get("name") or (serialized or {}).get("name") or "llm"
+        purpose = QUERY_GENERATION if enclosing_stage == QUERY_GENERATION else "generation"
+        self._start_run(run_id, parent_run_id, name, "llm", purpose=purpose)
+        self.count("llm_calls")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._on_model_start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._on_model_start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._end_run(run_id)
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens or completion_tokens:
+            self.count("prompt_tokens", prompt_tokens)
+            self.count("completion_tokens", completion_tokens)
+            if span is not None:
+                span.attributes.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end_run(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "retriever"
+        self._start_run(run_id, parent_run_id, name, "retrieval")
+        self.count("retriever_calls")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        span = self._end_run(run_id)
+        self.count("documents_retrieved", len(documents))
+        if span is not None:
+            span.attributes["documents"] = len(documents)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end_run(run_id, error)
+
+
+def _token_usage(response) -> tuple:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                prompt_tokens += metadata.get("input_tokens", 0)
+                completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+_active_handler: ContextVar[Optional[TraceHandler]] = ContextVar("rag_toolkit_trace", default=None)
+_hook_registered = False
+_hook_lock = threading.Lock()
+
+
+def _register_hook():
+    """While a request is traced, have langchain add its handler to every run started in that context.
+
+    Registered by the first ``Tracer`` rather than at import, as langchain's tracer
+    machinery is slow to import.
+    """
+    global _hook_registered
+    with _hook_lock:
+        if not _hook_registered:
+            from langchain_core.tracers.context import register_configure_hook
+            register_configure_hook(_active_handler, inheritable=True)
+            _hook_registered = True
+
+
+def current_trace() -> Optional[Trace]:
+    handler = _active_handler.get()
+    return handler.trace if handler is not None else None
+
+
+def record(counter: str, n: int = 1):
+    """Add ``n`` to a counter of the current trace; a no-op when nothing is traced."""
+    handler = _active_handler.get()
+    if handler is not None:
+        handler.count(counter, n)
+
+
+@contextmanager
+def span(name: str, stage: str, **attributes):
+    """Time a block as a span of the current trace; a no-op when nothing is traced."""
+    handler = _active_handler.get()
+    if handler is None:
+        yield None
+        return
+    with handler.span(name, stage, **attributes) as current:
+        yield current
+
+
+class Tracer:
+    """Traces requests and hands the finished ``Trace`` to its exporters.
+
+    Tracing is scoped to the request being traced; everything else pays a
+    single context-variable lookup.
+    """
+
+    def __init__(self, exporters: Optional[Iterable[TraceExporter]] = None):
+        """
+        Args:
+            exporters (Iterable[TraceExporter], optional): Defaults to one ``InMemoryExporter``.
+        """
+        self.exporters = list(exporters) if exporters is not None else [InMemoryExporter()]
+        _register_hook()
+
+    @contextmanager
+    def trace(self, query, name: str = "pipeline"):
+        """Trace the block as one request; yields the ``Trace`` being recorded."""
+        handler = TraceHandler(Trace(query=query))
+        token = _active_handler.set(handler)
+        try:
+            with handler.span(name, "pipeline"):
+                yield handler.trace
+        except BaseException as e:
+            handler.trace.error = repr(e)
+            raise
+        finally:
+            _active_handler.reset(token)
+            self._finish(handler)
+
+    def trace_iter(self, query, make_iterator, name: str = "pipeline"):
+        """Trace a streamed request; the context is only active while the stream is advanced."""
+        handler = TraceHandler(Trace(query=query))
+        root = handler.start_span(name, "pipeline")
+        iterator = None
+        try:
+            while True:
+                token = _active_handler.set(handler)
+                span_token = handler._current.set(root)
+                try:
+                    if iterator is None:
+                        iterator = iter(make_iterator())
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    handler._current.reset(span_token)
+                    _active_handler.reset(token)
+                yield chunk
+        except BaseException as e:
+            handler.trace.error = repr(e)
+            raise
+        finally:
+            handler.end_span(root)
+            self._finish(handler)
+
+    async def atrace_iter(self, query, make_iterator, name: str = "pipeline"):
+        """Async counterpart of ``trace_iter`` for async iterators."""
+        handler = TraceHandler(Trace(query=query))
+        root = handler.start_span(name, "pipeline")
+        iterator = None
+        try:
+            while True:
+                token = _active_handler.set(handler)
+                span_token = handler._current.set(root)
+                try:
+                    if iterator is None:
+                        iterator = make_iterator().__aiter__()
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    handler._current.reset(span_token)
+                    _active_handler.reset(token)
+                yield chunk
+        except BaseException as e:
+            handler.trace.error = repr(e)
+            raise
+        finally:
+            handler.end_span(root)
+            self._finish(handler)
+
+    def _finish(self, handler: TraceHandler):
+        root = handler.trace.spans[0] if handler.trace.spans else None
+        handler.trace.duration_ms = root.duration_ms if root is not None else None
+        for exporter in self.exporters:
+            exporter.export(handler.trace)
+
+
+class TracedEmbeddings(Embeddings):
+    """Embeddings wrapper that reports calls and timings to the current trace."""
+
+    def __init__(self, embeddings_model):
+        self.embeddings_model = embeddings_model
+
+    def __getattr__(self, name):
+        if name == "embeddings_model":
+            raise AttributeError(name)
+        return getattr(self.embeddings_model, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        handler = _active_handler.get()
+        if handler is None:
+            return self.embeddings_model.embed_documents(texts)
+        handler.count("embedding_calls")
+        handler.count("embedded_texts", len(texts))
+        with handler.span("embed_documents", "embedding", texts=len(texts)):
+            return self.embeddings_model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        handler = _active_handler.get()
+        if handler is None:
+            return self.embeddings_model.embed_query(text)
+        handler.count("embedding_calls")
+        handler.count("embedded_texts")
+        with handler.span("embed_query", "embedding"):
+            return self.embeddings_model.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        handler = _active_handler.get()
+        if handler is None:
+            return await self.embeddings_model.aembed_documents(texts)
+        handler.count("embedding_calls")
+        handler.count("embedded_texts", len(texts))
+        with handler.span("embed_documents", "embedding", texts=len(texts)):
+            return await self.embeddings_model.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        handler = _active_handler.get()
+        if handler is None:
+            return await self.embeddings_model.aembed_query(text)
+        handler.count("embedding_calls")
+        handler.count("embedded_texts")
+        with handler.span("embed_query", "embedding"):
+            return await self.embeddings_model.aembed_query(text)
+
+
+def traced_embeddings(embeddings_model) -> Embeddings:
+    if isinstance(embeddings_model, TracedEmbeddings):
+        return embeddings_model
+    return TracedEmbeddings(embeddings_model)
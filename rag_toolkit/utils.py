@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import json
+from typing import Iterable, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.runnables.config import get_executor_for_config
+
+DOC_ID_KEY = "doc_id"
+
+
+def stable_hash(*parts: str, digest_size: int = 16) -> str:
+    """Return a stable hex digest of the given string parts.
+
+    Unlike the builtin ``hash`` the result does not change between processes,
+    so it can be persisted and used as a content address.
+    """
+    hasher = hashlib.blake2b(digest_size=digest_size)
+    for part in parts:
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+
+def model_name(model) -> str:
+    """Best-effort identifier of an LLM or embeddings model, used to namespace cache keys."""
+    for attr in ("model", "model_name", "model_id"):
+        name = getattr(model, attr, None)
+        if isinstance(name, str) and name:
+            return name
+    return type(model).__name__
+
+
+def metadata_hash(metadata: dict) -> str:
+    """Stable hash of a metadata dict, independent of key order and of any assigned document id."""
+    if DOC_ID_KEY in metadata:
+        metadata = {key: value for key, value in metadata.items() if key != DOC_ID_KEY}
+    return stable_hash(json.dumps(metadata, sort_keys=True, default=str))
+
+
+def content_hash(document) -> str:
+    """Stable hash of a document's content and metadata."""
+    return stable_hash(document.page_content, metadata_hash(document.metadata))
+
+
+def document_id(document) -> str:
+    """Cheap identity of a document, used to deduplicate and fuse retrieval results.
+
+    Documents indexed through ``rag_toolkit.vector_store`` carry a precomputed id
+    in ``metadata["doc_id"]``; for anything else the id falls back to the
+    document's own ``id`` or a hash of its content and metadata.
+    """
+    doc_id = document.metadata.get(DOC_ID_KEY) or getattr(document, "id", None)
+    return doc_id or content_hash(document)
+
+
+def embed_queries(embeddings, queries: Iterable[str], max_concurrency: Optional[int] = None) -> List[List[float]]:
+    """Embed ``queries`` with ``embed_query``, the calls running concurrently on a thread pool.
+
+    ``embed_documents`` is not a batched ``embed_query``: some models embed
+    queries differently from documents (e.g. a retrieval-query task type), and
+    an ``EmbeddingCache`` would store the queries among the documents. The pool
+    is the one ``Runnable.batch`` uses, bounded by ``max_concurrency``.
+    """
+    queries = list(queries)
+    if len(queries) <= 1 or max_concurrency == 1:
+        return [embeddings.embed_query(query) for query in queries]
+    with get_executor_for_config({"max_concurrency": max_concurrency}) as executor:
+        return list(executor.map(embeddings.embed_query, queries))
+
+
+async def aembed_queries(embeddings, queries: Iterable[str]) -> List[List[float]]:
+    """Async ``embed_queries``; the ``aembed_query`` calls run concurrently."""
+    return list(await asyncio.gather(*(embeddings.aembed_query(query) for query in queries)))
+
+
+def assign_document_ids(documents: Iterable, ids: Optional[Iterable[str]] = None) -> List[Document]:
+    """Return ``documents`` with ``metadata["doc_id"]`` set on every one of them.
+
+    An explicit id from ``ids`` always wins over a ``doc_id`` the document
+    already carries. Without one the document keeps its ``doc_id``, or gets its
+    content hash, so identical chunks share an id. The caller's documents are
+    never modified: documents whose id changes are returned as copies.
+    """
+    stamped = []
+    ids = iter(ids) if ids is not None else None
+    for document in documents:
+        doc_id = next(ids) if ids is not None else None
+        doc_id = doc_id or document.metadata.get(DOC_ID_KEY) or content_hash(document)
+        if document.metadata.get(DOC_ID_KEY) != doc_id:
+            document = Document(id=document.id, page_content=document.page_content,
+                                metadata={**document.metadata, DOC_ID_KEY: doc_id})
+        stamped.append(document)
+    return stamped
@@ -1,10 +1,563 @@
-from langchain_community.vectorstores import Chroma
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from langchain_core.documents import Document
 
-def create_vector_store(documents,embeddings_model):
-    return Chroma.from_documents(documents=documents, embedding=embeddings_model)
+from .chunk_store import ChunkStore
+from .embedding_cache import EmbeddingCache
+from .flat_index import FlatVectorIndex
+from .tracing import traced_embeddings
+from .utils import DOC_ID_KEY, assign_document_ids, content_hash, model_name, stable_hash
 
+def _chroma():
+    # Imported on first use: chromadb takes about a second to import.
+    from langchain_community.vectorstores import Chroma
+    return Chroma
 
-def create_vector_store_retriever(documents, embeddings_model,k=2):
-    vectorstore = Chroma.from_documents(documents=documents, embedding=embeddings_model)
+
+def _chroma_collection(embeddings_model, collection_name: str, persist_directory: Optional[str] = None):
+    """Return a Chroma vector store and the chromadb collection behind it.
+
+    The client is created here so that pre-computed embeddings can be written
+    with the collection's public ``upsert`` instead of re-embedding them.
+    """
+    import chromadb
+
+    if persist_directory is None:
+        client = chromadb.EphemeralClient()
+    else:
+        client = chromadb.PersistentClient(path=persist_directory)
+    vectorstore = _chroma()(collection_name=collection_name, embedding_function=embeddings_model, client=client)
+    return vectorstore, client.get_collection(collection_name, embedding_function=None)
+
+
+def _with_cache(embeddings_model, cache_dir=None):
+    """Trace the model's real API calls and put the on-disk cache, if any, in front of them."""
+    if isinstance(embeddings_model, EmbeddingCache):
+        return embeddings_model
+    traced = traced_embeddings(embeddings_model)
+    if cache_dir is None:
+        return traced
+    return EmbeddingCache(traced, cache_dir=cache_dir, namespace=model_name(embeddings_model))
+
+
+def create_vector_store(documents,embeddings_model, cache_dir=None, ingestor=None, backend="chroma",
+                        quantization=None):
+    """
+    Embed ``documents`` into a new vector store.
+
+    Args:
+        documents (List[Document] or ChunkStore): Documents to index. The flat backend
+            keeps the chunks of a ``ChunkStore`` in the store itself.
+        embeddings_model : Embeddings model for documents and queries.
+        cache_dir (str, optional): Directory of an on-disk embedding cache.
+        ingestor (EmbeddingIngestor, optional): Embed in concurrent, rate-limited batches.
+        backend (str): ``"chroma"`` or ``"flat"`` (in-process NumPy index).
+        quantization (str, optional): ``"int8"`` to keep only compact vectors in
+            memory and the float32 vectors memory-mapped on disk; flat backend only.
+    """
+    if quantization is not None and backend != "flat":
+        raise ValueError("Quantization is only supported by the flat backend")
+    embeddings_model = _with_cache(embeddings_model, cache_dir)
+    if isinstance(documents, ChunkStore):
+        if backend == "flat":
+            return FlatVectorIndex.from_chunk_store(documents, embeddings_model, ingestor=ingestor,
+                                                    quantization=quantization)
+        documents = documents.iter_documents()
+    if ingestor is None:
+        documents = assign_document_ids(documents)
+
+    if backend == "flat":
+        vectorstore = FlatVectorIndex(embeddings_model, quantization=quantization)
+        sink = vectorstore.add_embeddings
+    elif backend == "chroma":
+        if ingestor is None:
+            return _chroma().from_documents(documents=documents, embedding=embeddings_model)
+        vectorstore, collection = _chroma_collection(embeddings_model, f"rag_toolkit-{uuid.uuid4().hex}")
+        sink = chroma_sink(collection)
+    else:
+        raise ValueError("Unsupported backend. Supported backends: chroma, flat")
+
+    if ingestor is None:
+        vectorstore.add_documents(documents)
+    else:
+        # a new in-memory store has none of the batches an old checkpoint recorded
+        ingestor.ingest(documents, embeddings_model, sink=sink, resume=False)
+    return vectorstore
+
+
+def create_vector_store_retriever(documents, embeddings_model,k=2, cache_dir=None, ingestor=None, backend="chroma",
+                                  quantization=None):
+    vectorstore = create_vector_store(documents, embeddings_model, cache_dir=cache_dir,
+                                      ingestor=ingestor, backend=backend, quantization=quantization)
     return vectorstore.as_retriever(search_kwargs={"k": k})
+
+
+def create_hybrid_retriever(documents, embeddings_model, k=2, fetch_k=10, cache_dir=None, ingestor=None,
+                            backend="chroma", quantization=None):
+    """
+    Retriever fusing BM25 keyword search and vector search over the same ``documents``.
+
+    Args:
+        documents (List[Document] or ChunkStore): Documents to index.
+        embeddings_model : Embeddings model for documents and queries.
+        k (int): Number of fused documents returned.
+        fetch_k (int): Candidates taken from each of the two searches before fusion.
+        cache_dir (str, optional): Directory of an on-disk embedding cache.
+        ingestor (EmbeddingIngestor, optional): Embed in concurrent, rate-limited batches.
+        backend (str): ``"chroma"`` or ``"flat"``.
+        quantization (str, optional): ``"int8"``, see ``create_vector_store``.
+    """
+    from .lexical_index import BM25Index, HybridRetriever
+
+    if not isinstance(documents, ChunkStore):
+        # stamped up front so the vector store and the BM25 index share the document ids
+        documents = assign_document_ids(documents)
+    vectorstore = create_vector_store(documents, embeddings_model, cache_dir=cache_dir,
+                                      ingestor=ingestor, backend=backend, quantization=quantization)
+    if isinstance(documents, ChunkStore):
+        documents = documents.iter_documents()
+    return HybridRetriever(index=BM25Index.from_documents(documents),
+                           vector_retriever=vectorstore.as_retriever(search_kwargs={"k": fetch_k}),
+                           k=k, fetch_k=fetch_k)
+
+
+def document_keys(documents: Iterable[Document]) -> List[Tuple[str, str]]:
+    """Return a ``(document id, content hash)`` pair for every document.
+
+    The id is the document's own id (``metadata["doc_id"]`` or ``Document.id``)
+    when it has one, so the chunk keeps its id when its text is edited.
+    Otherwise it is the content hash, so inserting or reordering rows does not
+    change the ids of the others. Exact duplicates are told apart by a suffix.
+    """
+    seen: Dict[str, int] = {}
+    keys = []
+    for document in documents:
+        doc_hash = content_hash(document)
+        base = document.metadata.get(DOC_ID_KEY) or getattr(document, "id", None) or doc_hash
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        keys.append((f"{base}-{occurrence}" if occurrence else base, doc_hash))
+    return keys
+
+
+@dataclass
+class SyncResult:
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> int:
+        return len(self.added) + len(self.updated) + len(self.removed)
+
+
+class IncrementalVectorStore:
+    """Persistent Chroma collection that is kept in sync with a corpus incrementally.
+
+    A manifest of ``document id -> content hash`` is stored next to the Chroma
+    files. ``sync`` compares a fresh batch of documents against it and only
+    embeds and upserts the chunks that were added or changed, and deletes the
+    ones that disappeared, so refresh time scales with the size of the change.
+
+    ``version`` counts the changes and is also set on ``vectorstore``, so
+    retrievers from ``as_retriever`` expose it to ``RagPipeline``'s answer cache.
+    """
+
+    MANIFEST_FILE = "rag_toolkit_manifest.json"
+
+    def __init__(self,
+                 persist_directory: str,
+                 embeddings_model,
+                 collection_name: str = "rag_toolkit",
+                 cache_dir: Optional[str] = None,
+                 batch_size: int = 1000,
+                 ingestor: Optional["EmbeddingIngestor"] = None):
+        """
+        Open (or create) a persistent vector store.
+
+        Args:
+            persist_directory (str): Directory holding the Chroma collection and manifest.
+            embeddings_model : Model used to embed new and changed chunks.
+            collection_name (str): Name of the Chroma collection.
+            cache_dir (str, optional): Directory of an on-disk embedding cache.
+            batch_size (int): Maximum number of chunks written to Chroma per call.
+            ingestor (EmbeddingIngestor, optional): Embeds the delta in concurrent,
+                rate-limited batches instead of one ``add_documents`` call per batch.
+        """
+        os.makedirs(persist_directory, exist_ok=True)
+        self.persist_directory = persist_directory
+        self.batch_size = batch_size
+        self.ingestor = ingestor
+        self.embeddings_model = _with_cache(embeddings_model, cache_dir)
+        self.vectorstore, self._collection = _chroma_collection(self.embeddings_model, collection_name,
+                                                                persist_directory=persist_directory)
+        self.vectorstore.version = 0
+        self._manifest: Dict[str, str] = {}
+        self._load_manifest()
+
+    @classmethod
+    def open(cls, persist_directory: str, embeddings_model, **kwargs) -> "IncrementalVectorStore":
+        return cls(persist_directory, embeddings_model, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._manifest)
+
+    @property
+    def version(self) -> int:
+        return self.vectorstore.version
+
+    @version.setter
+    def version(self, value: int):
+        self.vectorstore.version = value
+
+    def diff(self, documents: List[Document]) -> Tuple[SyncResult, Dict[str, Document]]:
+        """Work out what ``sync`` would change, without touching the store."""
+        result = SyncResult()
+        to_write: Dict[str, Document] = {}
+        new_manifest = {}
+
+        for document, (doc_id, doc_hash) in zip(documents, document_keys(documents)):
+            new_manifest[doc_id] = doc_hash
+            previous = self._manifest.get(doc_id)
+            if previous == doc_hash:
+                result.unchanged += 1
+                continue
+            (result.added if previous is None else result.updated).append(doc_id)
+            to_write[doc_id] = document
+
+        result.removed = [doc_id for doc_id in self._manifest if doc_id not in new_manifest]
+        return result, to_write
+
+    def sync(self, documents: List[Document]) -> SyncResult:
+        """Make the store contain exactly ``documents``, embedding only the delta."""
+        documents = list(documents)
+        result, to_write = self.diff(documents)
+
+        if result.removed:
+            self._delete(result.removed)
+        if to_write:
+            self._write(to_write)
+
+        if result.changed:
+            self.version += 1
+            self._save_manifest()
+        return result
+
+    def upsert(self, documents: List[Document]) -> SyncResult:
+        """Add or replace ``documents`` without removing anything else."""
+        documents = list(documents)
+        result, to_write = self.diff(documents)
+        result.removed = []
+        if to_write:
+            self._write(to_write)
+            self.version += 1
+            self._save_manifest()
+        return result
+
+    def delete(self, ids: List[str]):
+        ids = [doc_id for doc_id in ids if doc_id in self._manifest]
+        if ids:
+            self._delete(ids)
+            self.version += 1
+            self._save_manifest()
+
+    def as_retriever(self, k: int = 2, **kwargs):
+        return self.vectorstore.as_retriever(search_kwargs={"k": k}, **kwargs)
+
+    def _write(self, documents: Dict[str, Document]):
+        ids = list(documents)
+        docs = assign_document_ids(documents.values(), ids)
+        if self.ingestor is not None:
+            self.ingestor.ingest(docs, self.embeddings_model, sink=chroma_sink(self._collection), ids=ids)
+        else:
+            for start in range(0, len(ids), self.batch_size):
+                self.vectorstore.add_documents(docs[start:start + self.batch_size],
+                                               ids=ids[start:start + self.batch_size])
+        for doc_id, document in documents.items():
+            self._manifest[doc_id] = content_hash(document)
+
+    def _delete(self, ids: List[str]):
+        for start in range(0, len(ids), self.batch_size):
+            self.vectorstore.delete(ids=ids[start:start + self.batch_size])
+        for doc_id in ids:
+            self._manifest.pop(doc_id, None)
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.persist_directory, self.MANIFEST_FILE)
+
+    def _load_manifest(self):
+        path = self._manifest_path()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.version = data.get("version", 0)
+            self._manifest = data.get("documents", {})
+
+    def _save_manifest(self):
+        path = self._manifest_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "documents": self._manifest}, f)
+        os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------------------- #
+# Batched, concurrent ingestion
+# ---------------------------------------------------------------------- #
+EmbeddingSink = Callable[[List[str], List[Document], List[List[float]]], None]
+
+
+def chroma_sink(collection) -> EmbeddingSink:
+    """Write pre-computed embeddings straight into a chromadb collection.
+
+    An id repeated within one batch keeps its last document, as chromadb
+    rejects duplicate ids in a single upsert.
+    """
+    def sink(ids, documents, embeddings):
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep]
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=[document.page_content for document in documents],
+            metadatas=[document.metadata or None for document in documents],
+        )
+    return sink
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float, optional): Maximum burst size, defaults to ``rate``.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity or rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until ``tokens`` tokens are available, then consume them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_for = (tokens - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+class IngestionError(RuntimeError):
+    """Raised when some batches still fail after all retries."""
+
+    def __init__(self, report: "IngestReport"):
+        super().__init__(
+            f"{len(report.failed_batches)} of {report.batches} batches failed to embed; "
+            "completed batches are checkpointed and will be skipped on resume."
+        )
+        self.report = report
+
+
+@dataclass
+class IngestReport:
+    documents: int = 0
+    batches: int = 0
+    skipped_batches: int = 0
+    retries: int = 0
+    failed_batches: List[int] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+class EmbeddingIngestor:
+    """Embed documents in batches on a bounded thread pool.
+
+    Every embeddings call goes through an optional token-bucket rate limiter and
+    is retried with exponential backoff. Finished batches are handed to a sink
+    (e.g. ``chroma_sink``) on the calling thread and recorded in a checkpoint
+    file, so an interrupted ingest can be resumed without re-embedding them.
+    """
+
+    def __init__(self,
+                 batch_size: int = 64,
+                 max_workers: int = 4,
+                 requests_per_second: Optional[float] = None,
+                 burst: Optional[float] = None,
+                 max_retries: int = 3,
+                 backoff: float = 1.0,
+                 max_backoff: float = 30.0,
+                 checkpoint_path: Optional[str] = None,
+                 raise_on_error: bool = True,
+                 verbose: bool = False):
+        """
+        Args:
+            batch_size (int): Number of documents per embeddings call.
+            max_workers (int): Maximum number of concurrent embeddings calls.
+            requests_per_second (float, optional): Rate limit for embeddings calls.
+            burst (float, optional): Token-bucket capacity, defaults to the rate.
+            max_retries (int): Retries per batch before it is reported as failed.
+            backoff (float): Initial backoff in seconds, doubled on every retry.
+            max_backoff (float): Upper bound for a single backoff.
+            checkpoint_path (str, optional): File recording completed batches. Only a sink that
+                persists what it was given (e.g. an ``IncrementalVectorStore``) can resume from it.
+            raise_on_error (bool): Raise ``IngestionError`` if any batch failed.
+            verbose (bool): Print a throughput summary when done.
+        """
+        if batch_size < 1 or max_workers < 1:
+            raise ValueError("batch_size and max_workers must be positive integers")
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.checkpoint_path = checkpoint_path
+        self.raise_on_error = raise_on_error
+        self.verbose = verbose
+
+    def ingest(self,
+               documents: Iterable[Document],
+               embeddings_model,
+               sink: EmbeddingSink,
+               ids: Optional[Iterable[str]] = None,
+               resume: bool = True) -> IngestReport:
+        """
+        Embed ``documents`` and pass every finished batch to ``sink``.
+
+        Args:
+            documents (Iterable[Document]): Documents to embed.
+            embeddings_model : Model whose ``embed_documents`` is called per batch.
+            sink (Callable): Called with ``(ids, documents, embeddings)`` per batch.
+            ids (Iterable[str], optional): Document ids, derived from the content if omitted.
+            resume (bool): Skip the batches recorded in the checkpoint. Pass ``False`` when the
+                sink does not hold them (a new in-memory store); an existing checkpoint is then
+                an error rather than silently dropped documents.
+
+        Returns:
+            IngestReport: Counts, retries, failures and throughput of the run.
+        """
+        report = IngestReport()
+        completed = self._load_checkpoint()
+        if completed and not resume:
+            raise ValueError(f"Cannot resume from checkpoint {self.checkpoint_path!r}: the sink is a new "
+                             "in-memory store without the checkpointed batches. Delete the checkpoint, "
+                             "or ingest into a persistent IncrementalVectorStore to resume.")
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            for batch_no, batch_key, batch_ids, batch_docs in self._batches(documents, ids):
+                report.batches += 1
+                if batch_key in completed:
+                    report.skipped_batches += 1
+                    continue
+                future = executor.submit(self._embed_batch, embeddings_model, batch_docs)
+                pending[future] = (batch_no, batch_key, batch_ids, batch_docs)
+
+                if len(pending) >= 2 * self.max_workers:
+                    self._drain(pending, sink, report, FIRST_COMPLETED)
+            self._drain(pending, sink, report)
+
+        report.seconds = time.perf_counter() - started
+        if not report.failed_batches:
+            self._clear_checkpoint()
+
+        if self.verbose:
+            print(f"Embedded {report.documents} documents in {report.batches} batches "
+                  f"({report.docs_per_second:.1f} docs/s, {report.retries} retries, "
+                  f"{report.skipped_batches} resumed, {len(report.failed_batches)} failed).")
+
+        if report.failed_batches and self.raise_on_error:
+            raise IngestionError(report)
+        return report
+
+    def _batches(self, documents: Iterable[Document], ids: Optional[Iterable[str]]) -> Iterator:
+        documents = iter(documents)
+        ids = iter(ids) if ids is not None else None
+        batch_no, position = 0, 0
+        while True:
+            batch_docs = list(islice(documents, self.batch_size))
+            if not batch_docs:
+                return
+            if ids is not None:
+                batch_ids = list(islice(ids, len(batch_docs)))
+            else:
+                batch_ids = [document.metadata.get(DOC_ID_KEY) or f"{content_hash(document)}-{position + i}"
+                             for i, document in enumerate(batch_docs)]
+            batch_docs = assign_document_ids(batch_docs, batch_ids)
+            yield batch_no, stable_hash(*batch_ids), batch_ids, batch_docs
+            batch_no += 1
+            position += len(batch_docs)
+
+    def _embed_batch(self, embeddings_model, documents: List[Document]) -> Tuple[List[List[float]], int]:
+        texts = [document.page_content for document in documents]
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return embeddings_model.embed_documents(texts), attempt
+            except Exception:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                attempt += 1
+
+    def _drain(self, pending: dict, sink: EmbeddingSink, report: IngestReport, return_when=ALL_COMPLETED):
+        done, _ = wait(list(pending), return_when=return_when)
+        for future in done:
+            batch_no, batch_key, batch_ids, batch_docs = pending.pop(future)
+            try:
+                embeddings, retries = future.result()
+            except Exception as e:
+                report.retries += self.max_retries
+                report.failed_batches.append(batch_no)
+                report.errors.append(f"batch {batch_no}: {e!r}")
+                continue
+            sink(batch_ids, batch_docs, embeddings)
+            report.retries += retries
+            report.documents += len(batch_docs)
+            self._mark_completed(batch_key)
+
+    def _load_checkpoint(self) -> set:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _mark_completed(self, batch_key: str):
+        if self.checkpoint_path:
+            with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+                f.write(batch_key + "\n")
+
+    def _clear_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
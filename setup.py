@@ -18,6 +18,7 @@ setup(
         "langchain-google-genai==2.0.4",
         "pydantic==2.9.2",
         "pypdf==5.1.0",
+        "numpy>=1.22",
     ],
     classifiers=[
         "Programming Language :: Python :: 3",
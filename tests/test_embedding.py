@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from rag_toolkit.embedding_cache import EmbeddingCache
+from rag_toolkit.fakes import FakeEmbeddings
+
+
+# ---------------------------------------------------------------------- #
+# EmbeddingCache
+# ---------------------------------------------------------------------- #
+def test_embedding_cache_hits_skip_the_model(tmp_path):
+    model = FakeEmbeddings(size=8)
+    cache = EmbeddingCache(model, cache_dir=str(tmp_path))
+
+    first = cache.embed_documents(["a", "b", "a"])
+    assert model.texts_embedded == 2
+    second = cache.embed_documents(["b", "a", "c"])
+
+    assert model.texts_embedded == 3
+    assert second[0] == first[1] and second[1] == first[0]
+    assert np.allclose(second[2], model.embed_documents(["c"])[0])
+    assert cache.stats()["entries"] == 3
+
+
+def test_embedding_cache_persists_across_instances(tmp_path):
+    model = FakeEmbeddings(size=8)
+    vectors = EmbeddingCache(model, cache_dir=str(tmp_path)).embed_documents(["a", "b"])
+
+    reopened_model = FakeEmbeddings(size=8)
+    reopened = EmbeddingCache(reopened_model, cache_dir=str(tmp_path))
+
+    assert reopened.embed_documents(["a", "b"]) == vectors
+    assert reopened_model.calls == 0
+    assert reopened.hits == 2
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    model = FakeEmbeddings(size=4)
+    cache = EmbeddingCache(model, cache_dir=str(tmp_path), max_entries=2)
+
+    cache.embed_documents(["a"])
+    cache.embed_documents(["b"])
+    cache.embed_documents(["a"])  # "b" is now the least recently used
+    cache.embed_documents(["c"])
+
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_embedding_cache_namespaces_by_model(tmp_path):
+    EmbeddingCache(FakeEmbeddings(size=4, model="one"), cache_dir=str(tmp_path)).embed_documents(["a"])
+    other = FakeEmbeddings(size=4, model="two")
+    EmbeddingCache(other, cache_dir=str(tmp_path)).embed_documents(["a"])
+    assert other.texts_embedded == 1
+
+
+def test_embedding_cache_queries_are_not_cached_by_default(tmp_path):
+    model = FakeEmbeddings(size=4)
+    cache = EmbeddingCache(model, cache_dir=str(tmp_path))
+    cache.embed_query("q")
+    cache.embed_query("q")
+    assert model.calls == 2 and len(cache) == 0
+
+    cached = EmbeddingCache(model, cache_dir=str(tmp_path / "queries"), cache_queries=True)
+    cached.embed_query("q")
+    cached.embed_query("q")
+    assert model.calls == 3 and cached.hits == 1
+
+
+def test_embedding_cache_rejects_non_positive_size(tmp_path):
+    with pytest.raises(ValueError):
+        EmbeddingCache(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=0)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from pydantic import BaseModel
+
+from rag_toolkit.fakes import FakeChatModel, FakeEmbeddings, FakeModelError
+from rag_toolkit.routing import QueryRouter
+
+
+# ---------------------------------------------------------------------- #
+# FakeEmbeddings
+# ---------------------------------------------------------------------- #
+def test_fake_embeddings_are_deterministic_unit_vectors():
+    model = FakeEmbeddings(size=8)
+    vectors = model.embed_documents(["a", "b", "a"])
+
+    assert vectors[0] == vectors[2] == FakeEmbeddings(size=8).embed_query("a")
+    assert vectors[0] != vectors[1]
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert FakeEmbeddings(size=8, model="other").embed_query("a") != vectors[0]
+    assert model.calls == 1 and model.texts_embedded == 3
+
+
+def test_fake_embeddings_inject_failures_and_latency():
+    model = FakeEmbeddings(error_rate=1.0, latency=0.05)
+    started = time.monotonic()
+    with pytest.raises(FakeModelError):
+        model.embed_query("a")
+    assert time.monotonic() - started >= 0.05
+    assert model.calls == 1 and model.texts_embedded == 0
+
+    model.reset_counters(error_rate=0.0)
+    model.embed_query("a")
+    assert model.calls == 1 and model.texts_embedded == 1
+
+
+# ---------------------------------------------------------------------- #
+# FakeChatModel
+# ---------------------------------------------------------------------- #
+def test_fake_chat_model_replies_deterministically():
+    reply = FakeChatModel(lines=2, words_per_line=4).invoke("Tell me about cells and energy")
+
+    assert reply.content == FakeChatModel(lines=2, words_per_line=4).invoke("Tell me about cells and energy").content
+    assert reply.content != FakeChatModel(lines=2, words_per_line=4).invoke("Something else entirely").content
+    assert [len(line.split()) for line in reply.content.split("\n")] == [4, 4]
+    assert reply.usage_metadata["output_tokens"] == 8
+    assert reply.usage_metadata["input_tokens"] == 6
+
+
+def test_fake_chat_model_streams_the_invoked_reply():
+    model = FakeChatModel()
+    reply = model.invoke("Why is the sky blue?").content
+    chunks = [chunk.content for chunk in model.stream("Why is the sky blue?")]
+
+    async def astream():
+        return [chunk.content async for chunk in model.astream("Why is the sky blue?")]
+
+    assert len(chunks) > 1 and "".join(chunks) == reply
+    assert "".join(asyncio.run(astream())) == reply
+    assert asyncio.run(model.ainvoke("Why is the sky blue?")).content == reply
+    assert model.calls == 4
+
+
+def test_fake_chat_model_injects_failures():
+    model = FakeChatModel(error_rate=1.0)
+    with pytest.raises(FakeModelError):
+        model.invoke("hi")
+    with pytest.raises(FakeModelError):
+        list(model.stream("hi"))
+    assert model.calls == 2
+
+
+def test_fake_chat_model_structured_output():
+    class Answer(BaseModel):
+        label: str
+
+    structured = FakeChatModel(choices=["x", "y"]).with_structured_output(Answer)
+    assert structured.invoke("question").label in {"x", "y"}
+    assert structured.invoke("question") == structured.invoke("question")
+
+    router = QueryRouter(FakeChatModel(choices=["docs", "code"]), ["docs", "code"])
+    assert router.route("Where is the API reference?") in {"docs", "code"}
+
+    with pytest.raises(ValueError):
+        FakeChatModel().with_structured_output({"type": "object"})
@@ -0,0 +1,227 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from rag_toolkit.context import ContextPacker, estimate_tokens
+from rag_toolkit.fakes import FakeChatModel, FakeEmbeddings
+from rag_toolkit.flat_index import FlatVectorIndex
+from rag_toolkit.generator import FusionGenerator, IndividualGenerator, RecursiveGenerator
+from rag_toolkit.retriever import DecomposeRetriever, FusionRetriever
+
+TEXTS = [
+    "The mitochondria is the powerhouse of the cell.",
+    "Photosynthesis turns light into chemical energy.",
+    "Ribosomes assemble proteins from amino acids.",
+    "The nucleus stores the genetic material of the cell.",
+]
+
+
+def _vectorstore(embeddings=None, **kwargs):
+    index = FlatVectorIndex(embeddings or FakeEmbeddings(size=16), **kwargs)
+    index.add_documents([Document(page_content=text) for text in TEXTS], ids=[str(i) for i in range(len(TEXTS))])
+    return index
+
+
+def _decompose(vectorstore=None, **kwargs):
+    vectorstore = vectorstore or _vectorstore()
+    return DecomposeRetriever(FakeChatModel(**kwargs), vectorstore.as_retriever(search_kwargs={"k": 2}))
+
+
+# ---------------------------------------------------------------------- #
+# IndividualGenerator
+# ---------------------------------------------------------------------- #
+def test_individual_timeout_is_one_deadline_for_the_whole_batch():
+    # each sub-question takes 0.2 s, under the 0.3 s timeout, but the batch as a whole does not
+    generator = IndividualGenerator(FakeChatModel(), max_concurrency=1, sub_question_timeout=0.3)
+
+    def answer(sub_question):
+        time.sleep(0.2)
+        return sub_question
+
+    started = time.monotonic()
+    results = generator._answer_concurrently(answer, ["a", "b", "c"])
+
+    assert time.monotonic() - started < 0.45
+    assert results[0] == "a"
+    assert all(isinstance(result, TimeoutError) for result in results[1:])
+
+
+def test_individual_drops_failed_sub_questions():
+    generator = IndividualGenerator(FakeChatModel())
+
+    def answer(sub_question):
+        if sub_question == "bad":
+            raise RuntimeError("boom")
+        return sub_question.upper()
+
+    results = generator._answer_concurrently(answer, ["a", "bad", "c"])
+    assert generator._collect_answers(["a", "bad", "c"], results) == (["A", "C"], ["a", "c"])
+    with pytest.raises(RuntimeError):
+        generator._collect_answers(["bad"], generator._answer_concurrently(answer, ["bad"]))
+
+
+def test_individual_async_timeout_is_one_deadline_for_the_whole_batch():
+    retrieval = _decompose()
+    generator = IndividualGenerator(FakeChatModel(latency=0.2), max_concurrency=1, sub_question_timeout=0.3)
+
+    started = time.monotonic()
+    answers, answered = asyncio.run(generator.agenerate_qa("How do cells make energy?", retrieval))
+
+    assert time.monotonic() - started < 0.55
+    assert len(answers) == len(answered) == 1
+    assert answered[0] == retrieval.generate_queries("How do cells make energy?")[0]
+
+
+# ---------------------------------------------------------------------- #
+# RecursiveGenerator
+# ---------------------------------------------------------------------- #
+class QueryPrefixEmbeddings(FakeEmbeddings):
+    """Embeds queries differently from documents, like models with a query task type."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.documents_embedded = 0
+
+    def embed_documents(self, texts):
+        self.documents_embedded += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        return super().embed_query(f"query: {text}")
+
+
+def test_recursive_prefetch_matches_per_question_retrieval():
+    embeddings = QueryPrefixEmbeddings(size=16)
+    retrieval = _decompose(_vectorstore(embeddings))
+    query = "How do cells make energy?"
+    generator = RecursiveGenerator(FakeChatModel())
+    expected = RecursiveGenerator(FakeChatModel()).build_chain(retrieval)
+
+    embeddings.reset_counters()
+    embeddings.documents_embedded = 0
+    answer = generator.answer(query, retrieval)
+    assert embeddings.calls == 3 and embeddings.documents_embedded == 0
+
+    q_a_pairs = ""
+    for question in retrieval.generate_queries(query):
+        last = expected.invoke({"question": question, "q_a_pairs": q_a_pairs})
+        q_a_pairs += f"\n---\n{generator.format_qa_pair(question, last)}"
+    assert answer == last
+    assert asyncio.run(generator.aanswer(query, retrieval)) == answer
+
+
+@pytest.mark.parametrize("run", [
+    lambda generator, query, retrieval: generator.answer(query, retrieval),
+    lambda generator, query, retrieval: "".join(generator.stream(query, retrieval)),
+    lambda generator, query, retrieval: asyncio.run(generator.aanswer(query, retrieval)),
+], ids=["answer", "stream", "aanswer"])
+def test_recursive_prefetch_embeds_sub_questions_concurrently(run):
+    retrieval = _decompose(_vectorstore(FakeEmbeddings(size=16, latency=0.1)))
+    reports = []
+    generator = RecursiveGenerator(FakeChatModel(), on_report=reports.append)
+
+    run(generator, "How do cells make energy?", retrieval)
+    report = generator.last_report
+    assert reports == [report]
+    assert report.sub_questions == len(report.iterations) == 3
+    assert 0.1 <= report.retrieval_seconds < 0.25  # 0.3 s one sub-question after another
+
+
+def test_recursive_limits_sub_questions():
+    retrieval = _decompose()
+    generator = RecursiveGenerator(FakeChatModel(), max_sub_questions=2)
+    chunks = list(generator.stream("How do cells make energy?", retrieval, progress=True))
+
+    assert [chunk.stage for chunk in chunks if not isinstance(chunk, str)] == ["sub_questions", "retrieval",
+                                                                               "sub_answer"]
+    assert generator.last_report.sub_questions == 2 and generator.last_report.skipped_questions == 1
+    with pytest.raises(ValueError):
+        RecursiveGenerator(FakeChatModel(), max_sub_questions=0)
+
+
+# ---------------------------------------------------------------------- #
+# ContextPacker
+# ---------------------------------------------------------------------- #
+def _doc(text, **metadata):
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_packer_dedupes_and_orders_by_score():
+    packer = ContextPacker(max_tokens=100)
+    results = [[(_doc("low"), 0.1), (_doc("high", source="a.txt"), 0.9)], [(_doc(" high "), 0.5)]]
+
+    assert packer.pack(results) == "[1] (source=a.txt) high\n\n[2] low"
+    report = packer.last_report
+    assert (report.documents_in, report.documents_out, report.duplicates_removed) == (3, 2, 1)
+    assert report.tokens_saved > 0
+
+
+def test_packer_keeps_retrieval_order_without_scores():
+    context = ContextPacker(max_tokens=100)([_doc("first"), [_doc("second"), _doc("first")]])
+    assert context == "[1] first\n\n[2] second"
+
+
+def test_packer_respects_the_token_budget():
+    reports = []
+    packer = ContextPacker(max_tokens=12, on_report=reports.append)
+    documents = [_doc("one two three four five six seven eight"), _doc("short one"), _doc("nine ten eleven")]
+
+    context = packer.pack(documents)
+    assert estimate_tokens(context) <= 12
+    assert context == "[1] one two three four five six seven eight\n\n[2] short one"[:len(context)]
+    assert reports == [packer.last_report] and reports[0].documents_out == 1
+
+    truncated = ContextPacker(max_tokens=4).pack([_doc("one two three four five six")])
+    assert estimate_tokens(truncated) == 4
+
+
+def test_packer_truncates_with_the_configured_counter():
+    calls = []
+
+    def count_characters(text):
+        calls.append(text)
+        return len(text)
+
+    packer = ContextPacker(max_tokens=20, token_counter=count_characters)
+    calls.clear()
+    context = packer.pack([_doc("one two three four five six seven eight nine ten")])
+
+    assert context == "[1] one two three"
+    assert len(calls) < 10
+
+
+class IgnoreBangEmbeddings(FakeEmbeddings):
+    def _vector(self, text):
+        return super()._vector(text.rstrip("!"))
+
+
+def test_packer_mmr_pushes_near_duplicates_down():
+    index = FlatVectorIndex(IgnoreBangEmbeddings(size=16))
+    texts = ["red apple", "red apple!", "yellow banana"]
+    index.add_texts(texts, ids=texts)
+    results = [(_doc(text, doc_id=text), score) for text, score in zip(texts, [0.9, 0.85, 0.5])]
+
+    relevance_only = ContextPacker(max_tokens=100, mmr_lambda=1.0, vectorstore=index).pack(results)
+    diverse = ContextPacker(max_tokens=100, mmr_lambda=0.3, vectorstore=index).pack(results)
+    assert relevance_only.splitlines()[2] == "[2] red apple!"
+    assert diverse.splitlines()[2] == "[2] yellow banana"
+
+
+def test_packer_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        ContextPacker(max_tokens=0)
+    with pytest.raises(ValueError):
+        ContextPacker(mmr_lambda=0.5)
+
+
+def test_generator_packs_retrieved_context():
+    reports = []
+    retrieval = FusionRetriever(FakeChatModel(), _vectorstore().as_retriever(search_kwargs={"k": 2}))
+    generator = FusionGenerator(FakeChatModel(), context_packer=ContextPacker(max_tokens=20, on_report=reports.append))
+
+    assert generator.answer("How do cells make energy?", retrieval)
+    assert len(reports) == 1
+    assert reports[0].documents_out < reports[0].documents_in
+    assert reports[0].tokens_out <= 20 < reports[0].tokens_in
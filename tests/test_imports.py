@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import rag_toolkit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_DEPENDENCIES = ["chromadb", "langchain_community", "langchain_google_genai", "langchain", "pypdf"]
+
+
+def _loaded_after(code):
+    """Heavy dependencies and toolkit submodules in ``sys.modules`` after running ``code`` in a fresh interpreter."""
+    probe = (f"{code}\nimport json, sys\n"
+             f"print(json.dumps(sorted(name for name in sys.modules "
+             f"if name in {LAZY_DEPENDENCIES!r} or name.startswith('rag_toolkit.'))))")
+    output = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True,
+                            check=True).stdout
+    return set(json.loads(output.strip().splitlines()[-1]))
+
+
+# ---------------------------------------------------------------------- #
+# Lazy imports
+# ---------------------------------------------------------------------- #
+def test_package_import_loads_no_submodule():
+    assert _loaded_after("import rag_toolkit") == set()
+    assert _loaded_after("from rag_toolkit import RagPipeline") & set(LAZY_DEPENDENCIES) == set()
+
+
+@pytest.mark.parametrize("module", ["data_loader", "vector_store", "google_models", "pipeline", "routing"])
+def test_modules_defer_heavy_dependencies(module):
+    assert not _loaded_after(f"import rag_toolkit.{module}") & set(LAZY_DEPENDENCIES)
+
+
+def test_chroma_is_imported_on_first_use():
+    loaded = _loaded_after("from rag_toolkit.fakes import FakeEmbeddings\n"
+                           "from rag_toolkit.vector_store import create_vector_store\n"
+                           "from langchain_core.documents import Document\n"
+                           "create_vector_store([Document(page_content='a')], FakeEmbeddings(size=4))")
+    assert "chromadb" in loaded
+
+
+def test_every_exported_name_resolves():
+    for name in rag_toolkit.__all__:
+        assert getattr(rag_toolkit, name) is not None
+    assert set(rag_toolkit.__all__) <= set(dir(rag_toolkit))
+    with pytest.raises(AttributeError):
+        rag_toolkit.NotAThing
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from rag_toolkit.cache import SemanticAnswerCache, SemanticIndex
+from rag_toolkit.fakes import FakeChatModel, FakeEmbeddings
+from rag_toolkit.flat_index import FlatVectorIndex
+from rag_toolkit.generator import (BaseGenerator, FusionGenerator, MultiQueryGenerator, RecursiveGenerator,
+                                   SimpleGenerator)
+from rag_toolkit.pipeline import RagPipeline
+from rag_toolkit.retriever import DecomposeRetriever, FusionRetriever, MultiQueryRetriever, SimpleRetriever
+from rag_toolkit.streaming import ProgressEvent
+from rag_toolkit.tracing import InMemoryExporter, TracedEmbeddings, Tracer
+from rag_toolkit.vector_store import IncrementalVectorStore
+
+TEXTS = [
+    "The mitochondria is the powerhouse of the cell.",
+    "Photosynthesis turns light into chemical energy.",
+    "Ribosomes assemble proteins from amino acids.",
+    "The nucleus stores the genetic material of the cell.",
+]
+
+
+def _vectorstore(embeddings=None):
+    index = FlatVectorIndex(embeddings or FakeEmbeddings(size=16))
+    index.add_documents([Document(page_content=text) for text in TEXTS], ids=[str(i) for i in range(len(TEXTS))])
+    return index
+
+
+def _retriever(retrieval_cls=SimpleRetriever, model=None, vectorstore=None, **kwargs):
+    vectorstore = vectorstore or _vectorstore()
+    return retrieval_cls(model or FakeChatModel(), vectorstore.as_retriever(search_kwargs={"k": 2}), **kwargs)
+
+
+# ---------------------------------------------------------------------- #
+# Async and streaming generation
+# ---------------------------------------------------------------------- #
+@pytest.mark.parametrize("retrieval_cls, generator_cls", [(SimpleRetriever, SimpleGenerator),
+                                                          (FusionRetriever, FusionGenerator),
+                                                          (DecomposeRetriever, RecursiveGenerator)])
+def test_async_and_streamed_answers_match_sync(retrieval_cls, generator_cls):
+    pipeline = RagPipeline(_retriever(retrieval_cls), generator_cls(FakeChatModel()))
+    question = "What does the mitochondria do?"
+
+    answer = pipeline.process(question)
+    assert answer
+    assert asyncio.run(pipeline.aprocess(question)) == answer
+    assert "".join(pipeline.stream(question)) == answer
+
+
+def test_answer_only_generator_gets_async_and_streaming():
+    class EchoGenerator(BaseGenerator):
+        def default_template(self):
+            return "{question}"
+
+        def answer(self, query, retrieval_approach):
+            return query.upper()
+
+    pipeline = RagPipeline(_retriever(), EchoGenerator(FakeChatModel()))
+    assert asyncio.run(pipeline.aprocess("hi")) == "HI"
+    assert list(pipeline.stream("hi")) == ["HI"]
+
+
+def test_generator_without_answer_is_abstract():
+    class Incomplete(BaseGenerator):
+        def default_template(self):
+            return "{question}"
+
+    with pytest.raises(TypeError):
+        Incomplete(FakeChatModel())
+
+
+def test_recursive_generator_answers_the_query_without_sub_questions():
+    retrieval = _retriever(DecomposeRetriever, model=FakeChatModel(lines=0))
+    assert retrieval.generate_queries("What is a ribosome?") == []
+    generator = RecursiveGenerator(FakeChatModel())
+
+    answer = generator.answer("What is a ribosome?", retrieval)
+    assert answer
+    assert generator.last_report.sub_questions == 1
+    assert asyncio.run(generator.aanswer("What is a ribosome?", retrieval)) == answer
+    assert "".join(generator.stream("What is a ribosome?", retrieval)) == answer
+
+
+# ---------------------------------------------------------------------- #
+# Token streams
+# ---------------------------------------------------------------------- #
+def test_token_stream_records_time_to_first_token():
+    pipeline = RagPipeline(_retriever(), SimpleGenerator(FakeChatModel(per_token_latency=0.01)))
+    stream = pipeline.stream("What does the mitochondria do?")
+    assert stream.time_to_first_token is None and not stream.done
+
+    chunks = list(stream)
+    assert len(chunks) > 1
+    assert stream.text == "".join(chunks) == pipeline.process("What does the mitochondria do?")
+    assert 0 < stream.time_to_first_token < stream.total_time
+
+
+def test_async_token_stream_matches_process():
+    pipeline = RagPipeline(_retriever(), SimpleGenerator(FakeChatModel()))
+
+    async def consume():
+        stream = pipeline.astream("What does the mitochondria do?")
+        chunks = [chunk async for chunk in stream]
+        return stream, chunks
+
+    stream, chunks = asyncio.run(consume())
+    assert stream.done and stream.time_to_first_token is not None
+    assert stream.text == "".join(chunks) == pipeline.process("What does the mitochondria do?")
+
+
+def test_stream_reports_progress_before_answer_tokens():
+    pipeline = RagPipeline(_retriever(DecomposeRetriever), RecursiveGenerator(FakeChatModel()))
+    stream = pipeline.stream("How do cells make energy?", progress=True)
+    chunks = list(stream)
+
+    events = [chunk for chunk in chunks if isinstance(chunk, ProgressEvent)]
+    assert events[0].stage == "sub_questions" and len(events[0].data["questions"]) == 3
+    assert "sub_answer" in {event.stage for event in events}
+    assert all(isinstance(chunk, str) for chunk in chunks[len(events):])
+    assert stream.text == pipeline.process("How do cells make energy?")
+
+
+def test_streamed_answers_use_the_answer_cache():
+    model = FakeChatModel()
+    pipeline = RagPipeline(_retriever(vectorstore=_vectorstore()), SimpleGenerator(model),
+                           answer_cache=SemanticAnswerCache(FakeEmbeddings(size=16)))
+
+    answer = "".join(pipeline.stream("What is a ribosome?"))
+    assert list(pipeline.stream("What is a ribosome?")) == [answer]
+    assert pipeline.process("What is a ribosome?") == answer
+    assert model.calls == 1
+
+
+# ---------------------------------------------------------------------- #
+# Tracing
+# ---------------------------------------------------------------------- #
+def test_tracer_records_stages_and_call_counts():
+    traces = InMemoryExporter()
+    embeddings = TracedEmbeddings(FakeEmbeddings(size=16))
+    pipeline = RagPipeline(_retriever(MultiQueryRetriever, vectorstore=_vectorstore(embeddings)),
+                           MultiQueryGenerator(FakeChatModel()), tracer=Tracer([traces]))
+
+    answer = pipeline.process("What is a ribosome?")
+    assert "".join(pipeline.stream("What is a ribosome?")) == answer
+
+    for trace in traces.traces:
+        assert trace.counters["llm_calls"] == 2
+        assert trace.counters["embedding_calls"] == trace.counters["embedded_texts"] >= 3
+        assert {"pipeline", "retrieval", "llm"} <= set(trace.stage_durations())
+        assert trace.error is None
+    assert len(traces.traces) == 2
+
+
+def test_traced_embeddings_pass_through_outside_a_trace():
+    model = FakeEmbeddings(size=8)
+    embeddings = TracedEmbeddings(model)
+    assert embeddings.embed_query("a") == model.embed_query("a")
+    assert asyncio.run(embeddings.aembed_documents(["a"])) == model.embed_documents(["a"])
+    assert embeddings.texts_embedded == 4  # attributes come from the wrapped model
+
+
+# ---------------------------------------------------------------------- #
+# Answer cache
+# ---------------------------------------------------------------------- #
+def test_answer_cache_is_invalidated_when_the_corpus_changes():
+    vectorstore = _vectorstore()
+    model = FakeChatModel()
+    pipeline = RagPipeline(_retriever(vectorstore=vectorstore), SimpleGenerator(model),
+                           answer_cache=SemanticAnswerCache(FakeEmbeddings(size=16)))
+
+    answer = pipeline.process("What is a ribosome?")
+    assert pipeline.process("What is a ribosome?") == answer
+    assert model.calls == 1
+
+    vectorstore.add_documents([Document(page_content="Ribosomes are found in every cell.")], ids=["new"])
+    pipeline.process("What is a ribosome?")
+    assert model.calls == 2
+
+
+def test_answer_cache_follows_incremental_store_versions(tmp_path):
+    store = IncrementalVectorStore(str(tmp_path), FakeEmbeddings(size=16), collection_name="answers")
+    store.sync([Document(page_content=text) for text in TEXTS])
+    model = FakeChatModel()
+    pipeline = RagPipeline(SimpleRetriever(FakeChatModel(), store.as_retriever(k=2)), SimpleGenerator(model),
+                           answer_cache=SemanticAnswerCache(FakeEmbeddings(size=16)))
+
+    pipeline.process("What is a ribosome?")
+    pipeline.process("What is a ribosome?")
+    assert model.calls == 1
+
+    store.sync([Document(page_content=text) for text in TEXTS[:2]])
+    pipeline.process("What is a ribosome?")
+    assert model.calls == 2
+
+
+def test_answer_cache_warns_without_a_corpus_version(caplog):
+    retrieval = SimpleRetriever(FakeChatModel(), RunnableLambda(lambda q: []))
+    with caplog.at_level(logging.WARNING, logger="rag_toolkit.pipeline"):
+        RagPipeline(retrieval, SimpleGenerator(FakeChatModel()), answer_cache=SemanticAnswerCache(FakeEmbeddings()))
+    assert "invalidate" in caplog.text
+
+
+def test_semantic_index_rescores_projected_candidates_exactly():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 256), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = SemanticIndex(capacity=2000, search_width=32)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector, scope="even" if i % 2 == 0 else "odd")
+
+    for i in range(0, 100, 2):
+        query = vectors[i] + 0.01 * rng.standard_normal(256, dtype=np.float32)
+        key, score = index.search(query, "even", threshold=0.9)
+        assert key == str(i)
+        assert score == pytest.approx(float(vectors[i] @ query / np.linalg.norm(query)), abs=1e-5)
+        assert index.search(query, "odd", threshold=0.9) is None
+
+
+def test_semantic_index_forgets_scopes_without_rows():
+    index = SemanticIndex(capacity=4)
+    for version in range(20):
+        index.add(f"q{version}", [1.0, float(version)], scope=f"v{version}")
+    assert len(index) == 4 and set(index._scope_ids) == {"v16", "v17", "v18", "v19"}
+
+    index.discard("q16")
+    assert index.clear("v17") == ["q17"]
+    index.add("q18", [0.0, 1.0], scope="v19")
+    assert set(index._scope_ids) == {"v19"}
+    assert index.search([0.0, 1.0], "v19", threshold=0.99)[0] == "q18"
+
+
+# ---------------------------------------------------------------------- #
+# Batched processing
+# ---------------------------------------------------------------------- #
+@pytest.mark.parametrize("retrieval_cls, generator_cls", [(SimpleRetriever, SimpleGenerator),
+                                                          (MultiQueryRetriever, MultiQueryGenerator),
+                                                          (FusionRetriever, FusionGenerator),
+                                                          (DecomposeRetriever, RecursiveGenerator)])
+def test_process_batch_matches_process(retrieval_cls, generator_cls):
+    queries = ["What is a ribosome?", "Where is DNA stored?", "What is a ribosome?"]
+    query_model = FakeChatModel()
+    retrieval = _retriever(retrieval_cls, model=query_model)
+    pipeline = RagPipeline(retrieval, generator_cls(FakeChatModel()))
+    expected = [pipeline.process(query) for query in queries]
+    base_retriever = retrieval.base_retriever
+
+    query_model.calls = 0
+    results = pipeline.process_batch(queries)
+
+    assert [result.answer for result in results] == expected
+    assert all(result.ok for result in results)
+    if retrieval_cls is not SimpleRetriever:
+        assert query_model.calls == 2  # one query-generation call per unique query
+    assert retrieval.base_retriever is base_retriever
+    assert "build_query_gen_chain" not in vars(retrieval)
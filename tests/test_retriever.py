@@ -0,0 +1,280 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from rag_toolkit.cache import InMemoryCache, QueryCache, SQLiteCache
+from rag_toolkit.embedding_cache import EmbeddingCache
+from rag_toolkit.fakes import FakeChatModel, FakeEmbeddings
+from rag_toolkit.flat_index import FlatVectorIndex
+from rag_toolkit.lexical_index import BM25Index
+from rag_toolkit.retriever import FusionRetriever, MultiQueryRetriever, abatch_retrieve, batch_retrieve
+from rag_toolkit.routing import EmbedRouter, TieredQueryRouter
+
+TEXTS = [
+    "The mitochondria is the powerhouse of the cell.",
+    "Photosynthesis turns light into chemical energy.",
+    "Ribosomes assemble proteins from amino acids.",
+    "The nucleus stores the genetic material of the cell.",
+]
+
+
+def _base_retriever(embeddings=None, k=2):
+    index = FlatVectorIndex(embeddings if embeddings is not None else FakeEmbeddings(size=16))
+    index.add_documents([Document(page_content=text) for text in TEXTS], ids=[str(i) for i in range(len(TEXTS))])
+    return index.as_retriever(search_kwargs={"k": k})
+
+
+# ---------------------------------------------------------------------- #
+# Query cache
+# ---------------------------------------------------------------------- #
+def test_query_cache_skips_the_llm_on_repeated_questions():
+    model, cache = FakeChatModel(), QueryCache()
+    retrieval = MultiQueryRetriever(model, _base_retriever(), query_cache=cache)
+
+    queries = retrieval.generate_queries("What does the nucleus store?")
+    assert model.calls == 1
+    assert retrieval.generate_queries("  what does the NUCLEUS store ") == queries
+    assert asyncio.run(retrieval.agenerate_queries("What does the nucleus store?")) == queries
+    assert model.calls == 1
+    assert cache.stats()["hits"] == 2 and cache.misses == 1
+
+
+def test_query_cache_is_scoped_per_retriever_type():
+    model, cache = FakeChatModel(), QueryCache()
+    MultiQueryRetriever(model, _base_retriever(), query_cache=cache).generate_queries("q")
+    FusionRetriever(model, _base_retriever(), query_cache=cache).generate_queries("q")
+    assert model.calls == 2 and len(cache.backend) == 2
+
+
+def test_query_cache_similarity_tier():
+    class SameVector(FakeEmbeddings):
+        def embed_query(self, text):
+            return super().embed_query("same")
+
+    model = FakeChatModel()
+    cache = QueryCache(embeddings_model=SameVector(size=8), similarity_threshold=0.9)
+    retrieval = MultiQueryRetriever(model, _base_retriever(), query_cache=cache)
+
+    queries = retrieval.generate_queries("How do cells make energy?")
+    assert retrieval.generate_queries("Where does a cell get its energy from?") == queries
+    assert model.calls == 1 and cache.semantic_hits == 1
+
+
+def test_in_memory_cache_evicts_and_expires():
+    cache = InMemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.evictions == 1
+
+    expiring = InMemoryCache(ttl=-1)
+    expiring.set("a", 1)
+    assert expiring.get("a") is None and expiring.expirations == 1
+
+
+def test_sqlite_cache_persists(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SQLiteCache(path).set("key", ["q1", "q2"])
+    reopened = SQLiteCache(path)
+    assert reopened.get("key") == ["q1", "q2"]
+    assert len(reopened) == 1
+
+    with pytest.raises(ValueError):
+        SQLiteCache(path, max_entries=0)
+
+
+# ---------------------------------------------------------------------- #
+# Routing
+# ---------------------------------------------------------------------- #
+class QueryPrefixEmbeddings(FakeEmbeddings):
+    """Embeds queries differently from documents, like models with a query task type."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.documents_embedded = []
+
+    def embed_documents(self, texts):
+        self.documents_embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        return super().embed_query(f"query: {text}")
+
+
+TEMPLATES = ["Answer about biology: {question}", "Answer about cooking: {question}", "Answer briefly: {question}"]
+QUESTIONS = ["What is a cell?", "How long to boil an egg?", "Why is the sky blue?", "What is a cell?"]
+
+
+def test_embed_router_routes_batches_like_single_queries():
+    embeddings = QueryPrefixEmbeddings(size=16)
+    router = EmbedRouter(embeddings, TEMPLATES)
+    single = [EmbedRouter(embeddings, TEMPLATES).get_most_similar_template(question) for question in QUESTIONS]
+
+    embeddings.documents_embedded.clear()
+    assert router.get_most_similar_templates(QUESTIONS) == single
+    assert [prompt.template for prompt in router.route_queries(QUESTIONS)] == single
+    assert embeddings.documents_embedded == []
+
+
+def test_embed_router_embeds_each_distinct_query_once():
+    embeddings = QueryPrefixEmbeddings(size=16)
+    router = EmbedRouter(embeddings, TEMPLATES)
+    embeddings.reset_counters()
+
+    router.route_queries(QUESTIONS)
+    router.route_query("What is a cell?")
+    assert embeddings.calls == 3
+
+    router.remove_template(TEMPLATES[0])
+    assert router.route_query("What is a cell?").template in TEMPLATES[1:]
+    router.add_template(TEMPLATES[0])
+    assert router.templates[-1] == TEMPLATES[0]
+
+
+def test_embed_router_embeds_a_batch_concurrently():
+    embeddings = QueryPrefixEmbeddings(size=16, latency=0.1)
+    router = EmbedRouter(embeddings, TEMPLATES, query_cache_size=0)
+
+    started = time.monotonic()
+    router.route_queries(QUESTIONS)
+    assert time.monotonic() - started < 0.2  # three distinct queries, 0.3 s one after another
+
+    started = time.monotonic()
+    EmbedRouter(embeddings, TEMPLATES, query_cache_size=0, max_concurrency=1).route_queries(QUESTIONS)
+    assert time.monotonic() - started >= 0.3
+
+
+def _tiered_router(embeddings, **kwargs):
+    return TieredQueryRouter(FakeChatModel(choices=["biology", "cooking"]), ["biology", "cooking"],
+                             keywords={"biology": ["cell"], "cooking": ["egg"]},
+                             examples={"biology": ["What is DNA?"], "cooking": ["How do I bake bread?"]},
+                             embeddings_model=embeddings, **kwargs)
+
+
+def test_tiered_router_falls_back_from_keywords_to_embeddings_to_the_llm():
+    router = _tiered_router(QueryPrefixEmbeddings(size=16), min_margin=-1.0)
+    routes = router.route_batch(["What is a cell?", "Boil an egg", "Tell me something"])
+    assert routes[:2] == ["biology", "cooking"]
+    assert router.stats()["keyword_routes"] == 2 and router.embedding_routes == 1 and router.llm_routes == 0
+
+    uncertain = _tiered_router(QueryPrefixEmbeddings(size=16), min_margin=2.0)
+    assert uncertain.route("Tell me something") in ["biology", "cooking"]
+    assert uncertain.llm_routes == 1 and uncertain.fast_path_rate == 0.0
+
+
+def test_tiered_router_scores_questions_with_query_embeddings():
+    embeddings = QueryPrefixEmbeddings(size=16)
+    router = _tiered_router(embeddings, min_margin=-1.0)
+    questions = ["Tell me something", "Anything else?", "Tell me something"]
+    single = [router.embedding_routes_for([question])[0] for question in questions]
+
+    embeddings.documents_embedded.clear()
+    embeddings.reset_counters()
+    assert router.embedding_routes_for(questions) == single
+    assert embeddings.documents_embedded == [] and embeddings.calls == 2
+
+
+def test_tiered_router_embeds_a_batch_concurrently():
+    embeddings = QueryPrefixEmbeddings(size=16, latency=0.1)
+    router = _tiered_router(embeddings, min_margin=-1.0)
+
+    started = time.monotonic()
+    routes = router.embedding_routes_for(["Tell me something", "Anything else?", "What now?"])
+    assert time.monotonic() - started < 0.2  # 0.3 s one after another
+    assert None not in routes
+
+
+# ---------------------------------------------------------------------- #
+# Batched retrieval
+# ---------------------------------------------------------------------- #
+def test_batch_retrieve_matches_invoke_with_query_embeddings():
+    retriever = _base_retriever(QueryPrefixEmbeddings(size=16))
+    queries = ["What is a ribosome?", "Where is DNA stored?", "How do plants use light?"]
+    expected = [retriever.invoke(query) for query in queries]
+
+    assert batch_retrieve(retriever, queries) == expected
+    assert asyncio.run(abatch_retrieve(retriever, queries)) == expected
+    hits = retriever.vectorstore.batch_similarity_search_with_score(queries, k=2)
+    assert [[doc for doc, _ in docs] for docs in hits] == expected
+
+
+def test_batch_retrieve_falls_back_to_the_retriever_batch():
+    retriever = BM25Index.from_documents([Document(page_content=text) for text in TEXTS]).as_retriever(k=2)
+    queries = ["What is a ribosome?", "Where is the genetic material stored?"]
+    expected = [retriever.invoke(query) for query in queries]
+
+    assert batch_retrieve(retriever, queries) == expected
+    assert asyncio.run(abatch_retrieve(retriever, queries)) == expected
+    assert all(expected)
+    assert batch_retrieve(retriever, []) == asyncio.run(abatch_retrieve(retriever, [])) == []
+
+
+def test_batch_retrieve_is_not_slower_than_the_retriever_batch():
+    retriever = _base_retriever(FakeEmbeddings(size=16, latency=0.1))
+    queries = [f"Question {i}" for i in range(8)]
+
+    started = time.monotonic()
+    expected = retriever.batch(queries)
+    batch_seconds = time.monotonic() - started
+
+    started = time.monotonic()
+    assert batch_retrieve(retriever, queries) == expected
+    assert time.monotonic() - started < batch_seconds + 0.05  # 0.8 s one query after another
+
+    started = time.monotonic()
+    retriever.vectorstore.batch_similarity_search(queries, k=2)
+    assert time.monotonic() - started < batch_seconds + 0.05
+
+
+def test_batch_retrieve_keeps_queries_out_of_the_document_cache(tmp_path):
+    cache = EmbeddingCache(QueryPrefixEmbeddings(size=16), cache_dir=str(tmp_path))
+    retriever = _base_retriever(cache)
+    entries = cache.stats()["entries"]
+
+    batch_retrieve(retriever, ["What is a ribosome?", "Where is DNA stored?"])
+    asyncio.run(abatch_retrieve(retriever, ["What is a ribosome?", "Where is DNA stored?"]))
+    retriever.vectorstore.batch_similarity_search(["What is a ribosome?"], k=2)
+    assert entries == len(TEXTS) and cache.stats()["entries"] == entries
+
+
+# ---------------------------------------------------------------------- #
+# Lexical index
+# ---------------------------------------------------------------------- #
+LEXICAL = {"a": "red apple pie", "b": "yellow banana bread", "c": "red cherry jam", "d": "green apple juice"}
+
+
+def _bm25(texts, **kwargs):
+    index = BM25Index(**kwargs)
+    index.add_documents([Document(page_content=text) for text in texts.values()], ids=list(texts))
+    return index
+
+
+@pytest.mark.parametrize("compact_threshold", [0.25, 1.0])
+def test_bm25_delete_and_replace_score_like_a_fresh_index(compact_threshold):
+    index = _bm25(LEXICAL, compact_threshold=compact_threshold)
+    index.delete(["a"])
+    index.add_documents([Document(page_content="red cherry pie")], ids=["c"])
+    fresh = _bm25({"b": LEXICAL["b"], "d": LEXICAL["d"], "c": "red cherry pie"})
+
+    for query in ["red apple", "cherry pie", "banana", "apple juice"]:
+        assert ([(doc.page_content, pytest.approx(score)) for doc, score in index.search_with_score(query, k=4)]
+                == [(doc.page_content, score) for doc, score in fresh.search_with_score(query, k=4)])
+    assert len(index) == 3
+    assert index.search("jam") == []
+
+
+def test_bm25_compacts_tombstoned_rows():
+    index = _bm25(LEXICAL)
+    index.delete(["a"])
+    assert len(index._documents) == 4  # one tombstone in four rows stays below the threshold
+
+    index.delete(["b"])
+    assert len(index._documents) == len(index) == 2
+    assert "banana" not in index._terms
+    assert [doc.page_content for doc in index.search("apple")] == ["green apple juice"]
+
+    index.add_documents([Document(page_content="banana split")], ids=["b"])
+    assert index.search("banana")[0].metadata["doc_id"] == "b"
@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+
+from app.server import AdmissionController, Metrics, QueueFull, RagServer, build_pipeline, parse_args
+
+
+class SlowPipeline:
+    """Answers every query with itself after ``delay`` seconds."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    async def aprocess(self, query):
+        await asyncio.sleep(self.delay)
+        return query
+
+
+def _query(query):
+    return json.dumps({"query": query}).encode()
+
+
+# ---------------------------------------------------------------------- #
+# AdmissionController
+# ---------------------------------------------------------------------- #
+def test_admission_queues_then_rejects():
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission:
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert (admission.in_flight, admission.queued) == (1, 1)
+        with pytest.raises(QueueFull):
+            async with admission:
+                pass
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert len(admission) == 0
+
+    asyncio.run(run())
+
+
+# ---------------------------------------------------------------------- #
+# RagServer.dispatch
+# ---------------------------------------------------------------------- #
+def test_dispatch_answers_with_the_warm_pipeline():
+    args = parse_args(["--fake", "--fake-docs", "20", "--llm-latency", "0", "--embed-latency", "0", "--k", "2"])
+    metrics = Metrics()
+    server = RagServer(build_pipeline(args, metrics), metrics)
+
+    async def run():
+        status, payload = await server.dispatch("POST", "/query", _query("What is topic 3?"))
+        assert status == 200 and payload["answer"] and payload["latency_ms"] >= 0
+        assert await server.dispatch("GET", "/health", b"") == (200, {"status": "ok"})
+        return await server.dispatch("GET", "/metrics", b"")
+
+    status, snapshot = asyncio.run(run())
+    assert status == 200
+    assert snapshot["responses"] == {"200": 1} and snapshot["in_flight"] == 0
+    assert snapshot["pipeline"]["llm_calls"] == 1
+
+
+@pytest.mark.parametrize("method, path, body, status", [
+    ("GET", "/missing", b"", 404),
+    ("GET", "/query", b"", 405),
+    ("POST", "/query", b"not json", 400),
+    ("POST", "/query", b'["query"]', 400),
+    ("POST", "/query", _query("  "), 400),
+])
+def test_dispatch_rejects_bad_requests(method, path, body, status):
+    server = RagServer(SlowPipeline(), Metrics())
+    assert asyncio.run(server.dispatch(method, path, body))[0] == status
+
+
+def test_dispatch_limits_concurrency_and_time():
+    server = RagServer(SlowPipeline(delay=0.2), Metrics(), max_concurrency=1, max_queue=1, timeout=0.3)
+
+    async def run():
+        return await asyncio.gather(*(server.dispatch("POST", "/query", _query(f"q{i}")) for i in range(3)))
+
+    statuses = sorted(status for status, _ in asyncio.run(run()))
+    assert statuses == [200, 429, 504]  # the queued query waits past the timeout
+    assert server.metrics.responses == {200: 1, 429: 1, 504: 1}
+
+
+def test_draining_server_refuses_new_queries():
+    server = RagServer(SlowPipeline(delay=0.1), Metrics())
+
+    async def run():
+        running = asyncio.create_task(server.dispatch("POST", "/query", _query("in flight")))
+        await asyncio.sleep(0.01)
+        drain = asyncio.create_task(server.drain(timeout=1.0))
+        await asyncio.sleep(0)
+        assert await server.dispatch("GET", "/health", b"") == (503, {"status": "draining"})
+        assert (await server.dispatch("POST", "/query", _query("late")))[0] == 503
+        await drain
+        assert running.done()
+        return await running
+
+    status, payload = asyncio.run(run())
+    assert status == 200 and payload["answer"] == "in flight"
+
+
+# ---------------------------------------------------------------------- #
+# HTTP
+# ---------------------------------------------------------------------- #
+def test_http_keep_alive_round_trip():
+    server = RagServer(SlowPipeline(), Metrics())
+
+    async def run():
+        listener = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        replies = []
+        for query, connection in [("first", "keep-alive"), ("second", "close")]:
+            body = _query(query)
+            writer.write(f"POST /query HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: {connection}\r\n\r\n".encode() + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            payload = json.loads(await reader.readexactly(int(headers["content-length"])))
+            replies.append((status_line.split()[1], headers["connection"], payload["answer"]))
+        assert await reader.read() == b""
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return replies
+
+    assert asyncio.run(run()) == [(b"200", "keep-alive", "first"), (b"200", "close", "second")]
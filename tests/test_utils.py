@@ -0,0 +1,178 @@
+import io
+import json
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+from rag_toolkit.chunking import TextChunker, chunk_documents
+from rag_toolkit.data_loader import _iter_json_array, find_files, iter_directory, iter_json_documents
+from rag_toolkit.fakes import FakeEmbeddings
+from rag_toolkit.flat_index import FlatVectorIndex
+from rag_toolkit.lexical_index import BM25Index
+from rag_toolkit.utils import DOC_ID_KEY, assign_document_ids, content_hash, document_id
+from rag_toolkit.vector_store import EmbeddingIngestor, create_hybrid_retriever
+
+
+# ---------------------------------------------------------------------- #
+# Document ids
+# ---------------------------------------------------------------------- #
+def test_assign_document_ids_does_not_modify_the_input():
+    original = Document(page_content="text", metadata={"source": "a"})
+    stamped = assign_document_ids([original])[0]
+
+    assert original.metadata == {"source": "a"}
+    assert stamped.metadata == {"source": "a", DOC_ID_KEY: content_hash(original)}
+    assert assign_document_ids([stamped])[0] is stamped
+
+
+def test_explicit_ids_override_existing_doc_ids():
+    stamped = assign_document_ids([Document(page_content="text")])
+    restamped = assign_document_ids(stamped, ["new"])
+
+    assert document_id(restamped[0]) == "new"
+    assert document_id(stamped[0]) == content_hash(stamped[0])
+
+
+def test_indexes_stamp_the_ids_they_store():
+    documents = assign_document_ids([Document(page_content="apple"), Document(page_content="banana")])
+
+    index = FlatVectorIndex(FakeEmbeddings(size=8))
+    index.add_documents(documents, ids=["a", "b"])
+    assert [document_id(doc) for doc in index.similarity_search("apple", k=2)] == ["a", "b"]
+
+    bm25 = BM25Index()
+    assert bm25.add_documents(documents, ids=["a", "b"]) == ["a", "b"]
+    assert document_id(bm25.search_with_score("banana")[0][0]) == "b"
+    assert [doc.metadata[DOC_ID_KEY] for doc in documents] == [content_hash(doc) for doc in documents]
+
+
+@pytest.mark.parametrize("backend", ["chroma", "flat"])
+def test_hybrid_retriever_indexes_share_document_ids(backend):
+    documents = [Document(page_content=text) for text in ["red apple", "yellow banana", "red cherry"]]
+    retriever = create_hybrid_retriever(documents, FakeEmbeddings(size=8), k=3, fetch_k=3, backend=backend,
+                                        ingestor=EmbeddingIngestor(batch_size=2))
+
+    lexical = {document_id(doc) for doc, _ in retriever.index.search_with_score("red", k=3)}
+    vector = {document_id(doc) for doc in retriever.vector_retriever.invoke("red")}
+    assert lexical <= vector
+    assert len(retriever.invoke("red")) == 3
+    assert all(DOC_ID_KEY not in doc.metadata for doc in documents)
+
+
+# ---------------------------------------------------------------------- #
+# Streaming JSON loading
+# ---------------------------------------------------------------------- #
+class CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+@pytest.mark.parametrize("text", ['[]', ' [ 1 , {"a": [1, 2]} ,"x", 12345 ] ', '[1e10, true, null]'])
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+def test_iter_json_array_matches_json_loads(text, chunk_size):
+    assert list(_iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ["[,,1]", "[1,,2]", "[1 2]", "[1,]", "[,]", "[1", "[1,", "", "{}", "[1],"])
+def test_iter_json_array_rejects_malformed_input(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(_iter_json_array(io.StringIO(text), chunk_size=2))
+
+
+def test_iter_json_array_reads_large_elements_in_few_passes():
+    text = json.dumps([{"page_content": "x" * 200_000, "metadata": 1}, 2])
+    reader = CountingReader(text)
+    entries = list(_iter_json_array(reader, chunk_size=64))
+
+    assert entries == json.loads(text)
+    assert reader.reads < 20
+
+
+def test_iter_json_documents_streams_arrays_and_lines(tmp_path):
+    entries = [{"page_content": f"text {i}", "metadata": i} for i in range(3)]
+    array_file, lines_file = tmp_path / "docs.json", tmp_path / "docs.jsonl"
+    array_file.write_text(json.dumps(entries), encoding="utf-8")
+    lines_file.write_text("\n".join(json.dumps(entry) for entry in entries), encoding="utf-8")
+
+    for path in (array_file, lines_file):
+        documents = list(iter_json_documents(str(path)))
+        assert [doc.page_content for doc in documents] == ["text 0", "text 1", "text 2"]
+        assert documents[2].metadata == {"id": 2}
+
+
+# ---------------------------------------------------------------------- #
+# Directory ingestion
+# ---------------------------------------------------------------------- #
+def _corpus(directory):
+    (directory / "nested").mkdir()
+    (directory / "a.txt").write_text("one\ntwo\nthree", encoding="utf-8")
+    (directory / "nested" / "b.jsonl").write_text('{"page_content": "json", "metadata": 1}', encoding="utf-8")
+    (directory / "c.json").write_text('[{"page_content": "dropped", "metadata": 2},,]', encoding="utf-8")
+    (directory / "notes.md").write_text("unsupported", encoding="utf-8")
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_iter_directory_streams_files_in_path_order(tmp_path, max_workers):
+    _corpus(tmp_path)
+    results = []
+    documents = list(iter_directory(str(tmp_path), max_workers=max_workers, on_file=results.append))
+
+    assert [doc.page_content for doc in documents] == ["one", "two", "three", "json"]
+    assert [os.path.basename(result.path) for result in results] == ["a.txt", "c.json", "b.jsonl"]
+    assert [result.documents for result in results] == [3, 0, 1]
+    assert results[1].error.startswith("JSONDecodeError")
+    assert results[0].error is None and results[2].error is None
+
+
+def test_find_files_filters_by_extension(tmp_path):
+    _corpus(tmp_path)
+    assert [file_type for _, file_type in find_files(str(tmp_path))] == ["txt", "json", "jsonl"]
+    assert [file_type for _, file_type in find_files(str(tmp_path), extensions=[".TXT"])] == ["txt"]
+
+
+# ---------------------------------------------------------------------- #
+# Chunking
+# ---------------------------------------------------------------------- #
+PARAGRAPHS = "\n\n".join(
+    " ".join(f"Sentence {p}.{s} has a handful of plain words." for s in range(6)) for p in range(5)
+)
+
+
+def test_chunks_respect_size_and_end_on_boundaries():
+    chunker = TextChunker(chunk_size=200, chunk_overlap=40)
+    spans = chunker.split_spans(PARAGRAPHS)
+
+    assert len(spans) > 1
+    for start, end in spans:
+        assert end - start <= 200
+        assert PARAGRAPHS[end - 1] == "." or end == len(PARAGRAPHS)
+    assert all(next_start < end for (_, end), (next_start, _) in zip(spans, spans[1:]))
+
+
+def test_token_chunks_respect_size():
+    chunker = TextChunker(chunk_size=30, chunk_overlap=5, unit="tokens")
+    for chunk in chunker.split_text(PARAGRAPHS):
+        assert len(chunker.token_regex.findall(chunk)) <= 30
+
+
+def test_chunk_documents_keep_metadata_and_offsets():
+    source = Document(page_content=PARAGRAPHS, metadata={"source": "a.txt", DOC_ID_KEY: "old"})
+    chunks = chunk_documents([source], chunk_size=200, chunk_overlap=0)
+
+    assert [chunk.metadata["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert chunk.metadata["source"] == "a.txt" and DOC_ID_KEY not in chunk.metadata
+        assert PARAGRAPHS[chunk.metadata["start_index"]:chunk.metadata["end_index"]] == chunk.page_content
+
+
+def test_chunker_rejects_invalid_sizes():
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=10, chunk_overlap=10)
+    with pytest.raises(ValueError):
+        TextChunker(unit="pages")
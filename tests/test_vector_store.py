@@ -0,0 +1,309 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from rag_toolkit.chunk_store import ChunkRef, ChunkStore
+from rag_toolkit.context import ContextPacker
+from rag_toolkit.fakes import FakeChatModel, FakeEmbeddings, FakeModelError
+from rag_toolkit.flat_index import FlatVectorIndex
+from rag_toolkit.generator import FusionGenerator, SimpleGenerator
+from rag_toolkit.retriever import FusionRetriever, SimpleRetriever
+from rag_toolkit.vector_store import (EmbeddingIngestor, IncrementalVectorStore, IngestionError,
+                                      create_vector_store, document_keys)
+
+
+# ---------------------------------------------------------------------- #
+# IncrementalVectorStore
+# ---------------------------------------------------------------------- #
+def _rows(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def test_document_keys_do_not_depend_on_row_order():
+    keys = dict(document_keys(_rows("a", "b", "c")))
+    shifted = dict(document_keys(_rows("new", "a", "b", "c")))
+    assert set(keys) <= set(shifted)
+
+    duplicates = [doc_id for doc_id, _ in document_keys(_rows("a", "a"))]
+    assert len(set(duplicates)) == 2
+
+
+def test_document_keys_prefer_explicit_ids():
+    original = document_keys([Document(page_content="old", metadata={"doc_id": "x"})])
+    edited = document_keys([Document(page_content="new", metadata={"doc_id": "x"})])
+    assert original[0][0] == edited[0][0] == "x"
+    assert original[0][1] != edited[0][1]
+
+
+def test_incremental_sync_embeds_only_the_delta(tmp_path):
+    model = FakeEmbeddings(size=8)
+    store = IncrementalVectorStore(str(tmp_path), model, collection_name="sync")
+
+    result = store.sync(_rows("a", "b", "c"))
+    assert len(result.added) == 3 and model.texts_embedded == 3
+
+    model.reset_counters()
+    result = store.sync(_rows("inserted", "a", "b", "c"))
+    assert len(result.added) == 1 and result.unchanged == 3
+    assert model.texts_embedded == 1
+
+    model.reset_counters()
+    result = store.sync(_rows("inserted", "a", "c"))
+    assert len(result.removed) == 1 and not result.added and model.texts_embedded == 0
+    assert len(store) == 3 and len(store.vectorstore.get()["ids"]) == 3
+
+
+def test_incremental_store_survives_reopen(tmp_path):
+    store = IncrementalVectorStore(str(tmp_path), FakeEmbeddings(size=8), collection_name="reopen")
+    store.sync(_rows("a", "b"))
+
+    model = FakeEmbeddings(size=8)
+    reopened = IncrementalVectorStore(str(tmp_path), model, collection_name="reopen")
+    result = reopened.sync(_rows("a", "b"))
+    assert result.changed == 0 and model.texts_embedded == 0
+    assert reopened.version == store.version == 1
+
+
+def test_incremental_store_retriever_exposes_version(tmp_path):
+    store = IncrementalVectorStore(str(tmp_path), FakeEmbeddings(size=8), collection_name="version")
+    retriever = store.as_retriever(k=1)
+    assert retriever.vectorstore.version == 0
+
+    store.sync(_rows("a"))
+    assert retriever.vectorstore.version == 1
+    assert retriever.invoke("a")[0].page_content == "a"
+
+
+# ---------------------------------------------------------------------- #
+# EmbeddingIngestor
+# ---------------------------------------------------------------------- #
+class PoisonedEmbeddings(FakeEmbeddings):
+    """Fails every call that contains the ``poison`` text until it is cleared."""
+
+    def __init__(self, poison=None, **kwargs):
+        super().__init__(**kwargs)
+        self.poison = poison
+
+    def embed_documents(self, texts):
+        if self.poison in texts:
+            raise FakeModelError("poisoned batch")
+        return super().embed_documents(texts)
+
+
+def _ingestor(**kwargs):
+    return EmbeddingIngestor(batch_size=2, max_workers=1, max_retries=0, backoff=0, **kwargs)
+
+
+def test_ingestor_writes_precomputed_embeddings_to_chroma(capsys):
+    model = FakeEmbeddings(size=8)
+    store = create_vector_store(_rows("a", "b", "c"), model, ingestor=_ingestor())
+
+    assert model.texts_embedded == 3
+    assert store.similarity_search("b", k=1)[0].page_content == "b"
+    assert capsys.readouterr().out == ""
+
+
+def test_ingestor_resumes_from_checkpoint(tmp_path):
+    checkpoint = tmp_path / "ingest.checkpoint"
+    model = PoisonedEmbeddings(poison="c", size=8)
+    store = IncrementalVectorStore(str(tmp_path / "db"), model, collection_name="resume",
+                                   ingestor=_ingestor(checkpoint_path=str(checkpoint)))
+    documents = _rows("a", "b", "c", "d", "e")
+
+    with pytest.raises(IngestionError) as failure:
+        store.sync(documents)
+    assert failure.value.report.failed_batches == [1]
+    assert checkpoint.exists()
+
+    model.poison = None
+    model.reset_counters()
+    store.sync(documents)
+    assert model.texts_embedded == 2  # only the failed batch
+    assert len(store.vectorstore.get()["ids"]) == 5
+    assert not checkpoint.exists()
+
+
+def test_in_memory_store_refuses_to_resume(tmp_path):
+    checkpoint = tmp_path / "ingest.checkpoint"
+    with pytest.raises(IngestionError):
+        create_vector_store(_rows("a", "b", "c"), PoisonedEmbeddings(poison="c", size=8),
+                            ingestor=_ingestor(checkpoint_path=str(checkpoint)))
+
+    with pytest.raises(ValueError, match="checkpoint"):
+        create_vector_store(_rows("a", "b", "c"), FakeEmbeddings(size=8),
+                            ingestor=_ingestor(checkpoint_path=str(checkpoint)))
+
+
+# ---------------------------------------------------------------------- #
+# FlatVectorIndex
+# ---------------------------------------------------------------------- #
+def _flat_index(texts, **kwargs):
+    index = FlatVectorIndex(FakeEmbeddings(size=16), **kwargs)
+    index.add_texts(texts, ids=list(texts))
+    return index
+
+
+def test_flat_index_search_returns_nearest_documents():
+    index = _flat_index(["apple", "banana", "cherry"])
+    hits = index.similarity_search_with_score("banana", k=2)
+    assert hits[0][0].page_content == "banana"
+    assert hits[0][1] == pytest.approx(1.0)
+    assert len(hits) == 2
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+def test_flat_index_overwrites_existing_and_repeated_ids(quantization):
+    index = _flat_index(["apple", "banana"], quantization=quantization)
+    embedding = FakeEmbeddings(size=16)
+    index.add_embeddings(["apple", "cherry", "cherry"],
+                         _rows("apple v2", "cherry v1", "cherry v2"),
+                         embedding.embed_documents(["apple v2", "cherry v1", "cherry v2"]))
+
+    assert len(index) == 3
+    assert [doc.page_content for doc in index.get_by_ids(["apple", "cherry"])] == ["apple v2", "cherry v2"]
+    assert index.similarity_search("cherry v2", k=1)[0].page_content == "cherry v2"
+    assert index.similarity_search_with_score("cherry v1", k=1)[0][1] < 0.99
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+def test_flat_index_delete_compacts_rows(quantization):
+    index = _flat_index(["apple", "banana", "cherry", "date"], quantization=quantization)
+    assert index.delete(["banana", "date", "missing"])
+    assert index.delete(["missing"]) is False
+
+    assert len(index) == 2
+    assert [doc.page_content for doc in index.get_by_ids(["apple", "cherry"])] == ["apple", "cherry"]
+    assert index.similarity_search("cherry", k=1)[0].page_content == "cherry"
+    assert index.vectors.shape == (2, 16)
+
+
+def test_flat_index_add_documents_fills_missing_ids():
+    index = FlatVectorIndex(FakeEmbeddings(size=16))
+    ids = index.add_documents([Document(page_content="apple", id="a"), Document(page_content="banana"),
+                               Document(page_content="cherry")])
+
+    assert ids[0] == "a" and None not in ids and len(set(ids)) == 3
+    assert len(index) == 3
+    assert [doc.page_content for doc in index.get_by_ids(ids)] == ["apple", "banana", "cherry"]
+
+
+def _clustered_vectors(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    return centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def _vector_index(vectors, **kwargs):
+    ids = [str(i) for i in range(len(vectors))]
+    index = FlatVectorIndex(FakeEmbeddings(size=vectors.shape[1]), **kwargs)
+    index.add_embeddings(ids, [Document(page_content=doc_id) for doc_id in ids], vectors)
+    return index
+
+
+def test_int8_rescoring_returns_the_float32_top_k():
+    vectors = _clustered_vectors(2000)
+    queries = vectors[:50] + 0.3 * np.random.default_rng(1).standard_normal((50, 32), dtype=np.float32)
+    exact = _vector_index(vectors).similarity_search_with_score_by_vectors(queries, k=5)
+    quantized = _vector_index(vectors, quantization="int8")
+
+    rescored = quantized.similarity_search_with_score_by_vectors(queries, k=5)
+    assert [[doc.page_content for doc, _ in hits] for hits in rescored] == [[doc.page_content for doc, _ in hits] for hits in exact]
+    assert np.allclose([[score for _, score in hits] for hits in rescored],
+                       [[score for _, score in hits] for hits in exact], atol=1e-5)
+    assert quantized.nbytes < vectors.nbytes / 3
+
+
+def test_quantized_index_survives_save_and_load(tmp_path):
+    vectors = _clustered_vectors(300)
+    index = _vector_index(vectors, quantization="int8")
+    index.delete(["0", "1"])
+    index.save(str(tmp_path))
+
+    reopened = FlatVectorIndex.load(str(tmp_path), FakeEmbeddings(size=32))
+    assert len(reopened) == 298 and reopened.nbytes == index.nbytes
+    assert ([doc.page_content for doc in reopened.similarity_search_by_vector(vectors[5], k=3)]
+            == [doc.page_content for doc in index.similarity_search_by_vector(vectors[5], k=3)])
+
+
+def test_unsupported_quantization_is_rejected():
+    with pytest.raises(ValueError, match="int8"):
+        FlatVectorIndex(FakeEmbeddings(size=8), quantization="float16")
+    with pytest.raises(ValueError, match="flat"):
+        create_vector_store(_rows("a"), FakeEmbeddings(size=8), quantization="int8")
+
+
+# ---------------------------------------------------------------------- #
+# ChunkStore
+# ---------------------------------------------------------------------- #
+INT_EDGES = [0, -1, (1 << 63) - 1, -(1 << 63) + 1, -(1 << 63), 1 << 63, -(1 << 63) - 1, 1 << 80]
+
+
+@pytest.mark.parametrize("value", INT_EDGES)
+def test_chunk_store_keeps_any_integer_metadata(tmp_path, value):
+    store = ChunkStore(str(tmp_path))
+    store.add_documents([Document(page_content="a", metadata={"n": 7}),
+                         Document(page_content="b", metadata={"n": value, "source": "x.txt"}),
+                         Document(page_content="c", metadata={"tags": ["t"]})], ids=["a", "b", "c"])
+
+    assert store.metadata(1)["n"] == value and type(store.metadata(1)["n"]) is int
+    assert store.metadata(0)["n"] == 7 and "n" not in store.metadata(2)
+    store.save()
+    reopened = ChunkStore.load(str(tmp_path))
+    assert [reopened.document(row) for row in range(3)] == [store.document(row) for row in range(3)]
+
+
+def test_chunk_store_overwrites_and_deletes_by_id():
+    store = ChunkStore()
+    store.add_documents(_rows("a", "b", "c"), ids=["1", "2", "3"])
+    assert store.add_documents([Document(page_content="b v2", metadata={"page": 2})], ids=["2"]) == [1]
+
+    assert store.document(1) == Document(page_content="b v2", metadata={"page": 2, "doc_id": "2"})
+    assert store.delete(["1", "missing"]) == [0]
+    assert list(store.ids()) == ["2", "3"] and store.row_of("3") == 1 and store.row_of("1") is None
+
+
+def test_chunk_refs_are_hashable_row_references():
+    store = ChunkStore()
+    store.add_documents(_rows("a", "b"), ids=["1", "2"])
+    other = ChunkStore()
+    other.add_documents(_rows("a"), ids=["1"])
+
+    assert store.ref(0) == store.ref(0) and hash(store.ref(0)) == hash(store.ref(0))
+    assert store.ref(0) != store.ref(1) and store.ref(0) != other.ref(0)
+    assert len({store.ref(0), store.ref(0), store.ref(1)}) == 2
+    assert store.ref(0) != store.document(0) and store.document(0) != store.ref(0)
+    assert store.ref(0).to_document() == store.document(0) == other.ref(0).to_document()
+
+
+def test_chunk_store_refuses_to_overwrite_a_saved_store(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.add_documents(_rows("a", "b"), ids=["1", "2"])
+    store.save()
+
+    with pytest.raises(ValueError, match="ChunkStore.load"):
+        ChunkStore(str(tmp_path))
+    reopened = ChunkStore.load(str(tmp_path))
+    assert [reopened.document(row).page_content for row in range(len(reopened))] == ["a", "b"]
+
+
+def test_chunk_store_index_feeds_the_context_packer():
+    store = ChunkStore()
+    store.add_documents([Document(page_content=text, metadata={"source": f"{i}.txt"})
+                         for i, text in enumerate(["red apple", "red apple", "yellow banana", "red cherry"])],
+                        ids=["a", "a2", "b", "c"])
+    index = FlatVectorIndex.from_chunk_store(store, FakeEmbeddings(size=16))
+    hits = index.similarity_search("red apple", k=4)
+    assert all(isinstance(hit, ChunkRef) for hit in hits)
+
+    packer = ContextPacker(max_tokens=100, mmr_lambda=0.5, vectorstore=index)
+    context = packer.pack([[(hit, 1.0 - i / 10) for i, hit in enumerate(hits)], hits])
+    assert packer.last_report.documents_in == 8 and packer.last_report.documents_out == 3
+    assert context.startswith("[1] (source=0.txt) red apple")
+    assert "yellow banana" in context and "red cherry" in context
+
+    for retrieval_cls, generator_cls in [(SimpleRetriever, SimpleGenerator), (FusionRetriever, FusionGenerator)]:
+        reports = []
+        generator = generator_cls(FakeChatModel(), context_packer=ContextPacker(on_report=reports.append))
+        retrieval = retrieval_cls(FakeChatModel(), index.as_retriever(search_kwargs={"k": 2}))
+        assert generator.answer("red apple", retrieval)
+        assert reports[0].documents_out > 0